@@ -15,6 +15,7 @@ timelines_api = Namespace(name='Timelines', path='/kweeks/timelines',
 messages_api = Namespace(name='Direct Messages', path='/direct_message',
                          description='Direct messages and conversations.')
 notifications_api = Namespace(name='Notifications', path='/notifications', description='User notifications.')
+debug_api = Namespace(name='Debug', path='/debug', description='Server instrumentation, requires the debug key.')
 
 
 def initialize_api_namespaces(api):
@@ -31,3 +32,4 @@ def initialize_api_namespaces(api):
     api.add_namespace(notifications_api)
     api.add_namespace(search_api)
     api.add_namespace(media_api)
+    api.add_namespace(debug_api)
@@ -1,9 +1,11 @@
-from flask import Flask, request
+import time
+from flask import Flask, request, g
 from flask_restplus import Api
 from flask_socketio import SocketIO
 from database_migration.migrate import migrate_non_cli
 import api_namespaces
 import database_manager
+import instrumentation.actions
 import config
 import patch
 
@@ -19,6 +21,11 @@ authorizations = {
         'type': 'apiKey',
         'in': 'header',
         'name': 'CODE'
+    },
+    'KwikkerDebugKey': {
+        'type': 'apiKey',
+        'in': 'header',
+        'name': 'DEBUG-KEY'
     }
 }
 api = Api(app, authorizations=authorizations, doc='/api/doc', title='Kwikker API', version='1.0',
@@ -34,6 +41,8 @@ def initialize_database():
         Initializes the database. If the production configuration the database credentials are
         obtained from app.config (set in config.py). Else, the the database credentials of the
         developer are used.
+        If green mode is enabled and the server runs on eventlet or gevent, database I/O yields to the
+        event loop instead of blocking it.
 
 
         *Returns:*
@@ -45,8 +54,19 @@ def initialize_database():
     db_password = app.config['DATABASE_PASSWORD']
     db_host = app.config['DATABASE_HOST']
     db_port = app.config['DATABASE_PORT']
+    db_pool_min_size = app.config['DATABASE_POOL_MIN_SIZE']
+    db_pool_max_size = app.config['DATABASE_POOL_MAX_SIZE']
+    db_pool_timeout = app.config['DATABASE_POOL_TIMEOUT']
+    db_batch_page_size = app.config['DATABASE_BATCH_PAGE_SIZE']
+    db_prepared_cache_size = app.config['DATABASE_PREPARED_CACHE_SIZE']
+    db_slow_query_threshold = app.config['DATABASE_SLOW_QUERY_THRESHOLD']
+    db_replicas = app.config['DATABASE_REPLICAS']
+    db_read_your_writes_window = app.config['DATABASE_READ_YOUR_WRITES_WINDOW']
     migrations_db_name = app.config['MIGRATIONS_DATABASE_NAME']
 
+    if app.config['DATABASE_GREEN_MODE']:
+        database_manager.db_manager.enable_green_mode(socketio.async_mode)
+
     if migrate_non_cli(_db_name=db_name,
                        _db_username=db_username,
                        _db_password=db_password,
@@ -58,7 +78,15 @@ def initialize_database():
                                                                      db_username=db_username,
                                                                      db_password=db_password,
                                                                      host=db_host,
-                                                                     port=db_port)
+                                                                     port=db_port,
+                                                                     min_connections=db_pool_min_size,
+                                                                     max_connections=db_pool_max_size,
+                                                                     timeout=db_pool_timeout,
+                                                                     batch_page_size=db_batch_page_size,
+                                                                     prepared_cache_size=db_prepared_cache_size,
+                                                                     slow_query_threshold=db_slow_query_threshold,
+                                                                     replicas=db_replicas,
+                                                                     read_your_writes_window=db_read_your_writes_window)
 
         if response is None:
             print('Connected to the database successfully.')
@@ -85,6 +113,7 @@ def import_routes():
     import notifications.routes
     import direct_messages.routes
     import media.routes
+    import instrumentation.routes
 
 
 def initialize(env):
@@ -131,10 +160,46 @@ def inject_cors_headers(response):
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     response.headers.add('Access-Control-Allow-Methods', 'DELETE, GET, HEAD, OPTIONS, POST, PUT, PATCH')
     response.headers.add('Access-Control-Allow-Headers', 'Origin, Content-Type, User-Agent, Content-Range, Token, Code')
-    response.headers.add('Access-Control-Expose-Headers', 'DAV, content-length, Allow')
+    response.headers.add('Access-Control-Expose-Headers', 'DAV, content-length, Allow, Server-Timing, Next-Cursor')
+    return response
+
+
+@app.before_request
+def start_database_instrumentation():
+    """
+        Starts recording the database queries executed by the request.
+    """
+    g.request_started_at = time.monotonic()
+    database_manager.db_manager.start_request_instrumentation()
+
+
+@app.after_request
+def inject_server_timing_header(response):
+    """
+        Reports the number of database queries of the request and the time spent executing them in the
+        Server-Timing header, and adds them to the statistics of the endpoint.
+    """
+    request_instrumentation = database_manager.db_manager.get_request_instrumentation()
+    if request_instrumentation is None:
+        return response
+    timings = ['db;dur=%.2f;desc="%d queries"' % (request_instrumentation['database_time'] * 1000,
+                                                   request_instrumentation['queries'])]
+    if 'request_started_at' in g:
+        timings.append('total;dur=%.2f' % ((time.monotonic() - g.request_started_at) * 1000))
+    response.headers.add('Server-Timing', ', '.join(timings))
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    instrumentation.actions.record_request(request.method + ' ' + rule, request_instrumentation)
     return response
 
 
+@app.teardown_request
+def release_database_connection(exception):
+    """
+        Returns the database connections used by the request to their connection pools.
+    """
+    database_manager.db_manager.end_request()
+
+
 def run(env):
     """
             Attempts to initialize the app, and runs it if the initialization was successful.
@@ -11,6 +11,7 @@ from threading import Thread
 import bcrypt
 import re
 from users_profiles.actions import update_profile_images_on_username_update
+from database_manager import db_manager
 mail = Mail(app)
 root = app.config['FRONT_END_ROOT']
 
@@ -316,6 +317,8 @@ def authorize(f):
         if not is_confirmed(user['username']):
             abort(403, message='The authorized user is not confirmed.')
 
+        # Lets the user read their own writes even if the database reads go to a replica
+        db_manager.set_request_user(user['username'])
         return f(authorized_username=user['username'], *args, **kwargs)
 
     return decorated  # pragma:no cover
@@ -18,7 +18,7 @@ def is_confirmed(username):
                 SELECT * FROM USER_CREDENTIALS WHERE USERNAME = %s
                  """
     data = (username,)
-    response = db_manager.execute_query(query, data)
+    response = db_manager.execute_query(query, data, prepared=True)
     if isinstance(response, Exception):
         return False
     elif response:
@@ -256,7 +256,7 @@ def is_user(username, password):
                      select PASSWORD from USER_CREDENTIALS where USERNAME= %s
                  """
     data = (username,)
-    response = db_manager.execute_query(query, data)
+    response = db_manager.execute_query(query, data, prepared=True)
     if isinstance(response, Exception):
         return False
     elif response:
@@ -9,13 +9,58 @@ class BaseConfig:
     SWAGGER_UI_DOC_EXPANSION = 'list'
     SECRET_KEY = 'kwikkerSecretKeyIsSALTS'
     CODE_KEY = 'kwikkerCode'
+    # Key of the debug endpoints, sent in the DEBUG-KEY header. The endpoints are disabled if None
+    DEBUG_KEY = None
     ERROR_404_HELP = False
     DATABASE_NAME = 'kwikker'
     DATABASE_USERNAME = 'postgres'
     DATABASE_PASSWORD = ''
     DATABASE_HOST = None
     DATABASE_PORT = 5432
+    DATABASE_POOL_MIN_SIZE = 1
+    DATABASE_POOL_MAX_SIZE = 10
+    DATABASE_POOL_TIMEOUT = 30
+    DATABASE_GREEN_MODE = True
+    DATABASE_BATCH_PAGE_SIZE = 100
+    DATABASE_PREPARED_CACHE_SIZE = 100
+    DATABASE_SLOW_QUERY_THRESHOLD = 0.5
+    # libpq connection strings of read replicas, e.g. 'dbname=kwikker user=kwikker password=... host=replica1'
+    DATABASE_REPLICAS = []
+    # Seconds a user reads from the primary after writing, None to only do so for the rest of the writing request
+    DATABASE_READ_YOUR_WRITES_WINDOW = None
     MIGRATIONS_DATABASE_NAME = 'migrations'
+    # 'query' builds the home timeline from the follows on every read, 'materialized' reads the HOME_TIMELINE table
+    # filled when kweeks are created (run `python maintenance.py rebuild-home-timelines` before switching to it) and
+    # 'merge' merges the latest kweeks and rekweeks of the followed users, cached in memory per author
+    HOME_TIMELINE_ENGINE = 'query'
+    # The maximum number of entries kept in the materialized home timeline of each user, enforced when following
+    # and rebuilding, and by `python maintenance.py trim-home-timelines` (meant to run periodically)
+    HOME_TIMELINE_CAP = 800
+    # The number of latest entries cached per author by the 'merge' engine, the seconds they are cached for (entries
+    # created by other server processes are seen after that) and the maximum number of cached authors
+    HOME_TIMELINE_AUTHOR_CACHE_SIZE = 50
+    HOME_TIMELINE_AUTHOR_CACHE_TTL = 60
+    HOME_TIMELINE_AUTHOR_CACHE_AUTHORS = 100000
+    # Trends score the hashtags of the kweeks created in the last TRENDS_WINDOW seconds (counted per 5 minutes bucket),
+    # a kweek counting half as much every TRENDS_HALF_LIFE seconds. The top TRENDS_SNAPSHOT_SIZE are kept in memory
+    # and refreshed in the background once older than TRENDS_REFRESH_INTERVAL seconds. Run
+    # `python maintenance.py trim-hashtag-buckets` periodically to remove the buckets older than the window
+    TRENDS_WINDOW = 24 * 60 * 60
+    TRENDS_HALF_LIFE = 2 * 60 * 60
+    TRENDS_SNAPSHOT_SIZE = 50
+    TRENDS_REFRESH_INTERVAL = 60
+    # The number of search texts whose results are cached, the seconds they are cached for and the maximum number of
+    # kweeks cached per search text (the following ones are queried). The kweeks results are also dropped once a kweek
+    # with one of the search terms is created or deleted, the users results are seen after their time to live
+    SEARCH_CACHE_SIZE = 1000
+    SEARCH_CACHE_TTL = 600
+    SEARCH_CACHE_RESULTS = 1000
+    SEARCH_USERS_CACHE_TTL = 30
+    # The hashtags no longer used by any kweek are deleted in the background at most every HASHTAG_SWEEP_INTERVAL
+    # seconds after a kweek is deleted, HASHTAG_SWEEP_BATCH_SIZE at a time (`python maintenance.py sweep-hashtags`
+    # deletes them on demand)
+    HASHTAG_SWEEP_INTERVAL = 5 * 60
+    HASHTAG_SWEEP_BATCH_SIZE = 1000
     SERVER_PATH = 'http://127.0.0.1:5000/'
     MAIL_SERVER = 'smtp.zoho.com'
     MAIL_PORT = 587
@@ -1,5 +1,281 @@
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import errors, extensions
+from psycopg2.extras import NamedTupleCursor, RealDictCursor, execute_values
+from psycopg2.pool import PoolError
+
+_PLACEHOLDER_PATTERN = re.compile(r'%[s%]')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+logger = logging.getLogger(__name__)
+
+# The cursor class used for each row format accepted by the query methods
+ROW_FORMATS = {
+    'dict': RealDictCursor,
+    'namedtuple': NamedTupleCursor,
+    'tuple': extensions.cursor
+}
+
+
+def normalize_query(query):
+    """
+        Normalizes the text of a query so that executions of the same statement can be grouped together.
+        Parameters are already `%s` placeholders, so only the whitespace is collapsed.
+
+
+        *Parameters:*
+            - *query*: The SQL query.
+
+        *Returns:*
+            - *string*: The normalized query.
+    """
+    return _WHITESPACE_PATTERN.sub(' ', query).strip()
+
+
+def eventlet_wait_callback(connection, timeout=-1):
+    """
+        A psycopg2 wait callback that yields to the eventlet hub while the connection waits for the server.
+    """
+    from eventlet.hubs import trampoline
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(connection.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(connection.fileno(), write=True)
+        else:
+            raise psycopg2.OperationalError('Bad result from poll: %r' % state)
+
+
+def gevent_wait_callback(connection, timeout=None):
+    """
+        A psycopg2 wait callback that yields to the gevent hub while the connection waits for the server.
+    """
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError('Bad result from poll: %r' % state)
+
+
+class PooledConnection(extensions.connection):
+    """
+        A psycopg2 connection that keeps track of the statements prepared on it, most recently used last.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = OrderedDict()
+        self.prepared_statement_ids = itertools.count()
+
+
+class ConnectionPool:
+    """
+        A bounded pool of connections to a single PostgreSQL database.
+        The first *min_size* connections are opened eagerly, the rest are opened on demand up to *max_size*.
+        Checking out a connection while *max_size* connections are in use waits until one is checked in.
+    """
+    def __init__(self, connection_string, min_size=1, max_size=1, timeout=None,
+                 semaphore_factory=threading.BoundedSemaphore):
+        """
+            Initializes the pool and opens its first *min_size* connections.
+
+
+            *Parameters:*
+                - *connection_string*: The libpq connection string of the database.
+                - *min_size*: The number of connections that are kept open even when idle.
+                - *max_size*: The maximum number of connections that can be checked out at the same time.
+                - *timeout*: The number of seconds to wait for a free connection. Waits forever if None.
+                - *semaphore_factory*: The bounded semaphore class used to wait for free connections.
+
+            *Raises:*
+                - *ValueError*: If the pool sizes are invalid.
+                - The exception thrown by the database connector if a connection could not be opened.
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError('Invalid pool sizes: min_size=%s, max_size=%s' % (min_size, max_size))
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._slots = semaphore_factory(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._closed = False
+        try:
+            for _ in range(min_size):
+                self._idle.append(self._connect())
+        except Exception:
+            self.close()
+            raise
+
+    def _connect(self):
+        connection = psycopg2.connect(self.connection_string, connection_factory=PooledConnection)
+        # Statements outside explicit transactions should not need a commit round trip
+        connection.autocommit = True
+        with self._lock:
+            self._size += 1
+        return connection
+
+    def _close_connection(self, connection):
+        with self._lock:
+            self._size -= 1
+        # Prepared statements die with their connection
+        connection.prepared_statements.clear()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def checkout(self):
+        """
+            Checks out a connection, waiting for one to be checked in if the pool is saturated.
+
+
+            *Returns:*
+                - *connection*: A psycopg2 connection that must be returned to the pool using `checkin`.
+
+            *Raises:*
+                - *PoolError*: If the pool is closed or no connection was freed within the pool timeout.
+                - The exception thrown by the database connector if a new connection could not be opened.
+        """
+        if self._closed:
+            raise PoolError('The connection pool is closed.')
+        started_at = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(True, self.timeout)
+        wait_time = time.monotonic() - started_at
+        with self._lock:
+            self._waiting -= 1
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise PoolError('No database connection was freed within %s seconds.' % self.timeout)
+
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return connection
+
+    def checkin(self, connection, discard=False):
+        """
+            Returns a checked out connection to the pool.
+            Connections that are broken, discarded or returned after the pool is closed are closed instead.
+
+
+            *Parameters:*
+                - *connection*: The connection previously returned by `checkout`.
+                - *discard*: Optional. Close the connection instead of keeping it idle. Default: *False*
+        """
+        if not discard and not connection.closed:
+            try:
+                # Never hand a connection with an open transaction to another request
+                if connection.status != psycopg2.extensions.STATUS_READY:
+                    connection.rollback()
+                if not connection.autocommit:
+                    connection.autocommit = True
+            except Exception:
+                discard = True
+        if discard or self._closed or connection.closed:
+            self._close_connection(connection)
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def close(self):
+        """
+            Closes the idle connections of the pool, checked out connections are closed when checked in.
+        """
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close_connection(connection)
+
+    def statistics(self):
+        """
+            Gets the usage statistics of the pool.
+
+
+            *Returns:*
+                - *Dictionary*: {
+                                    | *min_size (int)*: The number of connections kept open even when idle.,
+                                    | *max_size (int)*: The maximum number of connections.,
+                                    | *size (int)*: The number of currently open connections.,
+                                    | *in_use (int)*: The number of currently checked out connections.,
+                                    | *idle (int)*: The number of open connections that are not checked out.,
+                                    | *waiting (int)*: The number of callers currently waiting for a connection.,
+                                    | *saturation (float)*: The ratio of checked out connections to max_size.,
+                                    | *checkouts (int)*: The total number of successful checkouts.,
+                                    | *timeouts (int)*: The total number of checkouts that timed out.,
+                                    | *total_wait_time (float)*: The total seconds spent waiting for connections.,
+                                    | *average_wait_time (float)*: The average seconds spent waiting per checkout.,
+                                    | *max_wait_time (float)*: The longest wait for a connection in seconds.
+                                    | }
+        """
+        with self._lock:
+            attempts = self._checkouts + self._timeouts
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'saturation': self._in_use / self.max_size,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'total_wait_time': self._total_wait_time,
+                'average_wait_time': self._total_wait_time / attempts if attempts else 0.0,
+                'max_wait_time': self._max_wait_time
+            }
+
+
+STREAM_OPEN_MESSAGE = 'a stream is open on this connection, exhaust or close it before running other queries'
+
+
+class _TransactionScope:
+    def __init__(self, savepoint=None, failed=False, streaming=False):
+        self.savepoint = savepoint
+        self.failed = failed
+        self.streaming = streaming
+        # Set once the scope has ended, possibly along with an enclosing one
+        self.closed = False
+        self.callbacks = []
 
 
 class DatabaseManager:
@@ -8,13 +284,78 @@ class DatabaseManager:
         - Initializing connection.
         - Executing queries.
         - Accessing query results.
+
+        Connections are taken from a pool. Each request (thread or greenlet) checks out its own connection
+        on its first query and keeps it until `release_connection` is called, so concurrent requests never
+        share a transaction.
+
+        Connections are in autocommit mode, so each statement is committed on its own and reads never
+        need a commit. Statements that must succeed or fail together are grouped using `transaction`.
+
+        If read replicas are configured, `execute_query` outside transactions reads from a replica (picked
+        round robin for each request) while everything else goes to the primary. Once a request writes,
+        its reads go to the primary, and so do the reads of a user for a short window after they write.
+        A transaction counts as a write when it commits after modifying any data.
     """
     def __init__(self):
-        self.connection = None
+        self.pool = None
+        self.replica_pools = []
+        self.read_your_writes_window = None
+        self.green_mode = None
+        self.batch_page_size = 100
+        self.prepared_cache_size = 100
+        self.slow_query_threshold = None
+        self.query_listeners = []
+        self._stream_ids = itertools.count()
+        self._replica_ids = itertools.count()
+        self._last_writes = {}
+        self._last_writes_lock = threading.Lock()
+        self._prepared_lock = threading.Lock()
+        self._prepared_hits = 0
+        self._prepared_misses = 0
+        self._prepared_evictions = 0
+        self._local = threading.local()
+        self._semaphore_factory = threading.BoundedSemaphore
 
-    def initialize_connection(self, db_name, db_username, db_password, host=None, port=None):
+    def enable_green_mode(self, async_mode):
+        """
+            Makes database I/O cooperative when the server runs on eventlet or gevent.
+            While a query waits for the server, control is handed back to the event loop so that other
+            greenlets keep running, and every greenlet checks out its own pooled connection.
+            Should be called before `initialize_connection`. Threading is not monkey patched, so background
+            work using the database must run in greenlets, such as the tasks started by
+            `socketio.start_background_task`, never in OS threads.
+
+
+            *Parameters:*
+                - *async_mode*: The async mode of the server, 'eventlet', 'gevent' or 'gevent_uwsgi'.
+
+            *Returns:*
+                - *True*: If green mode was enabled.
+                - *False*: If the async mode does not support green mode (e.g. 'threading').
+        """
+        if async_mode == 'eventlet':
+            from eventlet import corolocal, semaphore
+            extensions.set_wait_callback(eventlet_wait_callback)
+            self._local = corolocal.local()
+            self._semaphore_factory = semaphore.BoundedSemaphore
+        elif async_mode in ('gevent', 'gevent_uwsgi'):
+            from gevent import local, lock
+            extensions.set_wait_callback(gevent_wait_callback)
+            self._local = local.local()
+            self._semaphore_factory = lock.BoundedSemaphore
+        else:
+            return False
+        self.green_mode = async_mode
+        return True
+
+    def initialize_connection(self, db_name, db_username, db_password, host=None, port=None,
+                              min_connections=1, max_connections=1, timeout=None, batch_page_size=100,
+                              prepared_cache_size=100, slow_query_threshold=None, replicas=None,
+                              read_your_writes_window=None):
         """
             Initializes the connection to the database.
+            Any previously initialized connections are closed first.
 
 
             *Parameters:*
@@ -23,6 +364,15 @@ class DatabaseManager:
                 - *db_password*: The database password.
                 - *host*: The database host name. Can be None.
                 - *port*: The used port. Can be None.
+                - *min_connections*: Optional. The number of pooled connections kept open. Default: *1*
+                - *max_connections*: Optional. The maximum number of pooled connections. Default: *1*
+                - *timeout*: Optional. Seconds to wait for a free pooled connection, forever if None. Default: *None*
+                - *batch_page_size*: Optional. The number of rows sent per statement by batched queries. Default: *100*
+                - *prepared_cache_size*: Optional. The number of prepared statements kept per connection. Default: *100*
+                - *slow_query_threshold*: Optional. Queries that take more seconds are logged, never if None. Default: *None*
+                - *replicas*: Optional. The libpq connection strings of the read replicas. Default: *None*
+                - | *read_your_writes_window*: Optional. The number of seconds the reads of a user go to the primary
+                  | after they write, see `set_request_user`. Disabled if None. Default: *None*
 
             *Returns:*
                 - *None*: If the database connection was successful.
@@ -33,13 +383,439 @@ class DatabaseManager:
         connection_string = 'dbname=%s user=%s password=%s' % (db_name, db_username, db_password)
         if host is not None:
             connection_string += (' host=%s port=%s' % (host, port))
+        self.close_connection()
+        self.batch_page_size = batch_page_size
+        self.prepared_cache_size = prepared_cache_size
+        self.slow_query_threshold = slow_query_threshold
+        self.read_your_writes_window = read_your_writes_window
         try:
-            self.connection = psycopg2.connect(connection_string)
+            self.pool = ConnectionPool(connection_string, min_size=min_connections, max_size=max_connections,
+                                       timeout=timeout, semaphore_factory=self._semaphore_factory)
+            for replica in replicas or []:
+                self.replica_pools.append(ConnectionPool(replica, min_size=min_connections,
+                                                         max_size=max_connections, timeout=timeout,
+                                                         semaphore_factory=self._semaphore_factory))
         except Exception as E:
+            self.close_connection()
             return E
         return None  # meaning everything was okay
 
-    def execute_query_no_return(self, query: str, data=None):
+    @property
+    def connection(self):
+        """
+            The connection of the current request (thread or greenlet).
+            A connection is checked out from the pool on first access.
+        """
+        pool, connection = getattr(self._local, 'checkout', (None, None))
+        if connection is not None:
+            if pool is self.pool and not connection.closed:
+                return connection
+            self.release_connection(discard=True)
+        if self.pool is None:
+            raise PoolError('The database connection is not initialized.')
+        connection = self.pool.checkout()
+        self._local.checkout = (self.pool, connection)
+        return connection
+
+    def release_connection(self, discard=False):
+        """
+            Returns the connection of the current request (thread or greenlet) to the pool, if it has one.
+            Should be called when a request is torn down.
+
+
+            *Parameters:*
+                - *discard*: Optional. Close the connection instead of keeping it in the pool. Default: *False*
+        """
+        pool, connection = getattr(self._local, 'checkout', (None, None))
+        self._local.checkout = (None, None)
+        for scope in self._transaction_scopes():
+            scope.closed = True
+        self._local.transaction_scopes = []
+        if connection is not None:
+            pool.checkin(connection, discard=discard)
+        self._release_replica_connection()
+
+    def _release_replica_connection(self, discard=False):
+        pool, connection = getattr(self._local, 'replica_checkout', (None, None))
+        self._local.replica_checkout = (None, None)
+        if connection is not None:
+            pool.checkin(connection, discard=discard)
+
+    def _replica_connection(self):
+        pool, connection = getattr(self._local, 'replica_checkout', (None, None))
+        if connection is not None:
+            if any(pool is replica_pool for replica_pool in self.replica_pools) and not connection.closed:
+                return connection
+            self._release_replica_connection(discard=True)
+        if not self.replica_pools:
+            return None
+        pool = self.replica_pools[next(self._replica_ids) % len(self.replica_pools)]
+        try:
+            connection = pool.checkout()
+        except Exception as E:
+            # Keep serving reads from the primary while the replica is unavailable
+            logger.warning('Could not connect to a read replica: %s', E)
+            return None
+        self._local.replica_checkout = (pool, connection)
+        return connection
+
+    def _read_connection(self, scope):
+        if scope is None and self.replica_pools and not self._reads_pinned_to_primary():
+            connection = self._replica_connection()
+            if connection is not None:
+                return connection
+        return self.connection
+
+    def _reads_pinned_to_primary(self):
+        if getattr(self._local, 'wrote', False):
+            return True
+        username = getattr(self._local, 'username', None)
+        if username is None or not self.read_your_writes_window:
+            return False
+        with self._last_writes_lock:
+            last_write = self._last_writes.get(username)
+        return last_write is not None and time.monotonic() - last_write < self.read_your_writes_window
+
+    def _record_write(self):
+        self._local.wrote = True
+        username = getattr(self._local, 'username', None)
+        if username is None or not self.read_your_writes_window:
+            return
+        now = time.monotonic()
+        with self._last_writes_lock:
+            self._last_writes[username] = now
+            if len(self._last_writes) > 10000:
+                for expired in [user for user, last_write in self._last_writes.items()
+                                if now - last_write >= self.read_your_writes_window]:
+                    del self._last_writes[expired]
+
+    def set_request_user(self, username):
+        """
+            Sets the user of the current request (thread or greenlet), used to send their reads to the primary
+            for `read_your_writes_window` seconds after they write, so they never see stale replica data.
+
+
+            *Parameters:*
+                - *username*: The username of the authorized user, or None.
+        """
+        self._local.username = username
+
+    def end_request(self):
+        """
+            Returns the connections of the current request (thread or greenlet) to their pools and clears its
+            state. Should be called when a request is torn down.
+        """
+        self.release_connection()
+        self._local.username = None
+        self._local.wrote = False
+
+    def _transaction_scopes(self):
+        scopes = getattr(self._local, 'transaction_scopes', None)
+        if scopes is None:
+            scopes = self._local.transaction_scopes = []
+        return scopes
+
+    def _current_transaction_scope(self):
+        scopes = self._transaction_scopes()
+        return scopes[-1] if scopes else None
+
+    @contextmanager
+    def transaction(self):
+        """
+            A context manager that runs the queries executed inside it as a single transaction.
+            The transaction is committed when the block exits, or rolled back if any query in it failed
+            or the block raised an exception. After a query fails, the following queries of the block
+            are not executed and return an exception object.
+            Transactions can be nested, a nested transaction is a savepoint that is rolled back on its own
+            without failing the enclosing transaction.
+
+            Example:
+                | with db_manager.transaction():
+                |     db_manager.execute_query_no_return(...)
+                |     db_manager.execute_query_no_return(...)
+
+
+            *Raises:*
+                - The exception thrown by the database connector if the transaction could not be committed.
+                - | *ProgrammingError*: If a stream is open when the transaction starts, or a stream opened in
+                  | the transaction is still open when it ends (the transaction is rolled back).
+        """
+        scope, parent, connection = self._begin_scope()
+        try:
+            yield
+        except BaseException:
+            scope.failed = True
+            raise
+        finally:
+            self._end_scope(connection, scope, parent)
+
+    def _begin_scope(self, streaming=False):
+        scopes = self._transaction_scopes()
+        parent = scopes[-1] if scopes else None
+        if parent is not None and parent.streaming:
+            raise psycopg2.ProgrammingError(STREAM_OPEN_MESSAGE)
+        connection = self.connection
+        if parent is None:
+            connection.autocommit = False
+            scope = _TransactionScope(streaming=streaming)
+        elif parent.failed:
+            scope = _TransactionScope(failed=True, streaming=streaming)
+        else:
+            scope = _TransactionScope(savepoint='kwikker_savepoint_%d' % len(scopes), streaming=streaming)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SAVEPOINT ' + scope.savepoint)
+            except Exception:
+                parent.failed = scope.failed = True
+                scope.savepoint = None
+        scopes.append(scope)
+        return scope, parent, connection
+
+    def _end_scope(self, connection, scope, parent):
+        scopes = self._transaction_scopes()
+        if scope.closed or scope not in scopes:
+            return
+        # Only a stream that was left open can be above the scope, it cannot outlive the transaction it is in
+        interleaved = scopes[-1] is not scope
+        while scopes[-1] is not scope:
+            scopes.pop().closed = True
+        scopes.pop()
+        scope.closed = True
+        if interleaved:
+            scope.failed = True
+        if parent is None:
+            self._end_transaction(connection, scope)
+        else:
+            self._end_savepoint(connection, scope, parent)
+        if interleaved:
+            raise psycopg2.ProgrammingError('the transaction ended while a stream in it was still open, '
+                                            'it was rolled back')
+
+    def _end_savepoint(self, connection, scope, parent):
+        if scope.savepoint is None:
+            return
+        try:
+            with connection.cursor() as cursor:
+                if scope.failed:
+                    cursor.execute('ROLLBACK TO SAVEPOINT ' + scope.savepoint)
+                else:
+                    cursor.execute('RELEASE SAVEPOINT ' + scope.savepoint)
+                    parent.callbacks.extend(scope.callbacks)
+        except Exception:
+            parent.failed = True
+
+    def _end_transaction(self, connection, scope):
+        if connection.closed:
+            self.release_connection(discard=True)
+            return
+        wrote = False
+        try:
+            if scope.failed:
+                connection.rollback()
+            else:
+                wrote = self._transaction_wrote(connection, scope)
+                connection.commit()
+        except Exception:
+            self._rollback(connection)
+            raise
+        finally:
+            if not connection.closed:
+                connection.autocommit = True
+        if wrote:
+            self._record_write()
+        if not scope.failed:
+            for callback in scope.callbacks:
+                callback()
+
+    def _transaction_wrote(self, connection, scope):
+        # Writes only pin the reads to the primary, so there is nothing to check without replicas. A transaction
+        # is given an id by its first write, which may be hidden in a query returning rows such as a CTE.
+        if not self.replica_pools or scope.streaming:
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT TXID_CURRENT_IF_ASSIGNED() IS NOT NULL')
+            return cursor.fetchone()[0]
+
+    def after_commit(self, callback):
+        """
+            Calls *callback* once the current transaction is committed, it is never called if the
+            transaction is rolled back. Outside a transaction, the callback is called immediately.
+
+
+            *Parameters:*
+                - *callback*: A function that takes no arguments.
+        """
+        scope = self._current_transaction_scope()
+        if scope is None:
+            callback()
+        else:
+            scope.callbacks.append(callback)
+
+    def _check_transaction_scope(self):
+        scope = self._current_transaction_scope()
+        if scope is not None and scope.streaming:
+            raise psycopg2.ProgrammingError(STREAM_OPEN_MESSAGE)
+        if scope is not None and scope.failed:
+            raise psycopg2.InternalError('current transaction is aborted, '
+                                         'commands ignored until end of transaction block')
+        return scope
+
+    def _handle_query_error(self, connection, scope):
+        if scope is None:
+            self._rollback(connection)
+        else:
+            # The whole transaction is rolled back when its scope exits
+            scope.failed = True
+
+    def _commit(self, connection, scope):
+        # Connections are normally in autocommit mode, but callers such as migrations may turn it off
+        if scope is None and not connection.autocommit:
+            connection.commit()
+
+    def start_request_instrumentation(self):
+        """
+            Starts recording the queries executed by the current request (thread or greenlet).
+            Should be called when a request starts, the recorded data is read using `get_request_instrumentation`.
+        """
+        self._local.instrumentation = {'queries': 0, 'database_time': 0.0, 'statements': {}}
+
+    def get_request_instrumentation(self):
+        """
+            Gets the queries executed by the current request since `start_request_instrumentation` was called.
+
+
+            *Returns:*
+                - *Dictionary*: {
+                                    | *queries (int)*: The number of executed queries.,
+                                    | *database_time (float)*: The total seconds spent executing them.,
+                                    | *statements (dictionary)*: The number of executions and seconds spent, as
+                                    | [count, time], for each normalized statement.
+                                    | }
+                - *None*: If the instrumentation of the current request was not started.
+        """
+        return getattr(self._local, 'instrumentation', None)
+
+    def add_query_listener(self, listener):
+        """
+            Registers a function that is called after every query with the normalized query and the seconds it took.
+
+
+            *Parameters:*
+                - *listener*: A function that takes the normalized query (string) and the duration (float).
+        """
+        self.query_listeners.append(listener)
+
+    def _record_query(self, query, duration):
+        statement = normalize_query(query)
+        instrumentation = getattr(self._local, 'instrumentation', None)
+        if instrumentation is not None:
+            instrumentation['queries'] += 1
+            instrumentation['database_time'] += duration
+            statistics = instrumentation['statements'].setdefault(statement, [0, 0.0])
+            statistics[0] += 1
+            statistics[1] += duration
+        if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+            logger.warning('Slow query (%.1f ms): %s', duration * 1000, statement)
+        for listener in self.query_listeners:
+            listener(statement, duration)
+
+    def get_pool_statistics(self):
+        """
+            Gets the usage statistics of the connection pool, see `ConnectionPool.statistics`.
+
+
+            *Returns:*
+                - *Dictionary*: The pool statistics.
+                - *None*: If the database connection is not initialized.
+        """
+        if self.pool is None:
+            return None
+        return self.pool.statistics()
+
+    def get_replica_pool_statistics(self):
+        """
+            Gets the usage statistics of the connection pool of each read replica, see `ConnectionPool.statistics`.
+
+
+            *Returns:*
+                - *List of Dictionaries*: The pool statistics, in the order the replicas were configured.
+        """
+        return [replica_pool.statistics() for replica_pool in self.replica_pools]
+
+    def get_prepared_statistics(self):
+        """
+            Gets the usage statistics of the prepared statements cache, summed over all connections.
+
+
+            *Returns:*
+                - *Dictionary*: {
+                                    | *hits (int)*: The number of executions that reused a prepared statement.,
+                                    | *misses (int)*: The number of executions that had to prepare the statement.,
+                                    | *evictions (int)*: The number of statements deallocated to respect the cache size.,
+                                    | *hit_rate (float)*: The ratio of hits to all executions of prepared queries.
+                                    | }
+        """
+        with self._prepared_lock:
+            executions = self._prepared_hits + self._prepared_misses
+            return {
+                'hits': self._prepared_hits,
+                'misses': self._prepared_misses,
+                'evictions': self._prepared_evictions,
+                'hit_rate': self._prepared_hits / executions if executions else 0.0
+            }
+
+    @staticmethod
+    def _cursor_factory(row_format):
+        cursor_factory = ROW_FORMATS.get(row_format)
+        if cursor_factory is None:
+            raise ValueError('Unknown row format %r, expected one of: %s.' % (row_format, ', '.join(ROW_FORMATS)))
+        return cursor_factory
+
+    def _execute(self, cursor, query, data, prepared):
+        if prepared and data and isinstance(data, (tuple, list)):
+            self._execute_prepared(cursor, query, data)
+        elif data is not None:
+            cursor.execute(query, data)
+        else:
+            cursor.execute(query)
+
+    def _execute_prepared(self, cursor, query, data):
+        statements = cursor.connection.prepared_statements
+        name = statements.get(query)
+        if name is not None:
+            statements.move_to_end(query)
+            hit, evicted = True, None
+            statement = 'EXECUTE ' + name
+        else:
+            hit, evicted = False, None
+            name = 'kwikker_prepared_%d' % next(cursor.connection.prepared_statement_ids)
+            placeholders = itertools.count(1)
+            positional_query = _PLACEHOLDER_PATTERN.sub(
+                lambda match: '$%d' % next(placeholders) if match.group() == '%s' else match.group(), query)
+            statement = 'PREPARE %s AS %s; EXECUTE %s' % (name, positional_query, name)
+            if len(statements) >= self.prepared_cache_size:
+                evicted = statements.popitem(last=False)[1]
+                statement = 'DEALLOCATE %s; %s' % (evicted, statement)
+        statement += ' (%s)' % ', '.join(['%s'] * len(data))
+        try:
+            cursor.execute(statement, data)
+        except errors.InvalidSqlStatementName:
+            # The statements were deallocated behind our back (e.g. DISCARD ALL), prepare them again
+            statements.clear()
+            if not hit or not cursor.connection.autocommit:
+                raise
+            return self._execute_prepared(cursor, query, data)
+        if not hit:
+            statements[query] = name
+        with self._prepared_lock:
+            if hit:
+                self._prepared_hits += 1
+            else:
+                self._prepared_misses += 1
+            if evicted is not None:
+                self._prepared_evictions += 1
+
+    def execute_query_no_return(self, query: str, data=None, prepared=False):
         """
             Executes a query that has no table results, such as inserts, updates and deletes.
             Inserting parameters into queries should not be done through string concatenation.
@@ -52,25 +828,32 @@ class DatabaseManager:
                 - *query*: The SQL query.
 
                 - *data*: Optional. The parameters of the query. Default: *None*
+                - *prepared*: Optional. Whether to use a prepared statement, see `execute_query`. Default: *False*
 
             *Returns:*
                 - *None*: If the query was executed successfully.
                 - *Exception* object: If the query produced an error.
 
         """
-        with self.connection.cursor() as cursor:
+        try:
+            scope = self._check_transaction_scope()
+            connection = self.connection
+        except Exception as E:
+            return E
+        with connection.cursor() as cursor:
+            started_at = time.monotonic()
             try:
-                if data is not None:
-                    cursor.execute(query, data)
-                else:
-                    cursor.execute(query)
-                self.connection.commit()
+                self._execute(cursor, query, data, prepared)
+                self._commit(connection, scope)
+                self._record_write()
             except Exception as E:
-                self.connection.rollback()
+                self._handle_query_error(connection, scope)
                 return E
+            finally:
+                self._record_query(query, time.monotonic() - started_at)
             return None  # meaning everything was okay
 
-    def execute_query(self, query: str, data=None):
+    def execute_query(self, query: str, data=None, prepared=False, row_format='dict', primary=False):
         """
             Executes a query that has table results, such as select queries.
             Inserting parameters into queries should not be done through string concatenation.
@@ -82,30 +865,157 @@ class DatabaseManager:
             *Parameters:*
                 - *query*: The SQL query.
                 - *data*: Optional. The parameters of the query. Default: *None*
+                - | *prepared*: Optional. Whether to prepare the query on the connection the first time it is
+                  | executed and reuse the prepared statement afterwards, skipping parsing and planning.
+                  | Meant for small queries that run very often. Only used with parameters. Default: *False*
+                - | *row_format*: Optional. The type of the returned rows, one of `'dict'`, `'namedtuple'`
+                  | (fields named after the columns) or `'tuple'`. Tuples take less memory and time to build
+                  | than dictionaries, which matters for queries returning many rows. Default: *'dict'*
+                - | *primary*: Optional. Whether to run the query on the primary even outside transactions,
+                  | and count it as a write. Required for data modifying queries returning rows, such as
+                  | `DELETE ... RETURNING`, which replicas reject. Default: *False*
 
             *Returns:*
                 - | *List of Dictionaries*: If the query was executed successfully.
                   | Each list element is a dictionary corresponding to a row in the query results.
                   | The dictionary keys are the column names of the query results.
                   | An empty list is returned if the query was successful but the result was an empty table.
-                - *Exception* object: If the query produced an error.
+                  | The elements are named tuples or tuples instead if requested by *row_format*.
+                - *Exception* object: If the query produced an error or *row_format* is unknown.
 
         """
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        try:
+            cursor_factory = self._cursor_factory(row_format)
+            scope = self._check_transaction_scope()
+            connection = self.connection if primary else self._read_connection(scope)
+        except Exception as E:
+            return E
+        with connection.cursor(cursor_factory=cursor_factory) as cursor:
+            started_at = time.monotonic()
             try:
-                if data is not None:
-                    cursor.execute(query, data)
-                else:
-                    cursor.execute(query)
-                self.connection.commit()
+                self._execute(cursor, query, data, prepared)
+                self._commit(connection, scope)
+                if primary:
+                    self._record_write()
             except Exception as E:
-                self.connection.rollback()
+                self._handle_query_error(connection, scope)
                 return E
+            finally:
+                self._record_query(query, time.monotonic() - started_at)
             return cursor.fetchall()
 
+    def execute_query_stream(self, query: str, data=None, batch_size=100, row_format='dict'):
+        """
+            Executes a query that has table results and yields its rows one by one.
+            Unlike `execute_query`, the results are not loaded into memory at once, they are fetched from a
+            server side cursor *batch_size* rows at a time, so the memory used stays bounded however many
+            rows the query matches. The query is run in a transaction (or savepoint) that ends when the
+            generator is exhausted or closed, so callers that stop early should close it.
+            No other query or transaction can run on the request connection while the stream is open, they
+            fail with a *ProgrammingError* rather than running inside the stream transaction. A stream
+            opened in a transaction must be closed before the transaction ends.
+
+
+            *Parameters:*
+                - *query*: The SQL query.
+                - *data*: Optional. The parameters of the query. Default: *None*
+                - *batch_size*: Optional. The number of rows fetched per round trip. Default: *100*
+                - *row_format*: Optional. The type of the yielded rows, as in `execute_query`. Default: *'dict'*
+
+            *Returns:*
+                - *Generator of Dictionaries*: Each dictionary corresponds to a row in the query results.
+
+            *Raises:*
+                - The exception thrown by the database connector if the query produced an error.
+                - *ValueError*: If *row_format* is unknown.
+                - *ProgrammingError*: If another stream is open.
+        """
+        cursor_factory = self._cursor_factory(row_format)
+        self._check_transaction_scope()
+        scope, parent, connection = self._begin_scope(streaming=True)
+        cursor = connection.cursor('kwikker_stream_%d' % next(self._stream_ids), cursor_factory=cursor_factory)
+        # Only the time spent waiting for the database is recorded, not the time spent by the caller
+        database_time = 0.0
+        try:
+            started_at = time.monotonic()
+            cursor.execute(query, data)
+            rows = cursor.fetchmany(batch_size)
+            database_time += time.monotonic() - started_at
+            while rows:
+                for row in rows:
+                    yield row
+                started_at = time.monotonic()
+                rows = cursor.fetchmany(batch_size)
+                database_time += time.monotonic() - started_at
+        except BaseException:
+            scope.failed = True
+            raise
+        finally:
+            self._record_query(query, database_time)
+            # Rolling back drops the cursor, and so does an enclosing transaction that already ended
+            if not scope.closed and not scope.failed:
+                cursor.close()
+            self._end_scope(connection, scope, parent)
+
+    def execute_values(self, query: str, data_list, template=None, page_size=None, fetch=False):
+        """
+            Executes a query once for many rows by expanding its single `VALUES %s` placeholder into a
+            multi-row list, so inserting many rows costs one round trip per page instead of one per row.
+            For more information please refer to `psycopg2 documentation <http://initd.org/psycopg/docs/extras.html#fast-execution-helpers>`_
+
+
+            *Parameters:*
+                - *query*: The SQL query, containing a single `%s` placeholder where the rows go.
+                - *data_list*: An iterable of tuples, each holding the parameters of one row.
+                - *template*: Optional. The snippet used for each row, e.g. `'(%s, %s::INT)'`. Default: *None*
+                - *page_size*: Optional. The number of rows per statement. Default: *The configured batch page size*
+                - *fetch*: Optional. Whether to return the rows returned by the query (e.g. `RETURNING`). Default: *False*
+
+            *Returns:*
+                - *None*: If the query was executed successfully and *fetch* is False.
+                - *List of Dictionaries*: The rows returned by all the pages if *fetch* is True.
+                - *Exception* object: If the query produced an error.
+        """
+        data_list = list(data_list)
+        if not data_list:
+            return [] if fetch else None
+        try:
+            scope = self._check_transaction_scope()
+            connection = self.connection
+        except Exception as E:
+            return E
+        with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            started_at = time.monotonic()
+            try:
+                response = execute_values(cursor, query, data_list, template=template,
+                                          page_size=page_size or self.batch_page_size, fetch=fetch)
+                self._commit(connection, scope)
+                self._record_write()
+            except Exception as E:
+                self._handle_query_error(connection, scope)
+                return E
+            finally:
+                self._record_query(query, time.monotonic() - started_at)
+            return response if fetch else None
+
+    def _rollback(self, connection):
+        # A connection that was closed by the server cannot be rolled back, replace it on the next query
+        if connection.closed:
+            if connection is getattr(self._local, 'replica_checkout', (None, None))[1]:
+                self._release_replica_connection(discard=True)
+            else:
+                self.release_connection(discard=True)
+        else:
+            connection.rollback()
+
     def close_connection(self):
-        if self.connection is not None:
-            self.connection.close()
+        self.release_connection()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        for replica_pool in self.replica_pools:
+            replica_pool.close()
+        self.replica_pools = []
 
 
 db_manager = DatabaseManager()
@@ -117,15 +117,15 @@ def run_migrations():
 
     print('Logging migrations...')
     for migration in unexecuted_migrations:
-        response = db_manager.execute_query_no_return('INSERT INTO MIGRATION VALUES (%s, %s)',
-                                                      (migration, datetime.datetime.now()))
-        if response is not None:
-            print('Problem logging migration:', migration)
-            print(response)
-            print('Please un-log any logged migrations manually.')
-            return False
-
         print('Logging', migration, '..')
+    executed_at = datetime.datetime.now()
+    response = db_manager.execute_values('INSERT INTO MIGRATION VALUES %s',
+                                         [(migration, executed_at) for migration in unexecuted_migrations])
+    if response is not None:
+        print('Problem logging migrations:', ', '.join(unexecuted_migrations))
+        print(response)
+        print('Please un-log any logged migrations manually.')
+        return False
 
     db_manager.close_connection()
 
@@ -0,0 +1,29 @@
+CREATE TABLE HOME_TIMELINE
+(
+    OWNER     VARCHAR   NOT NULL REFERENCES USER_CREDENTIALS (USERNAME) ON DELETE CASCADE ON UPDATE CASCADE,
+    KWEEK_ID  INT       NOT NULL REFERENCES KWEEK (ID) ON DELETE CASCADE,
+    REKWEEKER VARCHAR,
+    SORT_BY   TIMESTAMP NOT NULL,
+    FOREIGN KEY (REKWEEKER, KWEEK_ID) REFERENCES REKWEEK (USERNAME, KWEEK_ID) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE UNIQUE INDEX HOME_TIMELINE_ENTRY ON HOME_TIMELINE (OWNER, KWEEK_ID, (COALESCE(REKWEEKER, '')));
+
+CREATE INDEX HOME_TIMELINE_PAGE ON HOME_TIMELINE (OWNER, SORT_BY DESC, KWEEK_ID DESC, (COALESCE(REKWEEKER, '')) DESC);
+
+CREATE INDEX FOLLOW_FOLLOWED_USERNAME ON FOLLOW (FOLLOWED_USERNAME);
+
+CREATE VIEW HOME_TIMELINE_SOURCE (OWNER, KWEEK_ID, REKWEEKER, SORT_BY, SOURCE) AS
+    SELECT USERNAME, ID, NULL::VARCHAR, CREATED_AT, USERNAME FROM KWEEK
+    UNION ALL
+    SELECT F.FOLLOWER_USERNAME, K.ID, NULL::VARCHAR, K.CREATED_AT, K.USERNAME
+    FROM FOLLOW F JOIN KWEEK K ON K.USERNAME = F.FOLLOWED_USERNAME
+    WHERE NOT EXISTS (SELECT 1 FROM MUTE M
+                      WHERE M.MUTER_USERNAME = F.FOLLOWER_USERNAME AND M.MUTED_USERNAME = K.USERNAME)
+    UNION ALL
+    SELECT F.FOLLOWER_USERNAME, K.ID, R.USERNAME, R.CREATED_AT, R.USERNAME
+    FROM FOLLOW F JOIN REKWEEK R ON R.USERNAME = F.FOLLOWED_USERNAME JOIN KWEEK K ON K.ID = R.KWEEK_ID
+    WHERE NOT EXISTS (SELECT 1 FROM MUTE M
+                      WHERE M.MUTER_USERNAME = F.FOLLOWER_USERNAME AND M.MUTED_USERNAME IN (R.USERNAME, K.USERNAME))
+    AND NOT EXISTS (SELECT 1 FROM BLOCK B
+                    WHERE B.BLOCKER_USERNAME = F.FOLLOWER_USERNAME AND B.BLOCKED_USERNAME = K.USERNAME);
@@ -0,0 +1,3 @@
+CREATE INDEX KWEEK_USERNAME_CREATED_AT ON KWEEK (USERNAME, CREATED_AT DESC, ID DESC);
+
+CREATE INDEX REKWEEK_USERNAME_CREATED_AT ON REKWEEK (USERNAME, CREATED_AT DESC, KWEEK_ID DESC);
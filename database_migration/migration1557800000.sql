@@ -0,0 +1,63 @@
+CREATE TABLE KWEEK_COUNTERS
+(
+    KWEEK_ID INT PRIMARY KEY REFERENCES KWEEK (ID) ON DELETE CASCADE,
+    LIKES    INT NOT NULL DEFAULT 0,
+    REKWEEKS INT NOT NULL DEFAULT 0,
+    REPLIES  INT NOT NULL DEFAULT 0
+);
+
+INSERT INTO KWEEK_COUNTERS (KWEEK_ID, LIKES, REKWEEKS, REPLIES)
+SELECT K.ID,
+       (SELECT COUNT(*) FROM FAVORITE WHERE KWEEK_ID = K.ID),
+       (SELECT COUNT(*) FROM REKWEEK WHERE KWEEK_ID = K.ID),
+       (SELECT COUNT(*) FROM KWEEK WHERE REPLY_TO = K.ID)
+FROM KWEEK K;
+
+CREATE FUNCTION COUNT_KWEEK() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO KWEEK_COUNTERS (KWEEK_ID) VALUES (NEW.ID);
+        IF NEW.REPLY_TO IS NOT NULL THEN
+            UPDATE KWEEK_COUNTERS SET REPLIES = REPLIES + 1 WHERE KWEEK_ID = NEW.REPLY_TO;
+        END IF;
+    ELSIF OLD.REPLY_TO IS NOT NULL THEN
+        UPDATE KWEEK_COUNTERS SET REPLIES = REPLIES - 1
+        WHERE KWEEK_ID = OLD.REPLY_TO AND EXISTS (SELECT 1 FROM KWEEK WHERE ID = OLD.REPLY_TO);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE FUNCTION COUNT_FAVORITE() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE KWEEK_COUNTERS SET LIKES = LIKES + 1 WHERE KWEEK_ID = NEW.KWEEK_ID;
+    ELSE
+        UPDATE KWEEK_COUNTERS SET LIKES = LIKES - 1
+        WHERE KWEEK_ID = OLD.KWEEK_ID AND EXISTS (SELECT 1 FROM KWEEK WHERE ID = OLD.KWEEK_ID);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE FUNCTION COUNT_REKWEEK() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE KWEEK_COUNTERS SET REKWEEKS = REKWEEKS + 1 WHERE KWEEK_ID = NEW.KWEEK_ID;
+    ELSE
+        UPDATE KWEEK_COUNTERS SET REKWEEKS = REKWEEKS - 1
+        WHERE KWEEK_ID = OLD.KWEEK_ID AND EXISTS (SELECT 1 FROM KWEEK WHERE ID = OLD.KWEEK_ID);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+-- The counters of a deleted kweek are left alone while the deletion cascades to its likes, rekweeks and replies
+CREATE TRIGGER KWEEK_COUNTERS_KWEEK AFTER INSERT OR DELETE ON KWEEK
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_KWEEK();
+
+CREATE TRIGGER KWEEK_COUNTERS_FAVORITE AFTER INSERT OR DELETE ON FAVORITE
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_FAVORITE();
+
+CREATE TRIGGER KWEEK_COUNTERS_REKWEEK AFTER INSERT OR DELETE ON REKWEEK
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_REKWEEK();
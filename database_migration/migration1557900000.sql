@@ -0,0 +1,53 @@
+-- The 5 minutes bucket a kweek created at the given time is counted in
+CREATE FUNCTION TREND_BUCKET(CREATED_AT TIMESTAMP) RETURNS TIMESTAMP AS $$
+    SELECT DATE_TRUNC('MINUTE', CREATED_AT) - (EXTRACT(MINUTE FROM CREATED_AT)::INT % 5) * INTERVAL '1 MINUTE';
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE TABLE HASHTAG_BUCKET
+(
+    HASHTAG_ID INT       NOT NULL REFERENCES HASHTAG (ID) ON DELETE CASCADE,
+    BUCKET     TIMESTAMP NOT NULL,
+    KWEEKS     INT       NOT NULL,
+    PRIMARY KEY (HASHTAG_ID, BUCKET)
+);
+
+CREATE INDEX HASHTAG_BUCKET_BUCKET ON HASHTAG_BUCKET (BUCKET);
+
+INSERT INTO HASHTAG_BUCKET (HASHTAG_ID, BUCKET, KWEEKS)
+SELECT KH.HASHTAG_ID, TREND_BUCKET(K.CREATED_AT), COUNT(*)
+FROM KWEEK_HASHTAG KH
+         JOIN KWEEK K ON K.ID = KH.KWEEK_ID
+GROUP BY KH.HASHTAG_ID, TREND_BUCKET(K.CREATED_AT);
+
+CREATE FUNCTION COUNT_KWEEK_HASHTAG() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO HASHTAG_BUCKET (HASHTAG_ID, BUCKET, KWEEKS)
+        SELECT NEW.HASHTAG_ID, TREND_BUCKET(CREATED_AT), 1 FROM KWEEK WHERE ID = NEW.KWEEK_ID
+        ON CONFLICT (HASHTAG_ID, BUCKET) DO UPDATE SET KWEEKS = HASHTAG_BUCKET.KWEEKS + 1;
+    ELSE
+        UPDATE HASHTAG_BUCKET SET KWEEKS = KWEEKS - 1
+        WHERE HASHTAG_ID = OLD.HASHTAG_ID
+          AND BUCKET = (SELECT TREND_BUCKET(CREATED_AT) FROM KWEEK WHERE ID = OLD.KWEEK_ID)
+          AND EXISTS (SELECT 1 FROM HASHTAG WHERE ID = OLD.HASHTAG_ID);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+-- Done before the kweek is deleted, its creation time is gone by the time the deletion cascades to its hashtags
+CREATE FUNCTION UNCOUNT_KWEEK_HASHTAGS() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE HASHTAG_BUCKET B SET KWEEKS = B.KWEEKS - KH.KWEEKS
+    FROM (SELECT HASHTAG_ID, COUNT(*) AS KWEEKS FROM KWEEK_HASHTAG WHERE KWEEK_ID = OLD.ID GROUP BY HASHTAG_ID) KH
+    WHERE B.HASHTAG_ID = KH.HASHTAG_ID AND B.BUCKET = TREND_BUCKET(OLD.CREATED_AT);
+    RETURN OLD;
+END;
+$$ LANGUAGE PLPGSQL;
+
+-- The hashtags of a deleted kweek are uncounted by HASHTAG_BUCKET_KWEEK, the cascade finds no kweek and skips them
+CREATE TRIGGER HASHTAG_BUCKET_KWEEK_HASHTAG AFTER INSERT OR DELETE ON KWEEK_HASHTAG
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_KWEEK_HASHTAG();
+
+CREATE TRIGGER HASHTAG_BUCKET_KWEEK BEFORE DELETE ON KWEEK
+    FOR EACH ROW EXECUTE PROCEDURE UNCOUNT_KWEEK_HASHTAGS();
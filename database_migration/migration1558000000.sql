@@ -0,0 +1 @@
+CREATE INDEX KWEEK_SEARCH_TOKENS_TOKENS ON KWEEK_SEARCH_TOKENS USING GIN (TOKENS);
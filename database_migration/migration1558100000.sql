@@ -0,0 +1,22 @@
+-- Bumped for every lexeme of a kweek that is added or removed, so the cached results of the searches for the
+-- lexeme are known to be stale
+CREATE TABLE SEARCH_TERM_GENERATION
+(
+    LEXEME     TEXT PRIMARY KEY,
+    GENERATION BIGINT NOT NULL
+);
+
+CREATE FUNCTION BUMP_SEARCH_TERM_GENERATIONS() RETURNS TRIGGER AS $$
+BEGIN
+    -- The lexemes are locked in order so concurrent kweeks do not deadlock
+    INSERT INTO SEARCH_TERM_GENERATION (LEXEME, GENERATION)
+    SELECT LEXEME, 1
+    FROM UNNEST(TSVECTOR_TO_ARRAY(CASE WHEN TG_OP = 'INSERT' THEN NEW.TOKENS ELSE OLD.TOKENS END)) AS LEXEME
+    ORDER BY LEXEME
+    ON CONFLICT (LEXEME) DO UPDATE SET GENERATION = SEARCH_TERM_GENERATION.GENERATION + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE TRIGGER SEARCH_TERM_GENERATION_KWEEK_SEARCH_TOKENS AFTER INSERT OR DELETE ON KWEEK_SEARCH_TOKENS
+    FOR EACH ROW EXECUTE PROCEDURE BUMP_SEARCH_TERM_GENERATIONS();
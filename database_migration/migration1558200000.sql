@@ -0,0 +1,101 @@
+CREATE TABLE UNSEEN_COUNTERS
+(
+    USERNAME             VARCHAR PRIMARY KEY REFERENCES USER_CREDENTIALS (USERNAME) ON DELETE CASCADE,
+    NOTIFICATIONS        INT NOT NULL DEFAULT 0,
+    REPLIES_AND_MENTIONS INT NOT NULL DEFAULT 0,
+    CONVERSATIONS        INT NOT NULL DEFAULT 0
+);
+
+-- The unseen messages of each conversation, a conversation is unseen while it has any
+CREATE TABLE UNSEEN_CONVERSATION
+(
+    USERNAME         VARCHAR NOT NULL REFERENCES USER_CREDENTIALS (USERNAME) ON DELETE CASCADE,
+    PARTNER_USERNAME VARCHAR NOT NULL,
+    MESSAGES         INT     NOT NULL,
+    PRIMARY KEY (USERNAME, PARTNER_USERNAME)
+);
+
+INSERT INTO UNSEEN_CONVERSATION (USERNAME, PARTNER_USERNAME, MESSAGES)
+SELECT TO_USERNAME, FROM_USERNAME, COUNT(*) FROM MESSAGE WHERE NOT IS_SEEN GROUP BY TO_USERNAME, FROM_USERNAME;
+
+INSERT INTO UNSEEN_COUNTERS (USERNAME, NOTIFICATIONS, REPLIES_AND_MENTIONS, CONVERSATIONS)
+SELECT U.USERNAME,
+       (SELECT COUNT(*) FROM NOTIFICATION
+        WHERE NOTIFIED_USERNAME = U.USERNAME AND NOT IS_SEEN AND TYPE NOT IN ('MENTION', 'REPLY')),
+       (SELECT COUNT(*) FROM NOTIFICATION
+        WHERE NOTIFIED_USERNAME = U.USERNAME AND NOT IS_SEEN AND TYPE IN ('MENTION', 'REPLY')),
+       (SELECT COUNT(*) FROM UNSEEN_CONVERSATION WHERE USERNAME = U.USERNAME AND MESSAGES > 0)
+FROM USER_CREDENTIALS U;
+
+CREATE FUNCTION COUNT_UNSEEN_NOTIFICATION() RETURNS TRIGGER AS $$
+DECLARE
+    DELTA INT := 0;
+    CHANGED NOTIFICATION;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        CHANGED := NEW;
+        DELTA := CASE WHEN NEW.IS_SEEN THEN 0 ELSE 1 END;
+    ELSIF TG_OP = 'DELETE' THEN
+        CHANGED := OLD;
+        DELTA := CASE WHEN OLD.IS_SEEN THEN 0 ELSE -1 END;
+    ELSE
+        CHANGED := NEW;
+        DELTA := (CASE WHEN NEW.IS_SEEN THEN 0 ELSE 1 END) - (CASE WHEN OLD.IS_SEEN THEN 0 ELSE 1 END);
+    END IF;
+    IF DELTA = 0 THEN
+        RETURN NULL;
+    END IF;
+    IF CHANGED.TYPE IN ('MENTION', 'REPLY') THEN
+        INSERT INTO UNSEEN_COUNTERS AS C (USERNAME, REPLIES_AND_MENTIONS)
+        SELECT USERNAME, DELTA FROM USER_CREDENTIALS WHERE USERNAME = CHANGED.NOTIFIED_USERNAME
+        ON CONFLICT (USERNAME) DO UPDATE SET REPLIES_AND_MENTIONS = C.REPLIES_AND_MENTIONS + DELTA;
+    ELSE
+        INSERT INTO UNSEEN_COUNTERS AS C (USERNAME, NOTIFICATIONS)
+        SELECT USERNAME, DELTA FROM USER_CREDENTIALS WHERE USERNAME = CHANGED.NOTIFIED_USERNAME
+        ON CONFLICT (USERNAME) DO UPDATE SET NOTIFICATIONS = C.NOTIFICATIONS + DELTA;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE FUNCTION COUNT_UNSEEN_MESSAGE() RETURNS TRIGGER AS $$
+DECLARE
+    DELTA INT := 0;
+    CHANGED MESSAGE;
+    UNSEEN_MESSAGES INT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        CHANGED := NEW;
+        DELTA := CASE WHEN NEW.IS_SEEN THEN 0 ELSE 1 END;
+    ELSIF TG_OP = 'DELETE' THEN
+        CHANGED := OLD;
+        DELTA := CASE WHEN OLD.IS_SEEN THEN 0 ELSE -1 END;
+    ELSE
+        CHANGED := NEW;
+        DELTA := (CASE WHEN NEW.IS_SEEN THEN 0 ELSE 1 END) - (CASE WHEN OLD.IS_SEEN THEN 0 ELSE 1 END);
+    END IF;
+    -- Nothing to count for a receiver being deleted
+    IF DELTA = 0 OR NOT EXISTS (SELECT 1 FROM USER_CREDENTIALS WHERE USERNAME = CHANGED.TO_USERNAME) THEN
+        RETURN NULL;
+    END IF;
+    -- The counters row is locked before the conversation, like the reconciliation does
+    INSERT INTO UNSEEN_COUNTERS (USERNAME) VALUES (CHANGED.TO_USERNAME) ON CONFLICT (USERNAME) DO NOTHING;
+    PERFORM 1 FROM UNSEEN_COUNTERS WHERE USERNAME = CHANGED.TO_USERNAME FOR UPDATE;
+    INSERT INTO UNSEEN_CONVERSATION AS C (USERNAME, PARTNER_USERNAME, MESSAGES)
+    VALUES (CHANGED.TO_USERNAME, CHANGED.FROM_USERNAME, DELTA)
+    ON CONFLICT (USERNAME, PARTNER_USERNAME) DO UPDATE SET MESSAGES = C.MESSAGES + DELTA
+    RETURNING C.MESSAGES INTO UNSEEN_MESSAGES;
+    IF DELTA > 0 AND UNSEEN_MESSAGES = DELTA THEN
+        UPDATE UNSEEN_COUNTERS SET CONVERSATIONS = CONVERSATIONS + 1 WHERE USERNAME = CHANGED.TO_USERNAME;
+    ELSIF DELTA < 0 AND UNSEEN_MESSAGES = 0 THEN
+        UPDATE UNSEEN_COUNTERS SET CONVERSATIONS = CONVERSATIONS - 1 WHERE USERNAME = CHANGED.TO_USERNAME;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE TRIGGER UNSEEN_COUNTERS_NOTIFICATION AFTER INSERT OR DELETE OR UPDATE OF IS_SEEN ON NOTIFICATION
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_UNSEEN_NOTIFICATION();
+
+CREATE TRIGGER UNSEEN_COUNTERS_MESSAGE AFTER INSERT OR DELETE OR UPDATE OF IS_SEEN ON MESSAGE
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_UNSEEN_MESSAGE();
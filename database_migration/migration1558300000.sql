@@ -0,0 +1,42 @@
+-- The replies to the kweeks of each user and the kweeks mentioning them, other than their own
+CREATE TABLE REPLIES_AND_MENTIONS_INBOX
+(
+    RECIPIENT  VARCHAR   NOT NULL REFERENCES USER_CREDENTIALS (USERNAME) ON DELETE CASCADE ON UPDATE CASCADE,
+    KWEEK_ID   INT       NOT NULL REFERENCES KWEEK (ID) ON DELETE CASCADE,
+    CREATED_AT TIMESTAMP NOT NULL,
+    PRIMARY KEY (RECIPIENT, KWEEK_ID)
+);
+
+CREATE INDEX REPLIES_AND_MENTIONS_INBOX_PAGE ON REPLIES_AND_MENTIONS_INBOX (RECIPIENT, CREATED_AT DESC, KWEEK_ID DESC);
+
+INSERT INTO REPLIES_AND_MENTIONS_INBOX (RECIPIENT, KWEEK_ID, CREATED_AT)
+SELECT R.USERNAME, K.ID, K.CREATED_AT FROM KWEEK K JOIN KWEEK R ON R.ID = K.REPLY_TO
+WHERE R.USERNAME != K.USERNAME
+UNION
+SELECT M.USERNAME, K.ID, K.CREATED_AT FROM KWEEK K JOIN MENTION M ON M.KWEEK_ID = K.ID
+WHERE M.USERNAME != K.USERNAME;
+
+CREATE FUNCTION DELIVER_REPLY() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO REPLIES_AND_MENTIONS_INBOX (RECIPIENT, KWEEK_ID, CREATED_AT)
+    SELECT USERNAME, NEW.ID, NEW.CREATED_AT FROM KWEEK WHERE ID = NEW.REPLY_TO AND USERNAME != NEW.USERNAME
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE FUNCTION DELIVER_MENTION() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO REPLIES_AND_MENTIONS_INBOX (RECIPIENT, KWEEK_ID, CREATED_AT)
+    SELECT NEW.USERNAME, ID, CREATED_AT FROM KWEEK WHERE ID = NEW.KWEEK_ID AND USERNAME != NEW.USERNAME
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+-- A reply that also mentions the author of the replied to kweek is delivered once
+CREATE TRIGGER REPLIES_AND_MENTIONS_INBOX_REPLY AFTER INSERT ON KWEEK
+    FOR EACH ROW WHEN (NEW.REPLY_TO IS NOT NULL) EXECUTE PROCEDURE DELIVER_REPLY();
+
+CREATE TRIGGER REPLIES_AND_MENTIONS_INBOX_MENTION AFTER INSERT ON MENTION
+    FOR EACH ROW EXECUTE PROCEDURE DELIVER_MENTION();
@@ -0,0 +1,18 @@
+-- Hashtags differing only in case are merged into the oldest one
+CREATE TEMPORARY TABLE HASHTAG_MERGE AS
+SELECT ID, KEPT_ID FROM (SELECT ID, MIN(ID) OVER (PARTITION BY LOWER(TEXT)) AS KEPT_ID FROM HASHTAG) H
+WHERE ID != KEPT_ID;
+
+-- The trend buckets are moved by hand, the triggers only count inserted and deleted kweek hashtags
+INSERT INTO HASHTAG_BUCKET AS B (HASHTAG_ID, BUCKET, KWEEKS)
+SELECT M.KEPT_ID, B.BUCKET, SUM(B.KWEEKS) FROM HASHTAG_BUCKET B JOIN HASHTAG_MERGE M ON M.ID = B.HASHTAG_ID
+GROUP BY M.KEPT_ID, B.BUCKET
+ON CONFLICT (HASHTAG_ID, BUCKET) DO UPDATE SET KWEEKS = B.KWEEKS + EXCLUDED.KWEEKS;
+
+UPDATE KWEEK_HASHTAG KH SET HASHTAG_ID = M.KEPT_ID FROM HASHTAG_MERGE M WHERE KH.HASHTAG_ID = M.ID;
+
+DELETE FROM HASHTAG WHERE ID IN (SELECT ID FROM HASHTAG_MERGE);
+
+DROP TABLE HASHTAG_MERGE;
+
+CREATE UNIQUE INDEX HASHTAG_TEXT ON HASHTAG (LOWER(TEXT));
@@ -0,0 +1,22 @@
+-- The number of kweek hashtags referencing each hashtag, the unused hashtags are removed by a periodic sweep
+ALTER TABLE HASHTAG ADD COLUMN KWEEKS INT NOT NULL DEFAULT 0;
+
+UPDATE HASHTAG H SET KWEEKS = KH.KWEEKS
+FROM (SELECT HASHTAG_ID, COUNT(*) AS KWEEKS FROM KWEEK_HASHTAG GROUP BY HASHTAG_ID) KH
+WHERE H.ID = KH.HASHTAG_ID;
+
+CREATE INDEX HASHTAG_UNUSED ON HASHTAG (ID) WHERE KWEEKS = 0;
+
+CREATE FUNCTION COUNT_HASHTAG_KWEEKS() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE HASHTAG SET KWEEKS = KWEEKS + 1 WHERE ID = NEW.HASHTAG_ID;
+    ELSE
+        UPDATE HASHTAG SET KWEEKS = KWEEKS - 1 WHERE ID = OLD.HASHTAG_ID;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE PLPGSQL;
+
+CREATE TRIGGER HASHTAG_KWEEKS AFTER INSERT OR DELETE ON KWEEK_HASHTAG
+    FOR EACH ROW EXECUTE PROCEDURE COUNT_HASHTAG_KWEEKS();
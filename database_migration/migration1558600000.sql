@@ -0,0 +1,2 @@
+-- The replies to a kweek in the order they are paginated in
+CREATE INDEX KWEEK_REPLY_TO ON KWEEK (REPLY_TO, CREATED_AT, ID);
@@ -99,10 +99,10 @@ def get_messages(from_username, to_username, last_message_retrieved_id=None):
         raise Exception('Username who sent this message does not exist.')
     if actions.is_user(to_username) is False:
         raise Exception('Username who want to receive this message does not exist.')
-    messages = query_factory.get_messages(from_username, to_username)
+    messages = query_factory.get_messages(from_username, to_username, stream=True)
     try:
-        messages = actions.paginate(dictionaries_list=messages, required_size=20,
-                                    start_after_key='id', start_after_value=last_message_retrieved_id)
+        messages = actions.paginate_stream(dictionaries=messages, required_size=20,
+                                           start_after_key='id', start_after_value=last_message_retrieved_id)
     except TypeError:
         raise
     if messages is None:
@@ -151,6 +151,9 @@ def get_conversations(auth_username, last_conversations_retrieved_id=None):
     conversation_list = []
     if len(conversations) == 0:
         return conversation_list
+    friendships = actions.get_friendships(auth_username, [
+        conversation['from_username'] if conversation['to_username'] == auth_username
+        else conversation['to_username'] for conversation in conversations])
     for conversation in conversations:
         to_username = conversation['to_username']
         from_username = conversation['from_username']
@@ -177,18 +180,7 @@ def get_conversations(auth_username, last_conversations_retrieved_id=None):
         dictionary.update(temp)
         temp = {'profile_image_url': conversation['profile_image_url']}
         dictionary.update(temp)
-        flag = check_follow(auth_username, username)
-        temp = {'following': flag}
-        dictionary.update(temp)
-        flag = check_follow(username, auth_username)
-        temp = {'follows_you': flag}
-        dictionary.update(temp)
-        flag = check_block(auth_username, username)
-        temp = {'blocked': flag}
-        dictionary.update(temp)
-        flag = check_mute(auth_username, username)
-        temp = {'muted': flag}
-        dictionary.update(temp)
+        dictionary.update(friendships[username])
         user = User(dictionary)
         dic2 = {'user': user}
         dic2.update(dic)
@@ -310,6 +302,8 @@ def get_recent_conversationers(from_username, last_conversationers_retrieved_use
     conversationer_list = []
     if len(conversationers) == 0:
         return conversationer_list
+    friendships = actions.get_friendships(from_username,
+                                          [conversation['username'] for conversation in conversationers])
     for conversation in conversationers:
         to_username = conversation['username']
 
@@ -318,18 +312,7 @@ def get_recent_conversationers(from_username, last_conversationers_retrieved_use
         dictionary.update(temp)
         temp = {'profile_image_url': conversation['profile_image_url']}
         dictionary.update(temp)
-        flag = check_follow(from_username, to_username)
-        temp = {'following': flag}
-        dictionary.update(temp)
-        flag = check_follow(to_username, from_username)
-        temp = {'follows_you': flag}
-        dictionary.update(temp)
-        flag = check_block(from_username, to_username)
-        temp = {'blocked': flag}
-        dictionary.update(temp)
-        flag = check_mute(from_username, to_username)
-        temp = {'muted': flag}
-        dictionary.update(temp)
+        dictionary.update(friendships[to_username])
         user = User(dictionary)
 
         conversationer_list.append(user)
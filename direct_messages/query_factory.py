@@ -31,7 +31,7 @@ def create_message(from_username, to_username, created_at, text, media_url):
     return response
 
 
-def get_messages(from_username, to_username):
+def get_messages(from_username, to_username, stream=False):
     """
              This function retrieve a list of messages from the database.
 
@@ -39,6 +39,7 @@ def get_messages(from_username, to_username):
 
                  - *from_username*: user who is send the message.
                  - *to_username*: user who is received the message.
+                 - *stream*: Optional. Yield the messages from a server side cursor instead of returning a list.
 
              *Returns:*
                 - *List of Dictionaries*: {
@@ -67,6 +68,8 @@ def get_messages(from_username, to_username):
                     ORDER BY CREATED_AT DESC 
                  """
     data = (from_username, to_username, to_username, from_username)
+    if stream:
+        return db_manager.execute_query_stream(query, data)
     response = db_manager.execute_query(query, data)
     return response
 
@@ -282,6 +285,7 @@ def set_conversation_seen(from_username, to_username):
                     SET IS_SEEN = TRUE
                     WHERE FROM_USERNAME = %s
                     AND TO_USERNAME = %s
+                    AND IS_SEEN = FALSE
                   """
     data = (from_username, to_username)
     response = db_manager.execute_query_no_return(query, data)
@@ -290,45 +294,17 @@ def set_conversation_seen(from_username, to_username):
 
 def get_unseen_conversations(auth_username):
     """
-        gets the unseen conversations.
+        gets the unseen conversations, kept in UNSEEN_COUNTERS by triggers.
 
         *Parameters:*
             -*authorized_username (string)*: The username  sends the message.
         *Returns:*
-            -dictionary of is_seen: dictionary of is_seen.
+            -dictionary of count: the number of unseen conversations, empty if the user has none.
     """
 
     query: str = """
-    WITH OUTER_GROUP as(			
-                                    WITH INNER_GROUP AS(
-                                        SELECT SCREEN_NAME, PROFILE_IMAGE_URL, ID, FROM_USERNAME, TO_USERNAME , 
-                                        MESSAGE.CREATED_AT, TEXT,  MEDIA_URL,IS_SEEN,
-                                        REPLACE(CONCAT(FROM_USERNAME,TO_USERNAME),%s,'')AS T
-                                        FROM MESSAGE INNER JOIN PROFILE ON USERNAME=FROM_USERNAME
-                                        WHERE TO_USERNAME=%s
-                                        AND FROM_USERNAME IN
-                                        (
-                                            SELECT DISTINCT TO_USERNAME
-                                            FROM MESSAGE
-                                            WHERE FROM_USERNAME=%s
-
-                                            UNION
-
-                                            SELECT DISTINCT FROM_USERNAME
-                                            FROM MESSAGE
-                                            WHERE TO_USERNAME=%s
-                                        )
-                                    )
-
-                    SELECT *,ROW_NUMBER()OVER (PARTITION BY T ORDER BY CREATED_AT DESC) as TEMP
-                    FROM INNER_GROUP)
-
-                    SELECT count(*)
-                    FROM OUTER_GROUP
-                    WHERE OUTER_GROUP.TEMP=1
-                    and is_seen =false
-                    group by(is_seen)
-                    """
-    data = (auth_username, auth_username, auth_username, auth_username)
-    response = db_manager.execute_query(query, data)
+                    SELECT CONVERSATIONS AS COUNT FROM UNSEEN_COUNTERS WHERE USERNAME = %s AND CONVERSATIONS > 0
+                 """
+    data = (auth_username,)
+    response = db_manager.execute_query(query, data, prepared=True)
     return response
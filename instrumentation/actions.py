@@ -0,0 +1,137 @@
+import hmac
+import threading
+from database_manager import db_manager
+
+"""
+    All the functions containing the logic should reside here.
+    The routes functions should contain no logic, they should only call the functions in this module.
+"""
+
+endpoint_statistics = {}
+endpoint_statistics_lock = threading.Lock()
+
+
+def record_request(endpoint, request_instrumentation):
+    """
+        Adds the queries executed by a request to the aggregated statistics of its endpoint.
+
+
+        *Parameters:*
+            - *endpoint (string)*: The method and url rule of the request, e.g. 'GET /kweeks/timelines/home'.
+            - *request_instrumentation (dictionary)*: The queries of the request, as returned by
+              `DatabaseManager.get_request_instrumentation`. Nothing is recorded if None.
+    """
+    if request_instrumentation is None:
+        return
+    with endpoint_statistics_lock:
+        statistics = endpoint_statistics.setdefault(endpoint, {
+            'requests': 0,
+            'queries': 0,
+            'max_queries': 0,
+            'database_time': 0.0,
+            'statements': {}
+        })
+        statistics['requests'] += 1
+        statistics['queries'] += request_instrumentation['queries']
+        statistics['max_queries'] = max(statistics['max_queries'], request_instrumentation['queries'])
+        statistics['database_time'] += request_instrumentation['database_time']
+        for statement, (count, time) in request_instrumentation['statements'].items():
+            statement_statistics = statistics['statements'].setdefault(statement, [0, 0.0])
+            statement_statistics[0] += count
+            statement_statistics[1] += time
+
+
+def get_endpoint_statistics(top_statements=5):
+    """
+        Gets the aggregated query statistics of every endpoint, the endpoints spending the most time in the
+        database first.
+
+
+        *Parameters:*
+            - *top_statements (int)*: The number of statements to return per endpoint, the most executed first.
+
+        *Returns:*
+            - *List of dictionaries*: {
+                                | *endpoint (string)*: The method and url rule of the endpoint.,
+                                | *requests (int)*: The number of recorded requests.,
+                                | *queries (int)*: The total number of queries executed by the requests.,
+                                | *average_queries (float)*: The average number of queries per request.,
+                                | *max_queries (int)*: The largest number of queries executed by one request.,
+                                | *database_time (float)*: The total seconds spent executing the queries.,
+                                | *average_database_time (float)*: The average seconds spent per request.,
+                                | *statements (list)*: {
+                                |     *statement (string)*: The normalized statement.,
+                                |     *count (int)*: The number of executions.,
+                                |     *average_count (float)*: The average number of executions per request.,
+                                |     *time (float)*: The total seconds spent executing the statement.
+                                | }
+                                | }
+    """
+    with endpoint_statistics_lock:
+        results = []
+        for endpoint, statistics in endpoint_statistics.items():
+            statements = sorted(statistics['statements'].items(), key=lambda item: item[1][0], reverse=True)
+            results.append({
+                'endpoint': endpoint,
+                'requests': statistics['requests'],
+                'queries': statistics['queries'],
+                'average_queries': statistics['queries'] / statistics['requests'],
+                'max_queries': statistics['max_queries'],
+                'database_time': statistics['database_time'],
+                'average_database_time': statistics['database_time'] / statistics['requests'],
+                'statements': [{
+                    'statement': statement,
+                    'count': count,
+                    'average_count': count / statistics['requests'],
+                    'time': time
+                } for statement, (count, time) in statements[:top_statements]]
+            })
+    results.sort(key=lambda result: result['database_time'], reverse=True)
+    return results
+
+
+def reset_endpoint_statistics():
+    """
+        Clears the aggregated query statistics of all the endpoints.
+    """
+    with endpoint_statistics_lock:
+        endpoint_statistics.clear()
+
+
+def get_database_statistics():
+    """
+        Gets the query statistics of the endpoints together with the connection pool and prepared statements usage.
+
+
+        *Returns:*
+            - *Dictionary*: {
+                                | *endpoints (list)*: See `get_endpoint_statistics`.,
+                                | *pool (dictionary)*: See `database_manager.ConnectionPool.statistics`.,
+                                | *replica_pools (list)*: The statistics of the pool of each read replica.,
+                                | *prepared_statements (dictionary)*: See `DatabaseManager.get_prepared_statistics`.
+                                | }
+    """
+    return {
+        'endpoints': get_endpoint_statistics(),
+        'pool': db_manager.get_pool_statistics(),
+        'replica_pools': db_manager.get_replica_pool_statistics(),
+        'prepared_statements': db_manager.get_prepared_statistics()
+    }
+
+
+def is_debug_key(key, debug_key):
+    """
+        Checks the key sent with a request to the debug endpoints.
+
+
+        *Parameters:*
+            - *key (string)*: The key sent with the request.
+            - *debug_key (string)*: The configured debug key, the debug endpoints are disabled if None.
+
+        *Returns:*
+            - *True*: If the key matches the debug key.
+            - *False*: Otherwise.
+    """
+    if not key or not debug_key:
+        return False
+    return hmac.compare_digest(key.encode('utf-8'), debug_key.encode('utf-8'))
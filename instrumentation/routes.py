@@ -0,0 +1,29 @@
+from flask_restplus import Resource, abort
+from flask import request
+from app import app
+import api_namespaces
+from . import actions
+
+debug_api = api_namespaces.debug_api
+
+
+@debug_api.route('/queries')
+class Queries(Resource):
+    @debug_api.response(code=200, description='Query statistics returned successfully.')
+    @debug_api.response(code=401, description='Unauthorized access.')
+    @debug_api.doc(security='KwikkerDebugKey')
+    def get(self):
+        """ Retrieves the per endpoint query counts and database time, and the database connections usage. """
+        if not actions.is_debug_key(request.headers.get('DEBUG-KEY'), app.config['DEBUG_KEY']):
+            abort(401, message='Unauthorized access.')
+        return actions.get_database_statistics(), 200
+
+    @debug_api.response(code=204, description='Query statistics cleared successfully.')
+    @debug_api.response(code=401, description='Unauthorized access.')
+    @debug_api.doc(security='KwikkerDebugKey')
+    def delete(self):
+        """ Clears the per endpoint query statistics. """
+        if not actions.is_debug_key(request.headers.get('DEBUG-KEY'), app.config['DEBUG_KEY']):
+            abort(401, message='Unauthorized access.')
+        actions.reset_endpoint_statistics()
+        return 'Query statistics cleared successfully.', 204
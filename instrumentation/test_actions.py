@@ -0,0 +1,61 @@
+import pytest
+from database_manager import db_manager
+from . import actions
+
+
+def test_request_instrumentation():
+    db_manager.start_request_instrumentation()
+    db_manager.execute_query('SELECT   1 AS ONE')
+    db_manager.execute_query('SELECT 1 AS ONE')
+    db_manager.execute_query_no_return('SELECT 2')
+    request_instrumentation = db_manager.get_request_instrumentation()
+    assert request_instrumentation['queries'] == 3
+    assert request_instrumentation['database_time'] > 0
+    assert request_instrumentation['statements']['SELECT 1 AS ONE'][0] == 2
+    assert request_instrumentation['statements']['SELECT 2'][0] == 1
+
+
+def test_record_request():
+    actions.reset_endpoint_statistics()
+    for queries in (1, 3):
+        actions.record_request('GET /test', {
+            'queries': queries,
+            'database_time': 0.5,
+            'statements': {'SELECT 1': [queries, 0.5]}
+        })
+    actions.record_request('GET /other', {'queries': 1, 'database_time': 2.0, 'statements': {'SELECT 2': [1, 2.0]}})
+    actions.record_request('GET /ignored', None)
+    statistics = actions.get_endpoint_statistics()
+    assert [endpoint['endpoint'] for endpoint in statistics] == ['GET /other', 'GET /test']
+    assert statistics[1]['requests'] == 2
+    assert statistics[1]['queries'] == 4
+    assert statistics[1]['average_queries'] == 2
+    assert statistics[1]['max_queries'] == 3
+    assert statistics[1]['statements'] == [{'statement': 'SELECT 1', 'count': 4, 'average_count': 2, 'time': 1.0}]
+    actions.reset_endpoint_statistics()
+    assert actions.get_endpoint_statistics() == []
+
+
+def test_slow_query_log(caplog):
+    threshold = db_manager.slow_query_threshold
+    db_manager.slow_query_threshold = 0.05
+    try:
+        db_manager.execute_query('SELECT PG_SLEEP(0.1)')
+        db_manager.execute_query('SELECT 1')
+    finally:
+        db_manager.slow_query_threshold = threshold
+    slow_queries = [record.getMessage() for record in caplog.records if record.name == 'database_manager']
+    assert len(slow_queries) == 1
+    assert 'SELECT PG_SLEEP(0.1)' in slow_queries[0]
+
+
+@pytest.mark.parametrize("key, debug_key, expected_output",
+                         [
+                             ('key', 'key', True),
+                             ('wrong', 'key', False),
+                             (None, 'key', False),
+                             ('key', None, False),
+                             (None, None, False)
+                         ])
+def test_is_debug_key(key, debug_key, expected_output):
+    assert actions.is_debug_key(key, debug_key) == expected_output
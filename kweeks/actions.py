@@ -1,13 +1,31 @@
+import logging
+import re
+import threading
+import time
 from datetime import datetime
+from psycopg2 import errors
+from app import app, socketio
 from models import Kweek, Hashtag, Mention, User
-from kweeks.query_factory import add_kweek, delete_main_kweek, retrieve_hashtags, retrieve_mentions, retrieve_replies,\
-    retrieve_user, check_following, check_blocked,\
-    check_muted, retrieve_kweek, get_user, add_kweek_hashtag, create_mention, create_hashtag, check_existing_hashtag, \
-    get_kweek_id, update_hashtag, validate_id, check_kweek_writer, check_kweek_liker, check_kweek_owner, add_rekweek,\
-    delete_rekweeks, check_kweek_rekweeker, add_like, delete_like,  check_kweek_mention
-from notifications.actions import create_notifications
-from timelines_and_trends.actions import get_reply_to_info
+from kweeks.query_factory import add_kweek, delete_main_kweek, retrieve_hashtags, retrieve_mentions,\
+    retrieve_replies, retrieve_user, retrieve_kweek, get_user, delete_unused_hashtags, validate_id, check_kweek_writer,\
+    check_kweek_liker, check_kweek_owner, add_rekweek, delete_rekweeks, check_kweek_rekweeker, add_like, delete_like
+from notifications.actions import create_notifications, push_notifications
+from timelines_and_trends.actions import get_reply_to_info, get_kweek_statistics, get_friendships, \
+    fan_out_kweek, fan_out_rekweek, get_thread_kweeks, kweeks_builder, KweeksPage
 from media.actions import create_url
+from database_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+# A hashtag or mention is a # or @ that does not follow a word character, followed by the word characters after it
+ENTITY_PATTERN = re.compile(r'(?<!\w)([#@])(\w+)')
+# The texts of a batch are joined by a non word character, so that no entity spans two of them
+BATCH_SEPARATOR = '\n'
+
+# The first sweep of the unused hashtags is due an interval after startup
+hashtags_swept_at = time.monotonic()
+hashtags_sweep_lock = threading.Lock()
+hashtags_sweeping = False
 
 
 def create_kweek(request, authorized_username):
@@ -68,7 +86,8 @@ def create_kweek(request, authorized_username):
 
 def insert_kweek(kweek: Kweek):
     """
-            Insert the kweek with its associated data in the data base.
+            Insert the kweek with its associated data in the data base in a single query, and notify the replied
+            to and mentioned users once it is committed.
 
 
             *Parameters:*
@@ -83,30 +102,19 @@ def insert_kweek(kweek: Kweek):
                                 | }
 
     """
-    add_kweek(kweek)
-    kid = get_kweek_id()[0]['id']
-    if kweek.reply_to:
-        notified_user = retrieve_user(kweek.reply_to, 1)[0]['username']
-        create_notifications(kweek.user.username, notified_user, 'REPLY', kid)
-    for hash_obj in kweek.hashtags:
-        test = check_existing_hashtag(hash_obj)
-        if not test:  # then it is a new hashtag
-            create_hashtag(hash_obj)  # create a new hashtag
-            hid = check_existing_hashtag(hash_obj)[0]['id']  # then insert it into kweek-hashtag table
-        else:
-            hid = test[0]['id']
-        add_kweek_hashtag(hid, kid, hash_obj)
-
-    for ment in kweek.mentions:
-        existed = check_kweek_mention(kid, ment)[0]['count']
-        if existed != 0:
-            return True, 'success.', 200
-        response = create_mention(kid, ment)
-        if response is not None:
-            return True, 'success.', 200
-        notified_user = ment.username
-        create_notifications(kweek.user.username, notified_user, 'MENTION', kid)
-
+    with db_manager.transaction():
+        response = add_kweek(kweek, datetime.now())
+        # The failed query rolls the transaction back
+        if not isinstance(response, Exception):
+            kid = response[0]['id']
+            push_notifications(kweek.user.username, [(row['notified_username'], row['type']) for row in response
+                                                     if row['notified_username'] is not None])
+            fan_out_kweek(kid, kweek.user.username)
+    if isinstance(response, errors.ForeignKeyViolation):
+        # The replied to kweek was deleted after it was validated
+        return False, 'The kweek to be replied to does not exist.', 404
+    if isinstance(response, Exception):
+        return False, 'An error occurred in the server.', 500
     return True, 'success.', 200
 
 
@@ -125,43 +133,49 @@ def extract_mentions_hashtags(text):
                                 | }
 
     """
-    hashtags = []
-    mentions = []
-    size = len(text)
-    i = 0
-    while i < size:
-        hashtag_indices_list = []
-        mention_indices_list = []
-        if text[i] == '#':
-            hashtag_indices_list.append(i)
-            for i in range(i + 1, len(text)):
-
-                if (i == size - 1 and text[i] == ' ') or text[i] == ' ':
-                    hashtag_indices_list.append(i)
-                elif i == size - 1:
-                    hashtag_indices_list.append(i + 1)
-                else:
-                    continue
-                hashtag_text = text[hashtag_indices_list[0]:hashtag_indices_list[1]]
-                hashtag = {'indices': hashtag_indices_list, 'text': hashtag_text, 'id': 0}
-                hashtags.append(Hashtag(hashtag))
-                break
-        if text[i] == '@':
-            mention_indices_list.append(i)
-            for i in range(i + 1, len(text)):
-                if (i == size - 1 and text[i] == ' ') or text[i] == ' ':
-                    mention_indices_list.append(i)
-                elif i == size - 1:
-                    mention_indices_list.append(i + 1)
-                else:
-                    continue
-                mention_username = text[mention_indices_list[0] + 1:(mention_indices_list[1])]
-                mention = {'indices': mention_indices_list, 'username': mention_username}
-                mentions.append(Mention(mention))
-                break
-        i += 1
-
+    hashtags, mentions = extract_entities([text])[0]
+    hashtags = [Hashtag({'indices': [start, end], 'text': hashtag_text, 'id': 0})
+                for hashtag_text, start, end in hashtags]
+    mentions = [Mention({'indices': [start, end], 'username': username}) for username, start, end in mentions]
     return hashtags, mentions  # lists of objects
+
+
+def extract_entities(texts):
+    """
+            Extract the hashtags and mentions of many texts in a single pass, e.g. to re-extract the entities of
+            existing kweeks. Entities end at the first character that is not a (Unicode) word character.
+
+
+            *Parameters:*
+                - *texts (list of strings)*: The texts to extract the entities from.
+
+            *Returns:*
+                   -*List of tuples*: {
+                                | *hashtags (list of tuples)*: (text, starting index, ending index) for each
+                                | hashtag of the text, the text of the hashtag includes the #.,
+                                | *mentions (list of tuples)*: (username, starting index, ending index) for each
+                                | mention of the text.
+                                | } for each text.
+
+    """
+    entities = [([], []) for _ in texts]
+    if not texts:
+        return entities
+    index = 0
+    text_start = 0
+    text_end = len(texts[0])
+    for match in ENTITY_PATTERN.finditer(BATCH_SEPARATOR.join(texts)):
+        start, end = match.span()
+        while start > text_end:
+            index += 1
+            text_start = text_end + len(BATCH_SEPARATOR)
+            text_end = text_start + len(texts[index])
+        hashtags, mentions = entities[index]
+        if match.group(1) == '#':
+            hashtags.append((match.group(), start - text_start, end - text_start))
+        else:
+            mentions.append((match.group(2), start - text_start, end - text_start))
+    return entities
 ########################################################################################################################
 
 
@@ -193,9 +207,64 @@ def delete_kweek(kid, authorized_username):
         if not check:
             return False, 'Deletion is not allowed.', 401
     delete_main_kweek(kid)
-    update_hashtag()
+    schedule_hashtags_sweep()
     return True, 'success.', 200
 
+
+def sweep_hashtags(batch_size=None):
+    """
+           Delete the hashtags that are no longer used by any kweek, a batch at a time.
+
+
+           *Parameters:*
+               - *batch_size (int)*: Optional. The number of hashtags deleted in each query.
+                 Default: *None* (HASHTAG_SWEEP_BATCH_SIZE)
+
+
+           *Returns:*
+               -*int*: The number of deleted hashtags.
+               -*Exception* object: If a query produced an error.
+
+    """
+    if batch_size is None:
+        batch_size = app.config['HASHTAG_SWEEP_BATCH_SIZE']
+    swept = 0
+    while True:
+        response = delete_unused_hashtags(batch_size)
+        if isinstance(response, Exception):
+            return response
+        swept += len(response)
+        if len(response) < batch_size:
+            return swept
+
+
+def sweep_hashtags_in_background():
+    global hashtags_sweeping
+    try:
+        response = sweep_hashtags()
+        if isinstance(response, Exception):
+            logger.warning('Could not sweep the hashtags: %s', response)
+    finally:
+        db_manager.end_request()
+        with hashtags_sweep_lock:
+            hashtags_sweeping = False
+
+
+def schedule_hashtags_sweep():
+    """
+           Start sweeping the unused hashtags in the background if the last sweep is older than
+           HASHTAG_SWEEP_INTERVAL seconds and no sweep is running.
+
+    """
+    global hashtags_swept_at, hashtags_sweeping
+    with hashtags_sweep_lock:
+        if hashtags_sweeping or time.monotonic() - hashtags_swept_at < app.config['HASHTAG_SWEEP_INTERVAL']:
+            return
+        hashtags_sweeping = True
+        hashtags_swept_at = time.monotonic()
+    # A greenlet under eventlet or gevent, as the green database pool cannot wake an OS thread
+    socketio.start_background_task(sweep_hashtags_in_background)
+
 ########################################################################################################################
 
 
@@ -260,13 +329,10 @@ def get_kweek(kid, authorized_username, replies_only):
         return True, message, None, replies, code
     hashtags = retrieve_hashtags(kid)  # rows of hahstag-kweek table (*)
     mentions = retrieve_mentions(kid)  # rows of mention table (*)
-    rekweeks = retrieve_user(kid, 3)
-    likers = retrieve_user(kid, 2)  # rows of likers table for those who liked the kweek (usernames)
+    statistics = get_kweek_statistics(authorized_username, kid)
     user = retrieve_user(kid, 1)
     hashtags_list = []  # list of hashtag objects
     mentions_list = []  # list of mention objects
-    rekweeked_by_user = False
-    liked_by_user = False
     if hashtags:
         for hash_obj in hashtags:
             hid = hash_obj['hashtag_id']
@@ -291,58 +357,15 @@ def get_kweek(kid, authorized_username, replies_only):
     user = user[0]
     extrauser = {}
     me = authorized_username  # should be replaced by the function getting the current user
-    check = check_following(me, user['username'])
-    if check:
-        extrauser['following'] = True
-    else:
-        extrauser['following'] = False
-
-    check = check_following(user['username'], me)
-    if check:
-        extrauser['follows_you'] = True
-    else:
-        extrauser['follows_you'] = False
-
-    check = check_blocked(user['username'], me)
-    if check:
-        extrauser['blocked'] = True
-    else:
-        extrauser['blocked'] = False
-    check = check_muted(user['username'], me)
-    if check:
-        extrauser['muted'] = True
-    else:
-        extrauser['muted'] = False
+    # The flags are False rather than None when the user is the authorized user
+    for flag, value in get_friendships(me, [user['username']])[user['username']].items():
+        extrauser[flag] = value is True
     extrauser.update(user)
 
     userobj = User(extrauser)
 
-    if replies:
-        num_of_replies = len(replies)
-    else:
-        num_of_replies = 0
-
-    if likers:
-        num_of_likes = len(likers)
-        for user in likers:
-            if user['username'] == me:
-                liked_by_user = True
-
-    else:
-        num_of_likes = 0
-
-    if rekweeks:
-        num_of_rekweeks = len(rekweeks)
-        for user in rekweeks:
-            if user['username'] == me:
-                rekweeked_by_user = True
-    else:
-        num_of_rekweeks = 0
-
-    kweekdic = {'hashtags': hashtags_list, 'mentions': mentions_list, 'number_of_likes': num_of_likes,
-                'number_of_rekweeks': num_of_rekweeks, 'number_of_replies': num_of_replies,
-                'rekweek_info': None,
-                'liked_by_user': liked_by_user, 'rekweeked_by_user': rekweeked_by_user, 'user': userobj}
+    kweekdic = {'hashtags': hashtags_list, 'mentions': mentions_list, 'rekweek_info': None, 'user': userobj}
+    kweekdic.update(statistics)
     kweek = retrieve_kweek(kid)  # a row of kweek table
     kweek = kweek[0]
     kweekdic.update(kweek)
@@ -351,9 +374,11 @@ def get_kweek(kid, authorized_username, replies_only):
     return True, 'success.', kweekobj, replies, 200
 
 
-def get_kweek_with_replies(kid, authorized_username, replies_only):
+def get_kweek_with_replies(kid, authorized_username, replies_only, last_retrieved_kweek_id=None, cursor=None,
+                           depth=1):
     """
-           Get the credentials of both requested kweek and its replies.
+           Get the credentials of both requested kweek and a page of its replies, with a number of queries that does
+           not depend on the number of replies.
 
 
            *Parameters:*
@@ -361,6 +386,9 @@ def get_kweek_with_replies(kid, authorized_username, replies_only):
                - *authorized_username(string)*: The user currently logged in.
                - *replies_only (bool)*: To indicate whether the kweek with its replies
                 is to be retrieved or the replies only
+               - *last_retrieved_kweek_id (string)*: The id of the last retrieved reply (used to fetch more). Nullable.
+               - *cursor (string)*: The cursor of the page of replies (used to fetch more). Nullable.
+               - *depth (int)*: The number of levels of replies retrieved, 1 for the direct replies and 0 for none.
 
 
            *Returns:*
@@ -369,20 +397,53 @@ def get_kweek_with_replies(kid, authorized_username, replies_only):
                         | successful or not.,
                         | *message (str)*: To specify the reason of failure if detected.
                         | *kweekobj (kweek object )*: the kweek to be retrieved,
-                        | *replies (list of kweek objects )*: replies of the retrieved kweek .
+                        | *replies (KweeksPage of kweek objects )*: replies of the retrieved kweek, oldest first.
                         | }
+               - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+               - *Raise TypeError*: if the replies could not be fetched.
 
     """
-    replies_list_obj = []
-    check, message, kweekobj, replies_list_dics, code = get_kweek(kid, authorized_username, replies_only)
-    if check:
-        if replies_list_dics:
-            for reply in replies_list_dics:
-                relpy_id = reply['id']
-                check_replies, message, k, r, code = get_kweek(relpy_id, authorized_username, False)
-                if check_replies:
-                    replies_list_obj.append(k)
-    return check, message, kweekobj, replies_list_obj, code
+    check, message, code = validate_request(kid)
+    if not check:
+        return check, message, None, [], code
+    kweekobj = None
+    if not replies_only:
+        db_kweek = retrieve_kweek(kid)
+        if isinstance(db_kweek, Exception):
+            return False, 'An error occurred in the server.', None, [], 500
+        kweeks = set_own_friendship_flags(kweeks_builder(db_kweek, authorized_username), authorized_username)
+        # The kweek was deleted after it was validated
+        if not kweeks:
+            return False, 'Kweek does not exist.', None, [], 404
+        kweekobj = kweeks[0]
+    replies = KweeksPage([])
+    if depth > 0:
+        replies = get_thread_kweeks(authorized_username, int(kid), last_retrieved_kweek_id, cursor, depth)
+        if replies is None:
+            return False, 'Reply does not exist.', None, [], 404
+        set_own_friendship_flags(replies, authorized_username)
+    return True, 'success.', kweekobj, replies, 200
+
+
+def set_own_friendship_flags(kweeks, authorized_username):
+    """
+           Set the friendship flags of the authorized user to False on the kweeks they wrote, rather than the None
+           set by the timelines.
+
+
+           *Parameters:*
+               - *kweeks (list of kweek objects)*: The kweeks to be adjusted.
+               - *authorized_username(string)*: The user currently logged in.
+
+
+           *Returns:*
+               -*List of kweek objects*: The adjusted kweeks.
+
+    """
+    for kweek in kweeks:
+        if kweek.user.username == authorized_username:
+            kweek.user.following = kweek.user.follows_you = kweek.user.blocked = kweek.user.muted = False
+    return kweeks
 ########################################################################################################################
 
 
@@ -415,6 +476,7 @@ def create_rekweek(request, authorized_username):
     else:
         return False, 'No kweek id found.', 400
     add_rekweek(rekweek_id, authorized_username)
+    fan_out_rekweek(rekweek_id, authorized_username)
     notified_user = retrieve_user(rekweek_id, 1)[0]['username']
     create_notifications(authorized_username, notified_user, 'REKWEEK', rekweek_id)
     return True, 'success.', 200
@@ -585,30 +647,12 @@ def retrieve_users(authorized_username, user_list):
        """
     users_list = []
     me = authorized_username
+    friendships = get_friendships(me, [user['username'] for user in user_list])
     for user in user_list:
         extrauser = {}
-        check = check_following(me, user['username'])
-        if check:
-            extrauser['following'] = True
-        else:
-            extrauser['following'] = False
-
-        check = check_following(user['username'], me)
-        if check:
-            extrauser['follows_you'] = True
-        else:
-            extrauser['follows_you'] = False
-
-        check = check_blocked(user['username'], me)
-        if check:
-            extrauser['blocked'] = True
-        else:
-            extrauser['blocked'] = False
-        check = check_muted(user['username'], me)
-        if check:
-            extrauser['muted'] = True
-        else:
-            extrauser['muted'] = False
+        # The flags are False rather than None when the user is the authorized user
+        for flag, value in friendships[user['username']].items():
+            extrauser[flag] = value is True
         user.update(extrauser)
         userobj = User(user)
         users_list.append(userobj)
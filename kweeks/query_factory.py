@@ -1,5 +1,5 @@
 import database_manager
-from models import Kweek, Hashtag, Mention
+from models import Kweek
 from datetime import datetime
 db_manager = database_manager.db_manager
 
@@ -20,77 +20,90 @@ def get_user(username):
     return response
 
 
-def add_kweek(kweek: Kweek):
+def add_kweek(kweek: Kweek, notified_at):
     """
-                   Query to insert kweek into the data base.
+                   Query to insert a kweek with its hashtags and mentions, and to notify the replied to and mentioned
+                   users, in a single statement. The hashtags are matched regardless of case, the ones that do not
+                   exist are created.
+                   Mentions of unknown users and repeated mentions of a user are skipped.
 
                    *Parameters*:
                        - *kweek (object)*: The kweek object to be inserted.
-
-       """
-    query: str = """INSERT INTO  KWEEK (CREATED_AT,TEXT,MEDIA_URL,USERNAME,REPLY_TO) VALUES(%s,%s,%s,%s,%s) """
-    data = (kweek.created_at, kweek.text, kweek.media_url, kweek.user.username, kweek.reply_to)
-    db_manager.execute_query_no_return(query, data)
-
-
-def get_kweek_id():
-    """
-                   Query to get the last kweek id inserted in the data base.
-
+                       - *notified_at (datetime)*: The date and time at which the notifications are created.
 
                    *Returns*:
-                       - *response*: A list of dictionary containing the  kweek id   .
-       """
-    query: str = """SELECT ID FROM KWEEK ORDER BY ID DESC LIMIT 1 """
-    response = db_manager.execute_query(query)
-    return response
-
-
-def create_mention(kid, ment: Mention):
-    """
-                   Query to insert a mention in the database.
-
-                   *Parameters*:
-                        -*ment(object)*: The mention object to get inserted.
-                        - *id*: The id of the kweek including the mention .
-
+                       - *response*: A list of dictionaries containing the id of the inserted kweek, and the
+                         notified_username and type of each created notification (None if there are none),
+                         an exception object if the query produced an error.
        """
-    query: str = """INSERT INTO MENTION VALUES(%s,%s,%s,%s) """
-    data = (kid, ment.username, ment.indices[0], ment.indices[1])
-    response = db_manager.execute_query_no_return(query, data)
+    query: str = """
+                    WITH NEW_KWEEK AS (
+                        INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO)
+                        VALUES (%(created_at)s, %(text)s, %(media_url)s, %(username)s, %(reply_to)s)
+                        RETURNING ID
+                    ),
+                    KWEEK_HASHTAGS AS (
+                        SELECT * FROM UNNEST(%(hashtag_texts)s::TEXT[], %(hashtag_starts)s::INT[],
+                                             %(hashtag_ends)s::INT[]) AS H(TEXT, STARTING_INDEX, ENDING_INDEX)
+                    ),
+                    -- Updating the existing hashtags returns them even when they are created concurrently
+                    KWEEK_HASHTAG_ID AS (
+                        INSERT INTO HASHTAG (TEXT)
+                        SELECT DISTINCT ON (LOWER(TEXT)) TEXT FROM KWEEK_HASHTAGS
+                        ON CONFLICT (LOWER(TEXT)) DO UPDATE SET TEXT = HASHTAG.TEXT
+                        RETURNING ID, TEXT
+                    ),
+                    NEW_KWEEK_HASHTAG AS (
+                        INSERT INTO KWEEK_HASHTAG (KWEEK_ID, HASHTAG_ID, STARTING_INDEX, ENDING_INDEX)
+                        SELECT K.ID, H.ID, KH.STARTING_INDEX, KH.ENDING_INDEX
+                        FROM NEW_KWEEK K, KWEEK_HASHTAGS KH JOIN KWEEK_HASHTAG_ID H ON LOWER(H.TEXT) = LOWER(KH.TEXT)
+                    ),
+                    KWEEK_MENTIONS AS (
+                        SELECT M.*, U.USERNAME IS NULL OR
+                                    ROW_NUMBER() OVER (PARTITION BY M.USERNAME ORDER BY M.POSITION) > 1 AS DROPPED
+                        FROM UNNEST(%(mention_usernames)s::VARCHAR[], %(mention_starts)s::INT[],
+                                    %(mention_ends)s::INT[]) WITH ORDINALITY
+                             AS M(USERNAME, STARTING_INDEX, ENDING_INDEX, POSITION)
+                        LEFT JOIN USER_CREDENTIALS U ON U.USERNAME = M.USERNAME
+                    ),
+                    VALID_MENTIONS AS (
+                        SELECT * FROM KWEEK_MENTIONS WHERE NOT DROPPED
+                    ),
+                    NEW_MENTION AS (
+                        INSERT INTO MENTION (KWEEK_ID, USERNAME, STARTING_INDEX, ENDING_INDEX)
+                        SELECT K.ID, M.USERNAME, M.STARTING_INDEX, M.ENDING_INDEX FROM NEW_KWEEK K, VALID_MENTIONS M
+                    ),
+                    NEW_NOTIFICATION AS (
+                        INSERT INTO NOTIFICATION (CREATED_AT, NOTIFIED_USERNAME, INVOLVED_USERNAME, TYPE,
+                                                  INVOLVED_KWEEK_ID, IS_SEEN)
+                        SELECT %(notified_at)s, N.USERNAME, %(username)s, N.TYPE, K.ID, FALSE
+                        FROM NEW_KWEEK K, (SELECT USERNAME, 'REPLY'::NOTIFICATION_TYPE AS TYPE
+                                           FROM KWEEK WHERE ID = %(reply_to)s
+                                           UNION ALL
+                                           SELECT USERNAME, 'MENTION' FROM VALID_MENTIONS) N
+                        WHERE N.USERNAME != %(username)s
+                        RETURNING NOTIFIED_USERNAME, TYPE
+                    )
+                    SELECT K.ID, N.NOTIFIED_USERNAME, N.TYPE FROM NEW_KWEEK K LEFT JOIN NEW_NOTIFICATION N ON TRUE
+                 """
+    data = {
+        'created_at': kweek.created_at,
+        'text': kweek.text,
+        'media_url': kweek.media_url,
+        'username': kweek.user.username,
+        'reply_to': kweek.reply_to,
+        'hashtag_texts': [hashtag.text for hashtag in kweek.hashtags],
+        'hashtag_starts': [hashtag.indices[0] for hashtag in kweek.hashtags],
+        'hashtag_ends': [hashtag.indices[1] for hashtag in kweek.hashtags],
+        'mention_usernames': [mention.username for mention in kweek.mentions],
+        'mention_starts': [mention.indices[0] for mention in kweek.mentions],
+        'mention_ends': [mention.indices[1] for mention in kweek.mentions],
+        'notified_at': notified_at
+    }
+    response = db_manager.execute_query(query, data)
     return response
 
 
-def add_kweek_hashtag(hid, kid, hash_obj: Hashtag):
-    """
-                  Query to insert hashtag in the kweek_hashtag table.
-
-                  *Parameters*:
-                      - *hid*: The id of the hashtag to get inserted.
-                      - *kid*: The id of the mention to get inserted.
-                      - *hash_obj(object)*: The hashtag object to get inserted.
-
-    """
-
-    query: str = """INSERT INTO KWEEK_HASHTAG VALUES (%s,%s,%s,%s)"""
-    data = (kid, hid, hash_obj.indices[0], hash_obj.indices[1],)
-    db_manager.execute_query_no_return(query, data)
-
-
-def create_hashtag(hash_obj: Hashtag):
-    """
-                  Query to insert hashtag in the hashtag table.
-
-                  *Parameters*:
-                      - *hash_obj(object)*: The hashtag object to get inserted.
-
-    """
-
-    query: str = """INSERT INTO HASHTAG(TEXT) VALUES (%s) """
-    data = (hash_obj.text,)
-    db_manager.execute_query_no_return(query, data)
-
-
 def check_kweek_writer(kid, authorized_username):
     """
                   Query to get the user if it was the writer of a particular kweek .
@@ -131,56 +144,33 @@ def check_kweek_owner(kid, authorized_username):
     return response
 
 
-def check_existing_hashtag(hashtag: Hashtag):
-    """
-                    Query to check if that hashtag exist already in the data base.
-
-                    *Parameters*:
-                        - *hashtag(object)*: The hashtag object to be checked.
-
-                    *Returns*:
-                        -*response*: The id of the hashtag if found .
-    """
-
-    query: str = """SELECT ID FROM HASHTAG WHERE TEXT =%s """
-    data = (hashtag.text,)
-    response = db_manager.execute_query(query, data)
-    return response
+########################################################################################################################
 
 
-def check_kweek_mention(kid, ment: Mention):
+def delete_unused_hashtags(batch_size):
     """
-                   Query to check if a mention exist already for th same kweek id.
+                   Query to delete a batch of the hashtags that are not used by any kweek. Hashtags being used by a
+                   kweek created concurrently are locked by its upsert and skipped.
 
                    *Parameters*:
-                       - *ment(object)*: The mention object to be checked.
-                       - *kid*: The id of the kweek to be checked.
-
+                       - *batch_size (int)*: The maximum number of hashtags deleted.
 
                    *Returns*:
-                       -*response*: The count to indicate found or not.
-    """
-
-    query: str = """SELECT COUNT(*) FROM MENTION WHERE KWEEK_ID =%s AND USERNAME =%s """
-    data = (kid, ment.username)
-    response = db_manager.execute_query(query, data)
+                       - *response*: A list of dictionaries containing the ids of the deleted hashtags, an exception
+                         object if the query produced an error.
+    """
+
+    query: str = """
+                    DELETE FROM HASHTAG WHERE ID IN
+                    (SELECT ID FROM HASHTAG WHERE KWEEKS = 0 LIMIT %s FOR UPDATE SKIP LOCKED)
+                    AND KWEEKS = 0
+                    RETURNING ID
+                 """
+    data = (batch_size,)
+    response = db_manager.execute_query(query, data, primary=True)
     return response
 
 
-########################################################################################################################
-
-
-def update_hashtag():
-    """
-                   Query to delete the hashtag form the hashtag table if it was the last one in the kweek_hashtag table.
-
-    """
-
-    query: str =\
-        """ DELETE FROM HASHTAG WHERE ID NOT IN (SELECT HASHTAG_ID FROM KWEEK_HASHTAG WHERE HASHTAG_ID = ID); """
-    db_manager.execute_query_no_return(query)
-
-
 def delete_rekweeks(rid):
     """
                    Query to delete the rekweeks of a particular kweek.
@@ -330,63 +320,6 @@ def retrieve_user(kweek_id, num):
     return response
 
 
-def check_following(me, user):
-    """
-                    Checks if the a user is followed by another user.
-
-
-                    *Parameters:*
-                        - *me*: The username of the first user.
-                        - *user*: The username of the second user.
-
-                    *Returns:*
-                        - The tuple having the matched results.
-    """
-    query: str = """ SELECT * FROM FOLLOW WHERE FOLLOWED_USERNAME=%s AND FOLLOWER_USERNAME=%s ;"""
-    data = (user, me)
-    response = db_manager.execute_query(query, data)
-    return response
-
-
-def check_muted(me, user):
-    """
-                    Checks if the authorized user is muting the required user.
-
-
-                    *Parameters:*
-                        - *me*: The username of the authorized user.
-                        - *user*: The username of the required user.
-
-                    *Returns:*
-                        - The tuple having the matched results.
-
-    """
-    query: str = """ SELECT *  FROM MUTE WHERE MUTER_USERNAME=%s AND MUTED_USERNAME=%s;"""
-    data = (user, me)
-    response = db_manager.execute_query(query, data)
-    return response
-
-
-def check_blocked(me, user):
-    """
-                   Checks if the authorized user is blocking the required user.
-
-
-                   *Parameters:*
-                       - *me*: The username of the authorized user.
-                       - *user*: The username of the required user.
-
-                   *Returns:*
-                       - The tuple having the matched results.
-
-    """
-
-    query: str = """ SELECT * FROM BLOCK WHERE BLOCKER_USERNAME=%s AND BLOCKED_USERNAME=%s ;"""
-    data = (user, me)
-    response = db_manager.execute_query(query, data)
-    return response
-
-
 def retrieve_kweek(kid):
     """
                    Gets the kweek of a given id.
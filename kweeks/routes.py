@@ -6,6 +6,7 @@ from kweeks.actions import create_kweek, delete_kweek, get_kweek_with_replies, c
     like_kweek, dislike_kweek, get_rekweekers, get_likers
 import api_namespaces
 from authentication_and_registration.actions import authorize
+from timelines_and_trends.routes import next_cursor_headers
 
 kweeks_api = api_namespaces.kweeks_api
 
@@ -23,6 +24,7 @@ class Kweeks(Resource):
     @kweeks_api.response(code=400, description='Invalid ID to be replied to')
     @kweeks_api.response(code=404, description='The kweek to be replied to does not exist.')
     @kweeks_api.response(code=400, description='No text body found.')
+    @kweeks_api.response(code=500, description='An error occurred in the server.')
     @kweeks_api.response(code=200, description='Kweek has been created successfully.')
     @kweeks_api.doc(security='KwikkerKey')
     @authorize
@@ -73,21 +75,41 @@ class Kweeks(Resource):
     @kweeks_api.response(code=400, description='Invalid kweek ID.')
     @kweeks_api.response(code=404, description='Kweek does not exist.')
     @kweeks_api.param(name='id', type='str', description='Id of the Kweek to be retrieved', required=True)
+    @kweeks_api.param(name='last_retrieved_kweek_id', type='str',
+                      description="Nullable. Normally the request returns the first 20 replies when null."
+                                  "To retrieve more send the id of the last reply retrieved.")
+    @kweeks_api.param(name='cursor', type='str',
+                      description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                  " of the previous page. Takes precedence over the last retrieved id.")
+    @kweeks_api.param(name='depth', type='str',
+                      description="Nullable. The number of levels of replies returned, 1 (the default) returns"
+                                  " the direct replies only.")
+    @kweeks_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @kweeks_api.doc(security='KwikkerKey')
     @authorize
     def get(self, authorized_username):
         """
-        Retrieve a Kweek with its replies.
+        Retrieve a Kweek with a page of its replies, oldest first.
         """
         if not request.args.get('id'):
             abort(400, 'please provide the kweek id')
-        check, message, kweek_obj, replies_obj_list, code = \
-            get_kweek_with_replies(request.args.get('id'), authorized_username, False)
+        depth = request.args.get('depth', '1')
+        if not depth.isdigit() or int(depth) < 1:
+            abort(400, 'Invalid depth provided.')
+        try:
+            check, message, kweek_obj, replies_obj_list, code = \
+                get_kweek_with_replies(request.args.get('id'), authorized_username, False,
+                                       last_retrieved_kweek_id=request.args.get('last_retrieved_kweek_id'),
+                                       cursor=request.args.get('cursor'), depth=int(depth))
+        except TypeError:
+            abort(500, message='An error occurred in the server.')
+        except ValueError:
+            abort(400, 'Invalid ID provided.')
         if check:
             return {
                 'kweek': kweek_obj,
                 'replies': replies_obj_list
-            }
+            }, 200, next_cursor_headers(replies_obj_list)
         else:
             abort(code, message)
 
@@ -110,7 +132,7 @@ class KweekOnly(Resource):
         if not request.args.get('id'):
             abort(400, 'please provide the kweek id')
         check, message, kweek_obj, replies_obj_list, code = \
-            get_kweek_with_replies(request.args.get('id'), authorized_username, False)
+            get_kweek_with_replies(request.args.get('id'), authorized_username, False, depth=0)
         if check:
             return kweek_obj, 200
         else:
@@ -127,18 +149,38 @@ class KweekReplies(Resource):
     @kweeks_api.param(name='reply_to', type='str',
                       description='Id of the Kweek that the replies belong to.', required=True)
     @kweeks_api.marshal_with(Kweek.api_model, as_list=True)
+    @kweeks_api.param(name='last_retrieved_kweek_id', type='str',
+                      description="Nullable. Normally the request returns the first 20 replies when null."
+                                  "To retrieve more send the id of the last reply retrieved.")
+    @kweeks_api.param(name='cursor', type='str',
+                      description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                  " of the previous page. Takes precedence over the last retrieved id.")
+    @kweeks_api.param(name='depth', type='str',
+                      description="Nullable. The number of levels of replies returned, 1 (the default) returns"
+                                  " the direct replies only.")
+    @kweeks_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @kweeks_api.doc(security='KwikkerKey')
     @authorize
     def get(self, authorized_username):
         """
-        Retrieve replies of a Kweek.
+        Retrieve a page of the replies of a Kweek, oldest first.
         """
         if not request.args.get('reply_to'):
             abort(400, 'please provide the kweek id')
-        check, message, kweek_obj, replies_obj_list, code = \
-            get_kweek_with_replies(request.args.get('reply_to'), authorized_username, True)
+        depth = request.args.get('depth', '1')
+        if not depth.isdigit() or int(depth) < 1:
+            abort(400, 'Invalid depth provided.')
+        try:
+            check, message, kweek_obj, replies_obj_list, code = \
+                get_kweek_with_replies(request.args.get('reply_to'), authorized_username, True,
+                                       last_retrieved_kweek_id=request.args.get('last_retrieved_kweek_id'),
+                                       cursor=request.args.get('cursor'), depth=int(depth))
+        except TypeError:
+            abort(500, message='An error occurred in the server.')
+        except ValueError:
+            abort(400, 'Invalid ID provided.')
         if check:
-            return replies_obj_list, 200
+            return replies_obj_list, 200, next_cursor_headers(replies_obj_list)
         else:
             abort(code, message)
 
@@ -2,8 +2,10 @@ import pytest
 from . import actions
 from timelines_and_trends.actions import get_reply_to_info
 from database_manager import db_manager
+from app import app, socketio
 from models import User, Mention, Hashtag, Kweek
 from datetime import datetime
+from random import Random
 
 
 def test_insert_kweek():
@@ -294,7 +296,14 @@ def test_validate_request(parameter, expected_output):
                                Mention({'indices': (10, 19), 'username': 'mention2'})]),
                              ('smth',
                               [],
-                              [])
+                              []),
+                             ('#tag, @user.\n#next!',
+                              [Hashtag({'indices': (0, 4), 'text': '#tag', 'id': 0}),
+                               Hashtag({'indices': (13, 18), 'text': '#next', 'id': 0})],
+                              [Mention({'indices': (6, 11), 'username': 'user'})]),
+                             ('email@host.com a#b #مرحبا @ünïcode_1',
+                              [Hashtag({'indices': (19, 25), 'text': '#مرحبا', 'id': 0})],
+                              [Mention({'indices': (26, 36), 'username': 'ünïcode_1'})])
 
                          ])
 def test_extract_mentions_hashtags(text, expected_hashtags, expected_mentions):
@@ -305,6 +314,37 @@ def test_extract_mentions_hashtags(text, expected_hashtags, expected_mentions):
         assert i.to_json() == expected_mentions[r].to_json()
 
 
+def test_extract_entities():
+    random = Random(0)
+    alphabet = '#@ \n.,!_a5éß中' + 'abc' * 3
+
+    def is_word_character(character):
+        return character.isalnum() or character == '_'
+
+    texts = [''.join(random.choice(alphabet) for _ in range(random.randint(0, 40))) for _ in range(2000)]
+    entities = actions.extract_entities(texts)
+    assert len(entities) == len(texts)
+    for text, (hashtags, mentions) in zip(texts, entities):
+        # The indices of each entity delimit it in the text, from its # or @ to the last word character after it
+        for sign, found in (('#', [(hashtag_text, start, end) for hashtag_text, start, end in hashtags]),
+                            ('@', [('@' + username, start, end) for username, start, end in mentions])):
+            for entity_text, start, end in found:
+                assert text[start:end] == entity_text
+                assert entity_text[0] == sign and len(entity_text) > 1
+                assert all(is_word_character(character) for character in entity_text[1:])
+                assert start == 0 or not is_word_character(text[start - 1])
+                assert end == len(text) or not is_word_character(text[end])
+        # Every # or @ starting a word starts an entity
+        starts = sorted(start for _, start, _ in hashtags + mentions)
+        assert starts == [index for index, character in enumerate(text[:-1]) if character in '#@' and
+                          (index == 0 or not is_word_character(text[index - 1])) and
+                          is_word_character(text[index + 1])]
+        hashtag_objects, mention_objects = actions.extract_mentions_hashtags(text)
+        assert [(hashtag.text, hashtag.indices[0], hashtag.indices[1]) for hashtag in hashtag_objects] == hashtags
+        assert [(mention.username, mention.indices[0], mention.indices[1]) for mention in mention_objects] == mentions
+    assert actions.extract_entities([]) == []
+
+
 def test_delete_kweek():
     # first test:delete normal kweek -  first kweek#
 
@@ -363,10 +403,19 @@ def test_delete_kweek():
     assert response != []
 
     actions.delete_kweek(kid2, 'user1')
-    query: str = """SELECT TEXT FROM HASHTAG WHERE TEXT= %s"""
+    query: str = """SELECT TEXT, KWEEKS FROM HASHTAG WHERE TEXT= %s"""
     data = ('hashtag2',)
     response = db_manager.execute_query(query, data)
+    assert response == [{'text': 'hashtag2', 'kweeks': 0}]
+    # The unused hashtags are deleted by the sweep rather than by the deletion of the kweek
+    assert actions.sweep_hashtags(batch_size=1) >= 1
+    query: str = """SELECT TEXT FROM HASHTAG WHERE TEXT= %s"""
+    response = db_manager.execute_query(query, data)
     assert response == []
+    assert db_manager.execute_query("""SELECT * FROM HASHTAG WHERE KWEEKS = 0""") == []
+    query: str = """SELECT ID FROM HASHTAG H
+                     WHERE KWEEKS != (SELECT COUNT(*) FROM KWEEK_HASHTAG WHERE HASHTAG_ID = H.ID)"""
+    assert db_manager.execute_query(query) == []
 
     # third test: user is not kweek writer
 
@@ -798,6 +847,7 @@ def test_get_kweek_with_replies():
     check_replies, message, k, r, code = actions.get_kweek_with_replies(kid1, 'user3', False)
     assert message == 'success.'
     assert k.to_json() == kweek_test1.to_json()
+    assert len(r) == len(replies_test1)
     for n, i in enumerate(r):
         assert i.to_json() == replies_test1[n].to_json()
 
@@ -970,3 +1020,230 @@ def test_get_likers():
     check2, message2, users_list, code = actions.get_likers(kid, 'user1')  # success
     for r, i in enumerate(users_list):
         assert i.to_json() == likers_list[r].to_json()
+
+
+def test_fan_out():
+    from app import app
+    from timelines_and_trends import query_factory as timelines_query_factory
+    usernames = ['user1', 'user2', 'user3', 'user4']
+    app.config['HOME_TIMELINE_ENGINE'] = 'materialized'
+    try:
+        assert timelines_query_factory.rebuild_home_timelines(usernames, 100) is None
+        check, message, code = actions.create_kweek({'text': 'fan out', 'reply_to': None, 'media_id': None}, 'user3')
+        assert message == 'success.'
+        kid = db_manager.execute_query("""SELECT ID FROM KWEEK ORDER BY ID DESC LIMIT 1 """)[0]['id']
+        check, message, code = actions.create_rekweek({"id": str(kid)}, 'user1')
+        assert message == 'success.'
+        for username in usernames:
+            assert timelines_query_factory.get_materialized_home_kweeks(username) == \
+                   timelines_query_factory.get_home_kweeks(username)
+        # The author and the follower who did not mute the author get the kweek, the rekweeker's follower the rekweek
+        assert [(kweek.id, kweek.rekweeker) for kweek in
+                timelines_query_factory.get_materialized_home_kweeks('user2', kweek_id=kid)] == [(kid, None)]
+        assert [(kweek.id, kweek.rekweeker) for kweek in
+                timelines_query_factory.get_materialized_home_kweeks('user3', kweek_id=kid)] == \
+            [(kid, 'user1'), (kid, None)]
+        assert timelines_query_factory.get_materialized_home_kweeks('user1', kweek_id=kid) == []
+        assert actions.delete_rekweek(str(kid), 'user1')[1] == 'success.'
+        assert timelines_query_factory.get_materialized_home_kweeks('user3', kweek_id=kid)[0].rekweeker is None
+    finally:
+        app.config['HOME_TIMELINE_ENGINE'] = 'query'
+
+
+def test_kweek_counters():
+    kid = str(db_manager.execute_query("""SELECT ID FROM KWEEK ORDER BY ID DESC LIMIT 1 """)[0]['id'])
+    actions.like_kweek({"id": kid}, 'user1')
+    actions.create_rekweek({"id": kid}, 'user4')
+    actions.create_kweek({'text': 'counted reply', 'reply_to': kid, 'media_id': None}, 'user1')
+    check, message, kweek, replies, code = actions.get_kweek(kid, 'user1', False)
+    assert (kweek.number_of_likes, kweek.number_of_replies) == (1, len(replies))
+    assert kweek.liked_by_user and not kweek.rekweeked_by_user
+    assert actions.dislike_kweek(kid, 'user1')[1] == 'success.'
+    assert actions.delete_kweek(str(replies[-1]['id']), 'user1')[1] == 'success.'
+    # The counters kept by the triggers match the counts of the likes, rekweeks and replies
+    query = """
+                SELECT C.KWEEK_ID, C.LIKES, C.REKWEEKS, C.REPLIES,
+                    (SELECT COUNT(*) FROM FAVORITE WHERE KWEEK_ID = K.ID) AS COUNTED_LIKES,
+                    (SELECT COUNT(*) FROM REKWEEK WHERE KWEEK_ID = K.ID) AS COUNTED_REKWEEKS,
+                    (SELECT COUNT(*) FROM KWEEK WHERE REPLY_TO = K.ID) AS COUNTED_REPLIES
+                FROM KWEEK K JOIN KWEEK_COUNTERS C ON C.KWEEK_ID = K.ID
+            """
+    counters = db_manager.execute_query(query)
+    assert len(counters) == db_manager.execute_query('SELECT COUNT(*) FROM KWEEK')[0]['count']
+    for counter in counters:
+        assert (counter['likes'], counter['rekweeks'], counter['replies']) == \
+               (counter['counted_likes'], counter['counted_rekweeks'], counter['counted_replies'])
+
+
+def test_insert_kweek_single_query():
+    replied_to = db_manager.execute_query("""SELECT ID FROM KWEEK WHERE USERNAME = 'user3' LIMIT 1 """)[0]['id']
+    text = '@user2 @user1 @user3 @nobody @user2 @user4 #single #query #single'
+    hashtags, mentions = actions.extract_mentions_hashtags(text)
+    kweek = Kweek({
+        'id': 0,
+        'created_at': datetime.utcnow(),
+        'text': text,
+        'media_url': None,
+        'user': User({
+            'username': 'user1',
+            'screen_name': 'test1',
+            'profile_image_url': 'image_url',
+            'following': False,
+            'follows_you': False,
+            'muted': False,
+            'blocked': False
+        }),
+        'mentions': mentions,
+        'hashtags': hashtags,
+        'number_of_likes': 0,
+        'number_of_rekweeks': 0,
+        'number_of_replies': 0,
+        'reply_info': None,
+        'reply_to': replied_to,
+        'rekweek_info': None,
+        'liked_by_user': False,
+        'rekweeked_by_user': False
+    })
+    # The kweek, its hashtags, mentions and notifications are inserted in one query
+    db_manager.start_request_instrumentation()
+    assert actions.insert_kweek(kweek) == (True, 'success.', 200)
+    assert db_manager.get_request_instrumentation()['queries'] == 1
+    kid = db_manager.execute_query("""SELECT ID FROM KWEEK ORDER BY ID DESC LIMIT 1 """)[0]['id']
+    query = """SELECT TEXT, STARTING_INDEX FROM KWEEK_HASHTAG JOIN HASHTAG ON ID = HASHTAG_ID WHERE KWEEK_ID = %s
+               ORDER BY STARTING_INDEX"""
+    assert [(row['text'], row['starting_index']) for row in db_manager.execute_query(query, (kid,))] == \
+        [(hashtag.text, hashtag.indices[0]) for hashtag in hashtags]
+    query = """SELECT COUNT(*) FROM HASHTAG WHERE TEXT = ANY(%s)"""
+    assert db_manager.execute_query(query, (['#single', '#query'],))[0]['count'] == 2
+    # Only the mentions of the unknown user and the repeated user are skipped
+    query = """SELECT USERNAME FROM MENTION WHERE KWEEK_ID = %s ORDER BY STARTING_INDEX"""
+    assert [row['username'] for row in db_manager.execute_query(query, (kid,))] == \
+        ['user2', 'user1', 'user3', 'user4']
+    # The author is not notified of their own mention
+    query = """SELECT NOTIFIED_USERNAME, TYPE FROM NOTIFICATION WHERE INVOLVED_KWEEK_ID = %s
+               ORDER BY NOTIFIED_USERNAME, TYPE"""
+    assert [(row['notified_username'], row['type']) for row in db_manager.execute_query(query, (kid,))] == \
+        [('user2', 'MENTION'), ('user3', 'REPLY'), ('user3', 'MENTION'), ('user4', 'MENTION')]
+
+
+def test_insert_kweek_deleted_reply_to():
+    # The replied to kweek is deleted after the request was validated
+    replied_to = db_manager.execute_query("""INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO)
+                                             VALUES (NOW(), 'deleted', NULL, 'user2', NULL) RETURNING ID""")[0]['id']
+    assert db_manager.execute_query_no_return("""DELETE FROM KWEEK WHERE ID = %s""", (replied_to,)) is None
+    kweeks = db_manager.execute_query("""SELECT COUNT(*) FROM KWEEK""")[0]['count']
+    kweek = Kweek({
+        'id': 0,
+        'created_at': datetime.utcnow(),
+        'text': '@user2 #deleted',
+        'media_url': None,
+        'user': User({
+            'username': 'user1',
+            'screen_name': 'test1',
+            'profile_image_url': 'image_url',
+            'following': False,
+            'follows_you': False,
+            'muted': False,
+            'blocked': False
+        }),
+        'mentions': [Mention({'username': 'user2', 'indices': [0, 6]})],
+        'hashtags': [Hashtag({'text': '#deleted', 'indices': [7, 15], 'id': 0})],
+        'number_of_likes': 0,
+        'number_of_rekweeks': 0,
+        'number_of_replies': 0,
+        'reply_info': None,
+        'reply_to': replied_to,
+        'rekweek_info': None,
+        'liked_by_user': False,
+        'rekweeked_by_user': False
+    })
+    assert actions.insert_kweek(kweek) == (False, 'The kweek to be replied to does not exist.', 404)
+    assert db_manager.execute_query("""SELECT COUNT(*) FROM KWEEK""")[0]['count'] == kweeks
+    assert db_manager.execute_query("""SELECT COUNT(*) FROM HASHTAG WHERE TEXT = '#deleted'""")[0]['count'] == 0
+
+
+def test_hashtags_case_insensitive():
+    for text in ('#CaseTag first', '#casetag second #CASETAG'):
+        check, message, code = actions.create_kweek({'text': text, 'reply_to': None, 'media_id': None}, 'user2')
+        assert message == 'success.'
+    # The kweeks share the hashtag created by the first one
+    query = """SELECT DISTINCT H.ID, H.TEXT FROM KWEEK_HASHTAG JOIN HASHTAG H ON H.ID = HASHTAG_ID
+               WHERE LOWER(H.TEXT) = '#casetag'"""
+    hashtags = db_manager.execute_query(query)
+    assert [hashtag['text'] for hashtag in hashtags] == ['#CaseTag']
+    query = """SELECT COUNT(*) FROM KWEEK_HASHTAG WHERE HASHTAG_ID = %s"""
+    assert db_manager.execute_query(query, (hashtags[0]['id'],))[0]['count'] == 3
+    response = db_manager.execute_query_no_return("""INSERT INTO HASHTAG (TEXT) VALUES ('#CASETAG')""")
+    assert isinstance(response, Exception)
+
+
+def test_get_kweek_with_replies_pages():
+    def reply(text, reply_to, username):
+        check, message, code = actions.create_kweek({'text': text, 'reply_to': reply_to, 'media_id': None},
+                                                    username)
+        assert message == 'success.'
+        return db_manager.execute_query("""SELECT ID FROM KWEEK ORDER BY ID DESC LIMIT 1 """)[0]['id']
+
+    root_id = reply('thread root', None, 'user1')
+    reply_ids = [reply('reply %d' % n, str(root_id), 'user2' if n % 2 else 'user3') for n in range(25)]
+    nested_ids = [reply('nested %d' % n, str(reply_ids[0]), 'user1') for n in range(2)]
+
+    # The direct replies are paged oldest first, following the cursor of each page
+    db_manager.start_request_instrumentation()
+    check, message, k, r, code = actions.get_kweek_with_replies(root_id, 'user1', False)
+    queries = db_manager.get_request_instrumentation()['queries']
+    assert check and k.id == root_id
+    assert [kweek.id for kweek in r] == reply_ids[:20]
+    assert r.next_cursor is not None
+    check, message, k, r, code = actions.get_kweek_with_replies(root_id, 'user1', True, cursor=r.next_cursor)
+    assert k is None
+    assert [kweek.id for kweek in r] == reply_ids[20:]
+    assert r.next_cursor is None
+    check, message, k, r, code = actions.get_kweek_with_replies(root_id, 'user1', True,
+                                                                last_retrieved_kweek_id=str(reply_ids[19]))
+    assert [kweek.id for kweek in r] == reply_ids[20:]
+
+    # The number of queries does not depend on the number of replies
+    db_manager.start_request_instrumentation()
+    check, message, k, r, code = actions.get_kweek_with_replies(reply_ids[0], 'user1', False)
+    assert [kweek.id for kweek in r] == nested_ids
+    assert db_manager.get_request_instrumentation()['queries'] == queries
+
+    # Deeper replies are interleaved in creation order
+    replies = []
+    cursor = None
+    while True:
+        check, message, k, r, code = actions.get_kweek_with_replies(root_id, 'user1', True, cursor=cursor,
+                                                                    depth=2)
+        replies += [kweek.id for kweek in r]
+        cursor = r.next_cursor
+        if cursor is None:
+            break
+    assert replies == reply_ids + nested_ids
+
+    check, message, k, r, code = actions.get_kweek_with_replies(root_id, 'user1', False, depth=0)
+    assert k.id == root_id and r == []
+    with pytest.raises(ValueError):
+        actions.get_kweek_with_replies(root_id, 'user1', True, last_retrieved_kweek_id='abc')
+    check, message, k, r, code = actions.get_kweek_with_replies(root_id, 'user1', True,
+                                                                last_retrieved_kweek_id='999999')
+    assert (check, code) == (False, 404)
+
+
+def test_sweep_hashtags_in_background():
+    query = """INSERT INTO HASHTAG (TEXT) VALUES ('#background_sweep') RETURNING ID"""
+    hashtag_id = db_manager.execute_query(query)[0]['id']
+    sweep_interval = app.config['HASHTAG_SWEEP_INTERVAL']
+    app.config['HASHTAG_SWEEP_INTERVAL'] = 0
+    try:
+        # The sweep runs as a background task of the socket server
+        actions.schedule_hashtags_sweep()
+        for _ in range(100):
+            if not actions.hashtags_sweeping:
+                break
+            socketio.sleep(0.05)
+        assert not actions.hashtags_sweeping
+    finally:
+        app.config['HASHTAG_SWEEP_INTERVAL'] = sweep_interval
+    query = """SELECT COUNT(*) FROM HASHTAG WHERE ID = %s"""
+    assert db_manager.execute_query(query, (hashtag_id,))[0]['count'] == 0
@@ -0,0 +1,103 @@
+import app
+import click
+
+"""
+    Maintenance tasks that are run from the terminal against the database of an environment.
+    To run use:
+        python maintenance.py <command> --env=<env>
+        <env> = production , test, or dev (default is dev)
+"""
+
+
+def initialize(env):
+    if not app.initialize(env):
+        raise click.ClickException('Could not connect to the database.')
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command('rebuild-home-timelines')
+@click.option('--env', default='dev')
+@click.option('--username', multiple=True, help='Only rebuild the home timeline of this user, can be repeated.')
+@click.option('--batch-size', default=100, help='Number of home timelines rebuilt in each transaction.')
+def rebuild_home_timelines(env, username, batch_size):
+    """
+        Rebuilds the materialized home timelines, run it before switching HOME_TIMELINE_ENGINE to 'materialized'.
+    """
+    initialize(env)
+    import timelines_and_trends.actions
+    response = timelines_and_trends.actions.rebuild_home_timelines(
+        owners=username or None, batch_size=batch_size,
+        progress=lambda rebuilt: click.echo('Rebuilt %d home timelines.' % rebuilt))
+    if response is not None:
+        raise click.ClickException(str(response))
+
+
+@cli.command('trim-home-timelines')
+@click.option('--env', default='dev')
+def trim_home_timelines(env):
+    """
+        Removes the oldest entries of the materialized home timelines beyond HOME_TIMELINE_CAP.
+    """
+    initialize(env)
+    import timelines_and_trends.query_factory
+    response = timelines_and_trends.query_factory.trim_home_timelines(app.app.config['HOME_TIMELINE_CAP'])
+    if response is not None:
+        raise click.ClickException(str(response))
+
+
+@cli.command('trim-hashtag-buckets')
+@click.option('--env', default='dev')
+def trim_hashtag_buckets(env):
+    """
+        Removes the hashtag kweek counts older than TRENDS_WINDOW, which are no longer used to score the trends.
+    """
+    initialize(env)
+    from datetime import datetime, timedelta
+    import timelines_and_trends.query_factory
+    response = timelines_and_trends.query_factory.trim_hashtag_buckets(
+        datetime.utcnow() - timedelta(seconds=app.app.config['TRENDS_WINDOW']))
+    if response is not None:
+        raise click.ClickException(str(response))
+
+
+@cli.command('sweep-hashtags')
+@click.option('--env', default='dev')
+@click.option('--batch-size', default=None, type=int, help='Number of hashtags deleted in each query.')
+def sweep_hashtags(env, batch_size):
+    """
+        Deletes the hashtags that are no longer used by any kweek.
+    """
+    initialize(env)
+    import kweeks.actions
+    response = kweeks.actions.sweep_hashtags(batch_size)
+    if isinstance(response, Exception):
+        raise click.ClickException(str(response))
+    click.echo('Deleted %d hashtags.' % response)
+
+
+@cli.command('reconcile-unseen-counters')
+@click.option('--env', default='dev')
+@click.option('--username', multiple=True, help='Only reconcile the counters of this user, can be repeated.')
+@click.option('--batch-size', default=100, help='Number of users reconciled in each transaction.')
+def reconcile_unseen_counters(env, username, batch_size):
+    """
+        Fixes the unseen notifications, replies and mentions, and conversations counters that drifted.
+    """
+    initialize(env)
+    import notifications.actions
+    response = notifications.actions.reconcile_unseen_counters(
+        usernames=username or None, batch_size=batch_size,
+        progress=lambda reconciled: click.echo('Reconciled the counters of %d users.' % reconciled))
+    if isinstance(response, Exception):
+        raise click.ClickException(str(response))
+    click.echo('Fixed the counters of %d users.' % len(response))
+    for fixed_username in response:
+        click.echo(fixed_username)
+
+
+if __name__ == '__main__':
+    cli()
@@ -364,7 +364,7 @@ class Trend:
     api_model = create_model('Trend', {
         'id': fields.String(description='The id of the trend.'),
         'text': fields.String(description='The text of the trend.'),
-        'number_of_kweeks': fields.Integer(description='The number of kweeks in the trend.')
+        'number_of_kweeks': fields.Integer(description='The number of recent kweeks in the trend.')
     })
 
     def __init__(self, json):
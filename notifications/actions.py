@@ -2,6 +2,7 @@ from . import query_factory
 import datetime
 from app import socketio
 from models import Notification
+from database_manager import db_manager
 from timelines_and_trends import actions
 from direct_messages import actions as action
 
@@ -27,10 +28,11 @@ def get_notifications(notified_username, last_notification_retrieved_id=None):
             last_notification_retrieved_id = int(last_notification_retrieved_id)
         except ValueError:
             raise
-    notifications = query_factory.get_notifications(notified_username)
+    notifications = query_factory.get_notifications(notified_username, stream=True)
     try:
-        notifications = actions.paginate(dictionaries_list=notifications, required_size=20,
-                                         start_after_key='id', start_after_value=last_notification_retrieved_id)
+        notifications = actions.paginate_stream(dictionaries=notifications, required_size=20,
+                                                start_after_key='id',
+                                                start_after_value=last_notification_retrieved_id)
     except TypeError:
         raise
     if notifications is None:
@@ -68,23 +70,55 @@ def create_notifications(involved_username, notified_username, type_notification
         raise Exception('Involved_username does not exist')
     if actions.is_user(notified_username) is False:
         raise Exception('Notified_username does not exist')
-    if is_notification(involved_username, notified_username, type_notification, kweek_id) is True:
-        return "already exists"
-    response = query_factory.create_notifications(involved_username, notified_username,
-                                                  type_notification, kweek_id, datetime.datetime.now(), False)
+    with db_manager.transaction():
+        if is_notification(involved_username, notified_username, type_notification, kweek_id) is True:
+            return "already exists"
+        response = query_factory.create_notifications(involved_username, notified_username,
+                                                      type_notification, kweek_id, datetime.datetime.now(), False)
+        result = notification_text(involved_username, type_notification)
+        channel = notified_username
+        # Only push the notification once it is committed
+        db_manager.after_commit(lambda: socketio.emit(channel, result))
+    return response
+
+
+def push_notifications(involved_username, notifications):
+    """
+     This function pushes the texts of created notifications to the notified users, once the enclosing
+     transaction is committed.
+
+
+     *Parameter:*
+         - *involved_username*: user who is responsible for the notifications.
+         - *notifications*: list of (notified_username, type_notification) tuples.
+     """
+    for notified_username, type_notification in notifications:
+        result = notification_text(involved_username, type_notification)
+        db_manager.after_commit(lambda channel=notified_username, result=result: socketio.emit(channel, result))
+
+
+def notification_text(involved_username, type_notification):
+    """
+     This function gets the text pushed to the notified user for a notification.
+
+
+     *Parameter:*
+         - *involved_username*: user who is responsible for the notification.
+         - *type_notification*: type of the notification [FOLLOW-REKWEEK-LIKE-REPLY-MENTION].
+
+     *Returns:*
+         - *string*: The text of the notification.
+     """
     if type_notification == "REKWEEK":
-        result = involved_username + " rekweeked your kweek."
+        return involved_username + " rekweeked your kweek."
     elif type_notification == "LIKE":
-        result = involved_username + " liked your kweek."
+        return involved_username + " liked your kweek."
     elif type_notification == "FOLLOW":
-        result = involved_username + " followed you."
+        return involved_username + " followed you."
     elif type_notification == "REPLY":
-        result = involved_username + " replied to your kweek"
+        return involved_username + " replied to your kweek"
     else:
-        result = involved_username + " mentioned you."
-    channel = notified_username
-    socketio.emit(channel, result)
-    return response
+        return involved_username + " mentioned you."
 
 
 # function for testing
@@ -153,3 +187,37 @@ def set_notifications_as_seen(authorized_username):
             -*authorized_username (string)*: The username of the authorized user.
     """
     return query_factory.set_notifications_as_seen(authorized_username)
+
+
+def reconcile_unseen_counters(usernames=None, batch_size=100, progress=None):
+    """
+        Recounts the unseen notifications, replies and mentions, and conversations of the users, fixing the
+        counters that drifted. The counters of each batch of users are fixed in a transaction.
+
+        *Parameters:*
+            -*usernames (list)*: Optional. The usernames of the users. Default: *None* (all users)
+            -*batch_size (int)*: Optional. The number of users reconciled in each transaction. Default: *100*
+            -*progress (function)*: Optional. Called with the number of users reconciled after each batch.
+
+        *Returns:*
+            -*List of strings*: The usernames whose counters were fixed.
+            -*Exception* object: If a query produced an error.
+    """
+    if usernames is not None:
+        usernames = list(usernames)
+        batches = (usernames[i:i + batch_size] for i in range(0, len(usernames), batch_size))
+    else:
+        batches = actions.get_username_batches(batch_size)
+    fixed = []
+    reconciled = 0
+    for batch in batches:
+        if isinstance(batch, Exception):
+            return batch
+        response = query_factory.reconcile_unseen_counters(batch)
+        if isinstance(response, Exception):
+            return response
+        fixed.extend(response)
+        reconciled += len(batch)
+        if progress is not None:
+            progress(reconciled)
+    return fixed
@@ -2,7 +2,7 @@ import database_manager
 db_manager = database_manager.db_manager  # pragma:no cover
 
 
-def get_notifications(notified_username):
+def get_notifications(notified_username, stream=False):
     """
             This function get list of notifications for a given username.
 
@@ -10,6 +10,7 @@ def get_notifications(notified_username):
             *Parameter:*
 
                 - *notified_username*: user who user who will be notified.
+                - *stream*: Optional. Yield the notifications from a server side cursor instead of returning a list.
 
             *Returns*:
 
@@ -41,6 +42,8 @@ def get_notifications(notified_username):
                  """
 
     data = (notified_username,)
+    if stream:
+        return db_manager.execute_query_stream(query, data)
     response = db_manager.execute_query(query, data)
     return response
 
@@ -161,21 +164,23 @@ def is_notification(involved_username, notified_username, type_notification, kwe
 
 def get_notifications_unseen_count(authorized_username):
     """
-        Gets the count of the unseen replies and mentions of the authorized user.
+        Gets the count of the unseen notifications (other than replies and mentions) of the authorized user,
+        kept in UNSEEN_COUNTERS by triggers.
 
         *Parameters:*
             -*authorized_username (string)*: The username of the authorized user.
 
         *Returns:*
-            -*count (int)*: The number of unseen replies and mentions of the authorized user.
+            -*count (int)*: The number of unseen notifications of the authorized user.
     """
     query = """
-                SELECT COUNT(*) FROM NOTIFICATION WHERE NOTIFIED_USERNAME = %s
-                AND IS_SEEN = FALSE AND  NOT (TYPE = 'MENTION' OR TYPE = 'REPLY') 
+                SELECT NOTIFICATIONS FROM UNSEEN_COUNTERS WHERE USERNAME = %s
             """
     data = (authorized_username,)
-    response = db_manager.execute_query(query, data)
-    return response[0].get('count')
+    response = db_manager.execute_query(query, data, prepared=True, row_format='tuple')
+    if not response:
+        return 0
+    return response[0][0]
 
 
 def set_notifications_as_seen(authorized_username):
@@ -191,3 +196,74 @@ def set_notifications_as_seen(authorized_username):
             """
     data = (authorized_username, )
     db_manager.execute_query_no_return(query, data)
+
+
+def reconcile_unseen_counters(usernames):
+    """
+        Recounts the unseen notifications, replies and mentions, and conversations of many users, fixing the
+        counters that drifted from the notifications and messages.
+
+
+        *Parameters:*
+            - *usernames (list)*: The usernames of the users.
+
+        *Returns:*
+            - *List of strings*: The usernames whose counters were fixed.
+            - *Exception* object: If a query produced an error.
+    """
+    usernames = sorted(usernames)
+    with db_manager.transaction():
+        # Lock the counters first, the notifications and messages created meanwhile are counted once committed
+        query = """
+                    INSERT INTO UNSEEN_COUNTERS (USERNAME)
+                    SELECT USERNAME FROM USER_CREDENTIALS WHERE USERNAME = ANY(%s)
+                    ON CONFLICT (USERNAME) DO NOTHING
+                """
+        response = db_manager.execute_query_no_return(query, (usernames,))
+        if response is not None:
+            return response
+        query = """
+                    SELECT USERNAME FROM UNSEEN_COUNTERS WHERE USERNAME = ANY(%s) ORDER BY USERNAME FOR UPDATE
+                """
+        response = db_manager.execute_query(query, (usernames,), row_format='tuple')
+        if isinstance(response, Exception):
+            return response
+        query = """
+                    INSERT INTO UNSEEN_CONVERSATION AS C (USERNAME, PARTNER_USERNAME, MESSAGES)
+                    SELECT C.USERNAME, C.PARTNER_USERNAME, COUNT(M.ID)
+                    FROM (SELECT USERNAME, PARTNER_USERNAME FROM UNSEEN_CONVERSATION WHERE USERNAME = ANY(%s)
+                          UNION
+                          SELECT TO_USERNAME, FROM_USERNAME FROM MESSAGE
+                          WHERE TO_USERNAME = ANY(%s) AND NOT IS_SEEN) AS C
+                    LEFT JOIN MESSAGE M
+                    ON M.TO_USERNAME = C.USERNAME AND M.FROM_USERNAME = C.PARTNER_USERNAME AND NOT M.IS_SEEN
+                    GROUP BY C.USERNAME, C.PARTNER_USERNAME
+                    ON CONFLICT (USERNAME, PARTNER_USERNAME) DO UPDATE SET MESSAGES = EXCLUDED.MESSAGES
+                    WHERE C.MESSAGES <> EXCLUDED.MESSAGES
+                """
+        response = db_manager.execute_query_no_return(query, (usernames, usernames))
+        if response is not None:
+            return response
+        query = """
+                    UPDATE UNSEEN_COUNTERS C
+                    SET NOTIFICATIONS = A.NOTIFICATIONS, REPLIES_AND_MENTIONS = A.REPLIES_AND_MENTIONS,
+                        CONVERSATIONS = A.CONVERSATIONS
+                    FROM (SELECT USERNAME,
+                                 (SELECT COUNT(*) FROM NOTIFICATION
+                                  WHERE NOTIFIED_USERNAME = U.USERNAME AND NOT IS_SEEN
+                                  AND TYPE NOT IN ('MENTION', 'REPLY')) AS NOTIFICATIONS,
+                                 (SELECT COUNT(*) FROM NOTIFICATION
+                                  WHERE NOTIFIED_USERNAME = U.USERNAME AND NOT IS_SEEN
+                                  AND TYPE IN ('MENTION', 'REPLY')) AS REPLIES_AND_MENTIONS,
+                                 (SELECT COUNT(*) FROM UNSEEN_CONVERSATION
+                                  WHERE USERNAME = U.USERNAME AND MESSAGES > 0) AS CONVERSATIONS
+                          FROM UNSEEN_COUNTERS U WHERE USERNAME = ANY(%s)) AS A
+                    WHERE C.USERNAME = A.USERNAME
+                    AND (C.NOTIFICATIONS, C.REPLIES_AND_MENTIONS, C.CONVERSATIONS) <>
+                        (A.NOTIFICATIONS, A.REPLIES_AND_MENTIONS, A.CONVERSATIONS)
+                    RETURNING C.USERNAME
+                """
+        response = db_manager.execute_query(query, (usernames,), row_format='tuple')
+        if isinstance(response, Exception):
+            return response
+        return [username for username, in response]
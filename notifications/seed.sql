@@ -25,6 +25,6 @@ INSERT INTO public.kweek(
 
 INSERT INTO public.notification(
 	created_at, notified_username, involved_username, type, involved_kweek_id, is_seen)
-	VALUES ('2010-1-2','ahly','zamalek','REKWEEK',(SELECT ID FROM KWEEK WHERE USERNAME = 'zamalek' LIMIT 1),TRUE),
+	VALUES ('2010-1-2','ahly','zamalek','REKWEEK',(SELECT ID FROM KWEEK WHERE USERNAME = 'zamalek' ORDER BY ID LIMIT 1),TRUE),
 		   ('2014-4-5','zamalek','degla','FOLLOW',null,TRUE),
-		   ('2018-8-8','degla','ahly','LIKE',(SELECT ID FROM KWEEK WHERE USERNAME = 'ahly' LIMIT 1),FALSE);
+		   ('2018-8-8','degla','ahly','LIKE',(SELECT ID FROM KWEEK WHERE USERNAME = 'ahly' ORDER BY ID LIMIT 1),FALSE);
@@ -139,3 +139,42 @@ def test_create_notifications_same_user():
         this function tests if the auth_user is the same as the notified user.
     """
     assert actions.create_notifications("ahmed", "ahmed", "FOLLOW", None) is None
+
+
+def test_unseen_counters():
+    """
+        this function tests that the unseen counters follow the notifications and messages, and that the
+        reconciliation fixes the counters that drifted.
+    """
+    from timelines_and_trends import actions as timelines_actions
+    from direct_messages import actions as messages_actions
+
+    def counters(username):
+        return (actions.get_notifications_unseen_count(username),
+                timelines_actions.get_replies_and_mentions_unseen_count(username),
+                messages_actions.get_unseen_conversations(username))
+
+    before = counters('no_message')
+    db_manager.execute_query_no_return("""
+        INSERT INTO MESSAGE(FROM_USERNAME, TO_USERNAME, CREATED_AT, TEXT, IS_SEEN) VALUES
+        ('ahly', 'no_message', NOW(), 'first', FALSE), ('ahly', 'no_message', NOW(), 'second', FALSE),
+        ('zamalek', 'no_message', NOW(), 'third', FALSE)
+    """)
+    db_manager.execute_query_no_return("""
+        INSERT INTO NOTIFICATION(CREATED_AT, NOTIFIED_USERNAME, INVOLVED_USERNAME, TYPE, IS_SEEN) VALUES
+        (NOW(), 'no_message', 'ahly', 'FOLLOW', FALSE), (NOW(), 'no_message', 'ahly', 'MENTION', FALSE)
+    """)
+    assert counters('no_message') == (before[0] + 1, before[1] + 1, before[2] + 2)
+    messages_actions.acknowledge('ahly', 'no_message')
+    assert counters('no_message') == (before[0] + 1, before[1] + 1, before[2] + 1)
+    actions.set_notifications_as_seen('no_message')
+    timelines_actions.set_replies_and_mentions_as_seen('no_message')
+    assert counters('no_message')[:2] == (0, 0)
+
+    expected = {username: counters(username) for username in ('ahly', 'degla', 'no_message')}
+    db_manager.execute_query_no_return("""
+        UPDATE UNSEEN_COUNTERS SET NOTIFICATIONS = 7, CONVERSATIONS = 0 WHERE USERNAME IN ('degla', 'no_message')
+    """)
+    assert sorted(actions.reconcile_unseen_counters(batch_size=2)) == ['degla', 'no_message']
+    assert {username: counters(username) for username in expected} == expected
+    assert actions.reconcile_unseen_counters() == []
@@ -0,0 +1,108 @@
+"""
+    Compares the latency of extracting the hashtags and mentions of many kweek texts by the former extractor (a
+    character by character scan ending the entities at spaces), by the regular expression extractor one text at a
+    time, and by the batch extractor.
+
+    The texts are generated from words, hashtags, mentions and punctuation. The latency is the best wall time of the
+    runs.
+
+    Usage: python -m stress_tests.entities --texts 100000 --runs 5
+"""
+import time
+from random import Random
+import click
+import app
+import config
+
+WORDS = ['kweek', 'hello', 'world', 'kwikker', 'backend', 'today', 'match', 'goal', 'مرحبا', 'café']
+PUNCTUATION = ['', '', '', ',', '.', '!', '\n']
+
+
+def former_extract_mentions_hashtags(text):
+    hashtags = []
+    mentions = []
+    size = len(text)
+    i = 0
+    while i < size:
+        hashtag_indices_list = []
+        mention_indices_list = []
+        if text[i] == '#':
+            hashtag_indices_list.append(i)
+            for i in range(i + 1, len(text)):
+
+                if (i == size - 1 and text[i] == ' ') or text[i] == ' ':
+                    hashtag_indices_list.append(i)
+                elif i == size - 1:
+                    hashtag_indices_list.append(i + 1)
+                else:
+                    continue
+                hashtag_text = text[hashtag_indices_list[0]:hashtag_indices_list[1]]
+                hashtags.append((hashtag_text, hashtag_indices_list[0], hashtag_indices_list[1]))
+                break
+        if text[i] == '@':
+            mention_indices_list.append(i)
+            for i in range(i + 1, len(text)):
+                if (i == size - 1 and text[i] == ' ') or text[i] == ' ':
+                    mention_indices_list.append(i)
+                elif i == size - 1:
+                    mention_indices_list.append(i + 1)
+                else:
+                    continue
+                mention_username = text[mention_indices_list[0] + 1:(mention_indices_list[1])]
+                mentions.append((mention_username, mention_indices_list[0], mention_indices_list[1]))
+                break
+        i += 1
+    return hashtags, mentions
+
+
+def generate_texts(count, seed=0):
+    random = Random(seed)
+    texts = []
+    for _ in range(count):
+        tokens = []
+        for _ in range(random.randint(3, 30)):
+            token = random.choice(WORDS)
+            kind = random.random()
+            if kind < 0.1:
+                token = '#' + token
+            elif kind < 0.15:
+                token = '@user' + str(random.randint(0, 1000))
+            tokens.append(token + random.choice(PUNCTUATION))
+        texts.append(' '.join(tokens))
+    return texts
+
+
+def best_time(function, runs):
+    best = None
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@click.command()
+@click.option('--texts', default=100000, help='Number of kweek texts the entities are extracted from.')
+@click.option('--runs', default=5, help='Number of timed runs per extractor, the best one is reported.')
+def cli(texts, runs):
+    app.app.config.from_object(config.TestingConfig)
+    from kweeks import actions
+
+    texts = generate_texts(texts)
+    extractors = [
+        ('former', lambda: [former_extract_mentions_hashtags(text) for text in texts]),
+        ('model objects', lambda: [actions.extract_mentions_hashtags(text) for text in texts]),
+        ('one text', lambda: [actions.extract_entities([text]) for text in texts]),
+        ('batch', lambda: actions.extract_entities(texts))
+    ]
+    former_time = None
+    for name, extractor in extractors:
+        elapsed = best_time(extractor, runs)
+        former_time = former_time or elapsed
+        click.echo('%-14s  texts: %d  best time: %.1fms (%.2fx)  per text: %.2fus' %
+                   (name, len(texts), elapsed * 1000, elapsed / former_time, elapsed / len(texts) * 10 ** 6))
+
+
+if __name__ == '__main__':
+    cli()
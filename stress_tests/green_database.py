@@ -0,0 +1,80 @@
+"""
+    Compares blocking and green (cooperative) database I/O under eventlet or gevent.
+
+    N greenlets each run one home timeline query (optionally preceded by a server side sleep to simulate
+    network latency). With blocking I/O every query holds the hub, so the greenlets run one after another.
+    In green mode the queries are in flight at the same time, so the wall time approaches a single query.
+
+    Usage: python -m stress_tests.green_database --async-mode eventlet --requests 20 --latency 0.2
+"""
+import time
+import click
+import config
+import config_local
+import database_manager
+import timelines_and_trends.query_factory as timelines_query_factory
+
+
+def spawn_all(async_mode, function, count):
+    if async_mode == 'eventlet':
+        import eventlet
+        pool = eventlet.GreenPool(count)
+        for index in range(count):
+            pool.spawn(function, index)
+        pool.waitall()
+    else:
+        import gevent
+        gevent.joinall([gevent.spawn(function, index) for index in range(count)])
+
+
+def run(async_mode, green, requests, latency, username):
+    db_manager = database_manager.DatabaseManager()
+    if green:
+        db_manager.enable_green_mode(async_mode)
+    response = db_manager.initialize_connection(
+        db_name=config.TestingConfig.DATABASE_NAME,
+        db_username=getattr(config_local, 'DATABASE_USERNAME', config.TestingConfig.DATABASE_USERNAME),
+        db_password=getattr(config_local, 'DATABASE_PASSWORD', config.TestingConfig.DATABASE_PASSWORD),
+        host=config.TestingConfig.DATABASE_HOST,
+        port=config.TestingConfig.DATABASE_PORT,
+        max_connections=requests)
+    if response is not None:
+        raise click.ClickException(str(response))
+    timelines_query_factory.db_manager = db_manager
+    spans = []
+
+    def timeline_request(index):
+        started_at = time.monotonic()
+        if latency > 0:
+            db_manager.execute_query('SELECT PG_SLEEP(%s)', (latency,))
+        timelines_query_factory.get_home_kweeks(username)
+        db_manager.release_connection()
+        spans.append((started_at, time.monotonic()))
+
+    started_at = time.monotonic()
+    spawn_all(async_mode, timeline_request, requests)
+    wall_time = time.monotonic() - started_at
+    db_manager.close_connection()
+    database_manager.extensions.set_wait_callback(None)
+
+    busy_time = sum(end - start for start, end in spans)
+    # How many requests were in flight on average, 1.0 means they ran strictly one after another
+    overlap = busy_time / wall_time if wall_time > 0 else 0.0
+    click.echo('%-8s  requests: %d  wall: %.3fs  sum of request times: %.3fs  average overlap: %.2f' %
+               ('green' if green else 'blocking', len(spans), wall_time, busy_time, overlap))
+    return wall_time
+
+
+@click.command()
+@click.option('--async-mode', type=click.Choice(['eventlet', 'gevent']), default='eventlet')
+@click.option('--requests', default=20, help='Number of concurrent timeline requests.')
+@click.option('--latency', default=0.1, help='Seconds each request waits on the server before its query.')
+@click.option('--username', default='test_user1', help='The user whose home timeline is requested.')
+def cli(async_mode, requests, latency, username):
+    blocking_time = run(async_mode, False, requests, latency, username)
+    green_time = run(async_mode, True, requests, latency, username)
+    click.echo('speedup: %.1fx' % (blocking_time / green_time if green_time > 0 else 0.0))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,105 @@
+"""
+    Compares the latency of the first page of the home timeline built by the 'query' engine and by the 'merge' engine,
+    with its per author caches empty (cold) and filled (warm), for users following 10, 1k and 10k users.
+
+    The followed users, their kweeks and rekweeks are generated in the test database and deleted afterwards.
+    The latency is the best wall time of the runs.
+
+    Usage: python -m stress_tests.home_timeline_engines --kweeks 5 --runs 5
+"""
+import time
+import click
+import app
+import config
+import config_local
+import database_manager
+from timelines_and_trends import actions, query_factory
+
+FOLLOWED_COUNTS = [10, 1000, 10000]
+
+SEED_QUERIES = [
+    """
+        INSERT INTO USER_CREDENTIALS (USERNAME, PASSWORD, EMAIL, IS_CONFIRMED)
+        SELECT 'bench_author_' || I, '', 'bench_author_' || I || '@bench.com', TRUE
+        FROM GENERATE_SERIES(1, %(authors)s) I
+        UNION ALL
+        SELECT 'bench_viewer_' || N, '', 'bench_viewer_' || N || '@bench.com', TRUE FROM UNNEST(%(followed)s) N
+    """,
+    """
+        INSERT INTO FOLLOW (FOLLOWER_USERNAME, FOLLOWED_USERNAME)
+        SELECT 'bench_viewer_' || N, 'bench_author_' || I FROM UNNEST(%(followed)s) N, GENERATE_SERIES(1, N) I
+    """,
+    """
+        INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO)
+        SELECT NOW() - (I * %(kweeks)s + J) * INTERVAL '1 MINUTE', 'Benchmark kweek', NULL, 'bench_author_' || I, NULL
+        FROM GENERATE_SERIES(1, %(authors)s) I, GENERATE_SERIES(1, %(kweeks)s) J
+    """,
+    """
+        INSERT INTO REKWEEK (USERNAME, KWEEK_ID, CREATED_AT)
+        SELECT 'bench_author_' || (1 + K.ID %% %(authors)s), K.ID, K.CREATED_AT + INTERVAL '30 SECONDS'
+        FROM KWEEK K WHERE K.USERNAME LIKE 'bench\\_author\\_%%' AND K.ID %% 3 = 0
+        ON CONFLICT DO NOTHING
+    """
+]
+
+
+def best_time(function, runs, before_run=None):
+    best = None
+    for _ in range(runs):
+        if before_run is not None:
+            before_run()
+        started_at = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started_at
+        if isinstance(result, Exception):
+            raise click.ClickException(str(result))
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@click.command()
+@click.option('--kweeks', default=5, help='Number of kweeks of each followed user.')
+@click.option('--runs', default=5, help='Number of timed runs per engine, the best one is reported.')
+def cli(kweeks, runs):
+    app.app.config.from_object(config.TestingConfig)
+    app.app.config.from_object(config_local)
+    db_manager = database_manager.db_manager
+    response = db_manager.initialize_connection(
+        db_name=config.TestingConfig.DATABASE_NAME,
+        db_username=getattr(config_local, 'DATABASE_USERNAME', config.TestingConfig.DATABASE_USERNAME),
+        db_password=getattr(config_local, 'DATABASE_PASSWORD', config.TestingConfig.DATABASE_PASSWORD),
+        host=config.TestingConfig.DATABASE_HOST,
+        port=config.TestingConfig.DATABASE_PORT)
+    if response is not None:
+        raise click.ClickException(str(response))
+
+    data = {'authors': max(FOLLOWED_COUNTS), 'followed': FOLLOWED_COUNTS, 'kweeks': kweeks}
+    try:
+        for query in SEED_QUERIES:
+            response = db_manager.execute_query_no_return(query, data)
+            if response is not None:
+                raise click.ClickException(str(response))
+        db_manager.execute_query_no_return('ANALYZE')
+
+        for followed in FOLLOWED_COUNTS:
+            viewer = 'bench_viewer_%d' % followed
+            authors = [viewer] + ['bench_author_%d' % i for i in range(1, followed + 1)]
+            expected_page = query_factory.get_home_kweeks(viewer, limit=21)
+            assert actions.get_merged_home_kweeks(viewer, limit=21) == expected_page
+
+            query_time = best_time(lambda: query_factory.get_home_kweeks(viewer, limit=21), runs)
+            cold_time = best_time(lambda: actions.get_merged_home_kweeks(viewer, limit=21), runs,
+                                  before_run=lambda: actions.forget_authors_latest_entries(authors))
+            warm_time = best_time(lambda: actions.get_merged_home_kweeks(viewer, limit=21), runs)
+            click.echo('following %-6d  query: %.1fms  merge (cold): %.1fms (%.2fx)  merge (warm): %.1fms (%.2fx)' %
+                       (followed, query_time * 1000, cold_time * 1000, cold_time / query_time,
+                        warm_time * 1000, warm_time / query_time))
+    finally:
+        db_manager.execute_query_no_return("DELETE FROM USER_CREDENTIALS WHERE USERNAME LIKE 'bench\\_%%'")
+        # Refresh the statistics that still count the deleted rows
+        db_manager.execute_query_no_return('ANALYZE')
+        db_manager.close_connection()
+
+
+if __name__ == '__main__':
+    cli()
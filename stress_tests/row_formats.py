@@ -0,0 +1,74 @@
+"""
+    Compares the memory and latency of fetching a large timeline as dictionaries, named tuples and tuples.
+
+    The rows have the same columns as the home timeline query (id, created_at, text, media_url, username,
+    reply_to, is_rekweek, rekweeker) and are generated by the database, so no data has to be seeded.
+    The memory is the size of the fetched result list as traced by tracemalloc, the latency is the best
+    wall time of the runs (query, transfer and building the rows).
+
+    Usage: python -m stress_tests.row_formats --rows 10000 --runs 5
+"""
+import gc
+import time
+import tracemalloc
+import click
+import config
+import config_local
+import database_manager
+
+TIMELINE_QUERY = """
+    SELECT ID, NOW() - ID * INTERVAL '1 MINUTE' AS CREATED_AT, 'Kweek number ' || ID AS TEXT, NULL AS MEDIA_URL,
+           'user' || ID %% 100 AS USERNAME, NULLIF(ID %% 7, 0) AS REPLY_TO, ID %% 5 = 0 AS IS_REKWEEK,
+           CASE WHEN ID %% 5 = 0 THEN 'rekweeker' || ID %% 10 END AS REKWEEKER
+    FROM GENERATE_SERIES(1, %s) AS ID
+    ORDER BY ID DESC
+"""
+
+
+def measure(db_manager, row_format, rows, runs):
+    best_time = None
+    for _ in range(runs):
+        gc.collect()
+        started_at = time.perf_counter()
+        result = db_manager.execute_query(TIMELINE_QUERY, (rows,), row_format=row_format)
+        elapsed = time.perf_counter() - started_at
+        if isinstance(result, Exception):
+            raise click.ClickException(str(result))
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = db_manager.execute_query(TIMELINE_QUERY, (rows,), row_format=row_format)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == rows
+    return best_time, memory
+
+
+@click.command()
+@click.option('--rows', default=10000, help='Number of timeline rows fetched.')
+@click.option('--runs', default=5, help='Number of timed runs per row format, the best one is reported.')
+def cli(rows, runs):
+    db_manager = database_manager.DatabaseManager()
+    response = db_manager.initialize_connection(
+        db_name=config.TestingConfig.DATABASE_NAME,
+        db_username=getattr(config_local, 'DATABASE_USERNAME', config.TestingConfig.DATABASE_USERNAME),
+        db_password=getattr(config_local, 'DATABASE_PASSWORD', config.TestingConfig.DATABASE_PASSWORD),
+        host=config.TestingConfig.DATABASE_HOST,
+        port=config.TestingConfig.DATABASE_PORT)
+    if response is not None:
+        raise click.ClickException(str(response))
+    results = {}
+    for row_format in ('dict', 'namedtuple', 'tuple'):
+        results[row_format] = measure(db_manager, row_format, rows, runs)
+    db_manager.close_connection()
+
+    dict_time, dict_memory = results['dict']
+    for row_format, (best_time, memory) in results.items():
+        click.echo('%-10s  rows: %d  best time: %.1fms (%.2fx)  memory: %.2fMB (%.2fx)' %
+                   (row_format, rows, best_time * 1000, best_time / dict_time,
+                    memory / 2 ** 20, memory / dict_memory))
+
+
+if __name__ == '__main__':
+    cli()
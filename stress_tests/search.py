@@ -0,0 +1,141 @@
+"""
+    Compares the latency of a page of search results fetched by the former search query (every matching kweek
+    ranked twice, then sliced in Python) and by the keyset paginated search through the GIN index, on the first
+    page and on a deep page.
+
+    The kweeks are generated in a transaction of the test database that is rolled back afterwards (deleting them
+    would cascade to every table referencing the kweeks). Their texts are made of terms whose
+    frequencies are skewed, so the searched terms range from common to rare.
+    The latency is the best wall time of the runs.
+
+    Usage: python -m stress_tests.search --kweeks 1000000 --runs 5
+"""
+import time
+import click
+import app
+import config
+import config_local
+import database_manager
+from timelines_and_trends import query_factory
+
+SEARCH_TEXTS = ['term0', 'term5', 'term100 term200', 'term999']
+
+SEED_QUERIES = [
+    """
+        INSERT INTO USER_CREDENTIALS (USERNAME, PASSWORD, EMAIL, IS_CONFIRMED)
+        SELECT 'bench_author_' || I, '', 'bench_author_' || I || '@bench.com', TRUE
+        FROM GENERATE_SERIES(0, %(authors)s - 1) I
+        UNION ALL
+        SELECT 'bench_viewer', '', 'bench_viewer@bench.com', TRUE
+    """,
+    """
+        INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO)
+        SELECT NOW() - I * INTERVAL '1 SECOND',
+               (SELECT STRING_AGG('term' || FLOOR(POWER(RANDOM(), 3) * 1000)::INT, ' ')
+                FROM GENERATE_SERIES(1, %(terms)s) WHERE I > 0),
+               NULL, 'bench_author_' || I %% %(authors)s, NULL
+        FROM GENERATE_SERIES(1, %(kweeks)s) I
+    """
+]
+
+FORMER_SEARCH_QUERY = """
+    SELECT K.*, TS_RANK(TOKENS, TO_TSQUERY('english_nostop', %s))::NUMERIC AS RANK
+    FROM KWEEK K JOIN KWEEK_SEARCH_TOKENS KS ON K.ID = KS.KWEEK_ID
+    WHERE TS_RANK(TOKENS, TO_TSQUERY('english_nostop', %s)) > 0.00001
+    AND K.USERNAME NOT IN (SELECT BLOCKER_USERNAME FROM BLOCK WHERE BLOCKED_USERNAME= %s)
+    ORDER BY RANK DESC, CREATED_AT DESC, ID DESC
+"""
+
+
+class RollBack(Exception):
+    """
+        Raised to roll back the transaction of the generated kweeks.
+    """
+
+
+def best_time(function, runs):
+    best = None
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started_at
+        if isinstance(result, Exception):
+            raise click.ClickException(str(result))
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def former_search_page(db_manager, search_text, page):
+    query_text = '&'.join(search_text.split())
+    kweeks = db_manager.execute_query(FORMER_SEARCH_QUERY, (query_text, query_text, 'bench_viewer'),
+                                      row_format='namedtuple')
+    if isinstance(kweeks, Exception):
+        return kweeks
+    return kweeks[page * 20: page * 20 + 21]
+
+
+def compare(db_manager, data, page, runs):
+    click.echo('Generating %d kweeks...' % data['kweeks'])
+    for query in SEED_QUERIES:
+        response = db_manager.execute_query_no_return(query, data)
+        if response is not None:
+            raise click.ClickException(str(response))
+    db_manager.execute_query_no_return('ANALYZE')
+
+    for search_text in SEARCH_TEXTS:
+        query_text = '&'.join(search_text.split())
+        first_page = query_factory.get_search_kweeks(search_text, 'bench_viewer', limit=21)
+        matches = len(db_manager.execute_query(FORMER_SEARCH_QUERY, (query_text, query_text, 'bench_viewer'),
+                                               row_format='tuple'))
+        assert first_page == former_search_page(db_manager, search_text, 0)
+        # The key of the last kweek of the page before the deep page, as sent in the cursor
+        deep_page_after = None
+        if page > 0 and matches > page * 20:
+            last = query_factory.get_search_kweeks(search_text, 'bench_viewer', limit=page * 20)[-1]
+            deep_page_after = (last.rank, last.created_at, last.id)
+
+        former_time = best_time(lambda: former_search_page(db_manager, search_text, 0), runs)
+        first_time = best_time(lambda: query_factory.get_search_kweeks(search_text, 'bench_viewer', limit=21),
+                               runs)
+        line = '%-16s matches: %-7d  former: %.1fms  keyset first page: %.1fms (%.2fx)' % \
+               (search_text, matches, former_time * 1000, first_time * 1000, first_time / former_time)
+        if deep_page_after is not None:
+            deep_time = best_time(lambda: query_factory.get_search_kweeks(search_text, 'bench_viewer',
+                                                                          after=deep_page_after, limit=21),
+                                  runs)
+            line += '  keyset page %d: %.1fms (%.2fx)' % (page, deep_time * 1000, deep_time / former_time)
+        click.echo(line)
+
+
+@click.command()
+@click.option('--kweeks', default=1000000, help='Number of kweeks searched.')
+@click.option('--authors', default=1000, help='Number of users the kweeks are spread over.')
+@click.option('--terms', default=8, help='Number of terms in each kweek.')
+@click.option('--page', default=50, help='Number of the deep page fetched (0 is the first page).')
+@click.option('--runs', default=5, help='Number of timed runs per query, the best one is reported.')
+def cli(kweeks, authors, terms, page, runs):
+    app.app.config.from_object(config.TestingConfig)
+    app.app.config.from_object(config_local)
+    db_manager = database_manager.db_manager
+    response = db_manager.initialize_connection(
+        db_name=config.TestingConfig.DATABASE_NAME,
+        db_username=getattr(config_local, 'DATABASE_USERNAME', config.TestingConfig.DATABASE_USERNAME),
+        db_password=getattr(config_local, 'DATABASE_PASSWORD', config.TestingConfig.DATABASE_PASSWORD),
+        host=config.TestingConfig.DATABASE_HOST,
+        port=config.TestingConfig.DATABASE_PORT)
+    if response is not None:
+        raise click.ClickException(str(response))
+
+    data = {'kweeks': kweeks, 'authors': authors, 'terms': terms}
+    try:
+        with db_manager.transaction():
+            compare(db_manager, data, page, runs)
+            raise RollBack()
+    except RollBack:
+        pass
+    finally:
+        db_manager.close_connection()
+
+
+if __name__ == '__main__':
+    cli()
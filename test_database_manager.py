@@ -0,0 +1,229 @@
+import psycopg2
+import pytest
+from app import app
+from database_manager import ConnectionPool, DatabaseManager, db_manager as app_db_manager
+
+
+def connection_string(db_name):
+    connection_string = 'dbname=%s user=%s password=%s' % (db_name, app.config['DATABASE_USERNAME'],
+                                                          app.config['DATABASE_PASSWORD'])
+    if app.config['DATABASE_HOST'] is not None:
+        connection_string += ' host=%s port=%s' % (app.config['DATABASE_HOST'], app.config['DATABASE_PORT'])
+    return connection_string
+
+
+@pytest.fixture
+def replicated_db_manager():
+    # Two plain databases stand in for the primary and its replica, told apart by their names
+    db_manager = DatabaseManager()
+    response = db_manager.initialize_connection(db_name=app.config['DATABASE_NAME'],
+                                                db_username=app.config['DATABASE_USERNAME'],
+                                                db_password=app.config['DATABASE_PASSWORD'],
+                                                host=app.config['DATABASE_HOST'],
+                                                port=app.config['DATABASE_PORT'],
+                                                replicas=[connection_string(app.config['MIGRATIONS_DATABASE_NAME'])],
+                                                read_your_writes_window=60)
+    assert response is None
+    yield db_manager
+    db_manager.close_connection()
+
+
+@pytest.fixture
+def replicated_app_db_manager():
+    # The manager used by the actions, with the same stand in replica
+    replica_pool = ConnectionPool(connection_string(app.config['MIGRATIONS_DATABASE_NAME']),
+                                  semaphore_factory=app_db_manager._semaphore_factory)
+    read_your_writes_window = app_db_manager.read_your_writes_window
+    app_db_manager.end_request()
+    app_db_manager.replica_pools = [replica_pool]
+    app_db_manager.read_your_writes_window = 60
+    yield app_db_manager
+    app_db_manager.end_request()
+    app_db_manager.replica_pools = []
+    app_db_manager.read_your_writes_window = read_your_writes_window
+    replica_pool.close()
+
+
+def read_database(db_manager):
+    return db_manager.execute_query('SELECT CURRENT_DATABASE() AS NAME')[0]['name']
+
+
+def test_read_write_split(replicated_db_manager):
+    primary = app.config['DATABASE_NAME']
+    replica = app.config['MIGRATIONS_DATABASE_NAME']
+    assert read_database(replicated_db_manager) == replica
+    with replicated_db_manager.transaction():
+        assert read_database(replicated_db_manager) == primary
+    assert read_database(replicated_db_manager) == replica
+    # After writing, the rest of the request reads from the primary
+    assert replicated_db_manager.execute_query_no_return('SELECT 1') is None
+    assert read_database(replicated_db_manager) == primary
+    replicated_db_manager.end_request()
+    assert read_database(replicated_db_manager) == replica
+    # A request keeps its replica connection until it ends
+    assert replicated_db_manager.get_replica_pool_statistics()[0]['checkouts'] == 2
+
+
+def test_read_your_writes(replicated_db_manager):
+    primary = app.config['DATABASE_NAME']
+    replica = app.config['MIGRATIONS_DATABASE_NAME']
+    replicated_db_manager.set_request_user('writer')
+    replicated_db_manager.execute_query_no_return('SELECT 1')
+    replicated_db_manager.end_request()
+    # The writer keeps reading from the primary within the window, other users read from the replica
+    replicated_db_manager.set_request_user('writer')
+    assert read_database(replicated_db_manager) == primary
+    replicated_db_manager.end_request()
+    replicated_db_manager.set_request_user('reader')
+    assert read_database(replicated_db_manager) == replica
+    replicated_db_manager.end_request()
+    replicated_db_manager.read_your_writes_window = None
+    replicated_db_manager.set_request_user('writer')
+    assert read_database(replicated_db_manager) == replica
+
+
+def test_row_formats():
+    db_manager = DatabaseManager()
+    assert db_manager.initialize_connection(db_name=app.config['DATABASE_NAME'],
+                                            db_username=app.config['DATABASE_USERNAME'],
+                                            db_password=app.config['DATABASE_PASSWORD'],
+                                            host=app.config['DATABASE_HOST'],
+                                            port=app.config['DATABASE_PORT']) is None
+    query = 'SELECT GENERATE_SERIES(1, 3) AS ID, \'kweek\' AS TEXT'
+    assert db_manager.execute_query(query) == [{'id': 1, 'text': 'kweek'}, {'id': 2, 'text': 'kweek'},
+                                               {'id': 3, 'text': 'kweek'}]
+    rows = db_manager.execute_query(query, row_format='namedtuple')
+    assert [(row.id, row.text) for row in rows] == [(1, 'kweek'), (2, 'kweek'), (3, 'kweek')]
+    assert db_manager.execute_query(query, row_format='tuple') == [(1, 'kweek'), (2, 'kweek'), (3, 'kweek')]
+    assert [row.id for row in db_manager.execute_query_stream(query, batch_size=2, row_format='namedtuple')] == \
+        [1, 2, 3]
+    assert list(db_manager.execute_query_stream(query, row_format='tuple')) == [(1, 'kweek'), (2, 'kweek'),
+                                                                               (3, 'kweek')]
+    assert isinstance(db_manager.execute_query(query, row_format='list'), ValueError)
+    with pytest.raises(ValueError):
+        list(db_manager.execute_query_stream(query, row_format='list'))
+    db_manager.close_connection()
+
+
+def test_stream_interleaving():
+    db_manager = DatabaseManager()
+    assert db_manager.initialize_connection(db_name=app.config['DATABASE_NAME'],
+                                            db_username=app.config['DATABASE_USERNAME'],
+                                            db_password=app.config['DATABASE_PASSWORD'],
+                                            host=app.config['DATABASE_HOST'],
+                                            port=app.config['DATABASE_PORT']) is None
+    assert db_manager.execute_query_no_return('CREATE TEMPORARY TABLE STREAMED (ID INT)') is None
+    query = 'SELECT GENERATE_SERIES(1, 3) AS ID'
+    count_query = 'SELECT COUNT(*) AS COUNT FROM STREAMED'
+
+    # Nothing runs in the transaction of an open stream
+    rows = db_manager.execute_query_stream(query, batch_size=1)
+    assert next(rows)['id'] == 1
+    with pytest.raises(psycopg2.ProgrammingError):
+        with db_manager.transaction():
+            pass
+    assert isinstance(db_manager.execute_query(count_query), psycopg2.ProgrammingError)
+    assert isinstance(db_manager.execute_query_no_return('INSERT INTO STREAMED VALUES (1)'),
+                      psycopg2.ProgrammingError)
+    with pytest.raises(psycopg2.ProgrammingError):
+        next(db_manager.execute_query_stream(query))
+    rows.close()
+    with db_manager.transaction():
+        assert db_manager.execute_query_no_return('INSERT INTO STREAMED VALUES (1)') is None
+    assert db_manager.execute_query(count_query)[0]['count'] == 1
+
+    # A stream closed inside its transaction lets it commit
+    with db_manager.transaction():
+        assert db_manager.execute_query_no_return('INSERT INTO STREAMED VALUES (2)') is None
+        assert [row['id'] for row in db_manager.execute_query_stream(query)] == [1, 2, 3]
+        assert db_manager.execute_query_no_return('INSERT INTO STREAMED VALUES (3)') is None
+    assert db_manager.execute_query(count_query)[0]['count'] == 3
+
+    # A stream left open rolls back the transaction it is in, and is ended along with it
+    with pytest.raises(psycopg2.ProgrammingError):
+        with db_manager.transaction():
+            assert db_manager.execute_query_no_return('INSERT INTO STREAMED VALUES (4)') is None
+            rows = db_manager.execute_query_stream(query, batch_size=1)
+            assert next(rows)['id'] == 1
+    rows.close()
+    assert db_manager.connection.autocommit
+    assert db_manager.execute_query(count_query)[0]['count'] == 3
+    assert db_manager.execute_query_no_return('INSERT INTO STREAMED VALUES (5)') is None
+    assert db_manager.execute_query(count_query)[0]['count'] == 4
+    db_manager.close_connection()
+
+
+def test_primary_queries(replicated_db_manager):
+    primary = app.config['DATABASE_NAME']
+    replica = app.config['MIGRATIONS_DATABASE_NAME']
+    query = 'SELECT CURRENT_DATABASE() AS NAME'
+    assert replicated_db_manager.execute_query(query, primary=True)[0]['name'] == primary
+    # A query forced to the primary counts as a write
+    assert read_database(replicated_db_manager) == primary
+    replicated_db_manager.end_request()
+    assert read_database(replicated_db_manager) == replica
+
+
+def test_sweep_hashtags_on_primary(replicated_app_db_manager):
+    from kweeks.actions import sweep_hashtags
+    query = """INSERT INTO HASHTAG (TEXT) VALUES ('#replicated_sweep') RETURNING ID"""
+    hashtag_id = replicated_app_db_manager.execute_query(query, primary=True)[0]['id']
+    replicated_app_db_manager.end_request()
+    assert read_database(replicated_app_db_manager) == app.config['MIGRATIONS_DATABASE_NAME']
+    # The replica has no hashtags, the sweep fails unless it deletes them on the primary
+    assert sweep_hashtags() >= 1
+    query = """SELECT COUNT(*) FROM HASHTAG WHERE ID = %s"""
+    assert replicated_app_db_manager.execute_query(query, (hashtag_id,), primary=True)[0]['count'] == 0
+
+
+def test_read_your_kweeks(replicated_app_db_manager):
+    from datetime import datetime
+    from kweeks.actions import insert_kweek
+    from models import Kweek, User
+    query = """INSERT INTO USER_CREDENTIALS (USERNAME, PASSWORD, EMAIL, IS_CONFIRMED)
+               VALUES ('replicated_writer', '', 'replicated_writer@kwikker.com', TRUE)"""
+    assert replicated_app_db_manager.execute_query_no_return(query) is None
+    replicated_app_db_manager.end_request()
+    # A read only transaction does not pin the reads of the user to the primary
+    replicated_app_db_manager.set_request_user('replicated_writer')
+    with replicated_app_db_manager.transaction():
+        assert read_database(replicated_app_db_manager) == app.config['DATABASE_NAME']
+    assert read_database(replicated_app_db_manager) == app.config['MIGRATIONS_DATABASE_NAME']
+    # The kweek is inserted by a query returning rows in a transaction
+    kweek = Kweek({
+        'id': 0,
+        'created_at': datetime.utcnow(),
+        'text': 'read your kweeks',
+        'media_url': None,
+        'user': User({
+            'username': 'replicated_writer',
+            'screen_name': 'replicated_writer',
+            'profile_image_url': 'image_url',
+            'following': False,
+            'follows_you': False,
+            'muted': False,
+            'blocked': False
+        }),
+        'mentions': [],
+        'hashtags': [],
+        'number_of_likes': 0,
+        'number_of_rekweeks': 0,
+        'number_of_replies': 0,
+        'reply_info': None,
+        'reply_to': None,
+        'rekweek_info': None,
+        'liked_by_user': False,
+        'rekweeked_by_user': False
+    })
+    assert insert_kweek(kweek) == (True, 'success.', 200)
+    assert read_database(replicated_app_db_manager) == app.config['DATABASE_NAME']
+    replicated_app_db_manager.end_request()
+    # The author reads their kweek from the primary in their next requests
+    replicated_app_db_manager.set_request_user('replicated_writer')
+    assert read_database(replicated_app_db_manager) == app.config['DATABASE_NAME']
+    replicated_app_db_manager.end_request()
+    replicated_app_db_manager.set_request_user('reader')
+    assert read_database(replicated_app_db_manager) == app.config['MIGRATIONS_DATABASE_NAME']
+    replicated_app_db_manager.end_request()
+    query = """DELETE FROM USER_CREDENTIALS WHERE USERNAME = 'replicated_writer'"""
+    assert replicated_app_db_manager.execute_query_no_return(query) is None
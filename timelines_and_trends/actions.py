@@ -1,6 +1,97 @@
+import base64
+import bisect
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+import numpy as np
 from . import query_factory
+from app import app, socketio
+from database_manager import db_manager
 from models import User, Mention, Hashtag, Kweek, RekweekInfo, Trend, ReplyInfo
 
+logger = logging.getLogger(__name__)
+
+# The columns (and their types) forming the key of a row in each kind of timeline, matching the sort columns
+# of the timeline queries
+KWEEKS_SORT_KEY = [('created_at', datetime), ('id', int)]
+REKWEEKS_SORT_KEY = [('sort_by', datetime), ('id', int), ('rekweeker', str)]
+SEARCH_SORT_KEY = [('rank', Decimal), ('created_at', datetime), ('id', int)]
+
+# The latest kweeks and rekweeks of each author cached by the 'merge' home timeline engine, as
+# username: (time loaded, entries), the least recently used first. The generation counts the dropped entries.
+authors_latest_entries = OrderedDict()
+authors_latest_entries_lock = threading.Lock()
+authors_latest_entries_generation = 0
+
+# The top trends served by /trends/, as (time refreshed, trends). Refreshed in the background once older than
+# TRENDS_REFRESH_INTERVAL seconds.
+trends_snapshot = None
+trends_snapshot_lock = threading.Lock()
+trends_refreshing = False
+
+
+class SearchCache:
+    """
+        A bounded cache of search results, the least recently used results are dropped first.
+        The results expire after a number of seconds, or once the generation they were cached with changes.
+        The size and the time to live are read from the app configuration.
+    """
+    def __init__(self, size_config, ttl_config):
+        self.size_config = size_config
+        self.ttl_config = ttl_config
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, generation=None):
+        """
+            Gets the cached results of a search, None if they are missing, expired or of another generation.
+        """
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is None:
+                return None
+            cached_at, cached_generation, results = cached
+            if cached_generation != generation or time.monotonic() - cached_at >= app.config[self.ttl_config]:
+                del self.results[key]
+                return None
+            self.results.move_to_end(key)
+            return results
+
+    def put(self, key, results, generation=None):
+        """
+            Caches the results of a search, dropping the least recently used ones beyond the size of the cache.
+        """
+        size = app.config[self.size_config]
+        with self.lock:
+            self.results[key] = (time.monotonic(), generation, results)
+            self.results.move_to_end(key)
+            while len(self.results) > size:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+
+# The keys and authors of the kweeks matching each search text, as (entries, truncated). They are shared by all the
+# users, the kweeks of the users blocking the searching user are filtered out on each search.
+search_kweeks_cache = SearchCache('SEARCH_CACHE_SIZE', 'SEARCH_CACHE_TTL')
+
+
+class KweeksPage(list):
+    """
+        A list of kweeks that also holds the cursor of the next page.
+        The cursor is None if this is the last page.
+    """
+    def __init__(self, kweeks, next_cursor=None):
+        super().__init__(kweeks)
+        self.next_cursor = next_cursor
+
 
 def get_friendship(authorized_username, required_username):
     """
@@ -21,22 +112,35 @@ def get_friendship(authorized_username, required_username):
 
             Note: All the dictionary values are None if the authorized user is the same as the required user.
     """
-    friendship = {}
+    return get_friendships(authorized_username, [required_username])[required_username]
 
-    # The friendship checks are invalid if the authorized username is the same as the required username
-    if authorized_username == required_username:
-        friendship['following'] = None
-        friendship['follows_you'] = None
-        friendship['blocked'] = None
-        friendship['muted'] = None
-        return friendship
 
-    friendship['following'] = query_factory.check_following(authorized_username, required_username)
-    friendship['follows_you'] = query_factory.check_follows_you(authorized_username, required_username)
-    friendship['blocked'] = query_factory.check_blocked(authorized_username, required_username)
-    friendship['muted'] = query_factory.check_muted(authorized_username, required_username)
+def get_friendships(authorized_username, usernames):
+    """
+        Gets the friendship status of the authorized user and many users with a single query.
+
 
-    return friendship
+        *Parameters:*
+            - *authorized_username (string)*: The username of the authorized user.
+            - *usernames (iterable of strings)*: The usernames of the required users.
+
+        *Returns:*
+            - | *Dictionary*: Maps each required username to its friendship dictionary, as returned by
+              | `get_friendship`. All the values are None for the authorized user.
+    """
+    friendships = {}
+    usernames = set(usernames)
+    # The friendship checks are invalid if the authorized username is the same as the required username
+    if authorized_username in usernames:
+        usernames.remove(authorized_username)
+        friendships[authorized_username] = {'following': None, 'follows_you': None, 'blocked': None, 'muted': None}
+    if not usernames:
+        return friendships
+    for username, following, follows_you, blocked, muted in query_factory.get_friendships(authorized_username,
+                                                                                          usernames):
+        friendships[username] = {'following': following, 'follows_you': follows_you,
+                                 'blocked': blocked, 'muted': muted}
+    return friendships
 
 
 def get_user(authorized_username, required_username):
@@ -104,41 +208,131 @@ def get_kweek_hashtags(kweek_id):
     return hashtags
 
 
+def compute_trends(now=None):
+    """
+        Scores the hashtags of the kweeks created in the last TRENDS_WINDOW seconds, a kweek counting half as much
+        every TRENDS_HALF_LIFE seconds, and gets the top ones.
+
+
+        *Parameters:*
+            - *now (datetime)*: Optional. The end of the window, in UTC. Default: the current time.
+
+        *Returns:*
+            - | *List of dictionaries*: The top TRENDS_SNAPSHOT_SIZE hashtags, the highest score first: {
+              | *id (int)*: The id of the hashtag.,
+              | *text (string)*: The text of the hashtag.,
+              | *number_of_kweeks (int)*: The number of kweeks with the hashtag in the window.
+              | }
+            - *Exception object*: If an exception occurred.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    buckets = query_factory.get_hashtag_buckets(now, now - timedelta(seconds=app.config['TRENDS_WINDOW']))
+    if isinstance(buckets, Exception):
+        return buckets
+    if not buckets:
+        return []
+    bucket_hashtag_ids, texts, ages, kweeks = zip(*buckets)
+    hashtag_ids, hashtag_indices = np.unique(bucket_hashtag_ids, return_inverse=True)
+    kweeks = np.array(kweeks, dtype=np.float64)
+    scores = np.bincount(hashtag_indices,
+                         weights=kweeks * np.exp2(-np.array(ages) / app.config['TRENDS_HALF_LIFE']))
+    numbers_of_kweeks = np.bincount(hashtag_indices, weights=kweeks)
+    texts = dict(zip(bucket_hashtag_ids, texts))
+    # The highest score first, the ties broken by the hashtag id
+    top = np.lexsort((hashtag_ids, -scores))[:app.config['TRENDS_SNAPSHOT_SIZE']]
+    return [{'id': int(hashtag_ids[index]), 'text': texts[hashtag_ids[index]],
+             'number_of_kweeks': int(numbers_of_kweeks[index])} for index in top]
+
+
+def refresh_trends(now=None):
+    """
+        Recomputes the snapshot of the top trends served by `get_all_trends`.
+
+
+        *Parameters:*
+            - *now (datetime)*: Optional. The end of the trends window, in UTC. Default: the current time.
+
+        *Returns:*
+            - *None*: If the snapshot was refreshed successfully.
+            - *Exception object*: If an exception occurred.
+    """
+    global trends_snapshot
+    trends = compute_trends(now)
+    if isinstance(trends, Exception):
+        return trends
+    with trends_snapshot_lock:
+        trends_snapshot = (time.monotonic(), trends)
+    return None
+
+
+def refresh_trends_in_background():
+    global trends_refreshing
+    try:
+        response = refresh_trends()
+        if response is not None:
+            logger.warning('Could not refresh the trends: %s', response)
+    finally:
+        db_manager.end_request()
+        with trends_snapshot_lock:
+            trends_refreshing = False
+
+
+def get_trends_snapshot():
+    """
+        Gets the top trends from the snapshot, computing it if there is none yet. A stale snapshot is still
+        returned while it is refreshed in the background.
+
+
+        *Returns:*
+            - *List of dictionaries*: The top trends, as returned by `compute_trends`.
+            - *Raises TypeError*: If the snapshot could not be computed.
+    """
+    global trends_refreshing
+    with trends_snapshot_lock:
+        snapshot = trends_snapshot
+        refresh = (snapshot is not None and not trends_refreshing and
+                   time.monotonic() - snapshot[0] >= app.config['TRENDS_REFRESH_INTERVAL'])
+        if refresh:
+            trends_refreshing = True
+    if snapshot is None:
+        response = refresh_trends()
+        if response is not None:
+            raise TypeError(str(response))
+        return trends_snapshot[1]
+    if refresh:
+        # A greenlet under eventlet or gevent, as the green database pool cannot wake an OS thread
+        socketio.start_background_task(refresh_trends_in_background)
+    return snapshot[1]
+
+
 def get_all_trends(last_retrieved_trend_id):
     """
-        Gets all the hashtags.
+        Gets the top trends.
 
 
         *Parameters:*
-            - *last_retrieved_kweek_id (string)*: The id of the last retrieved trend (used to fetch more). Nullable.
+            - *last_retrieved_trend_id (string)*: The id of the last retrieved trend (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Hashtag objects*
+            - *List of models.Trend objects*
+            - *None*: If the last retrieved trend is not one of the top trends.
     """
     if last_retrieved_trend_id is not None:
         try:
             last_retrieved_trend_id = int(last_retrieved_trend_id)
         except ValueError:
             raise
-    database_trends = query_factory.get_all_trends()
     # Paginate the results
     try:
-        database_trends = paginate(dictionaries_list=database_trends, required_size=10,
-                                   start_after_key='id', start_after_value=last_retrieved_trend_id)
+        trends = paginate(dictionaries_list=get_trends_snapshot(), required_size=10,
+                          start_after_key='id', start_after_value=last_retrieved_trend_id)
     except TypeError as E:
         print(E)
         raise
-    if database_trends is None:
+    if trends is None:
         return None
-    trends = []
-    for database_trend in database_trends:
-        trend = {
-            'id': database_trend['id'],
-            'text': database_trend['text'],
-            'number_of_kweeks': database_trend['number_of_kweeks']
-        }
-        trends.append(Trend(trend))
-    return trends
+    return [Trend(trend) for trend in trends]
 
 
 def is_trend(trend_id):
@@ -198,10 +392,59 @@ def get_kweek_statistics(authorized_username, kweek_id):
                                               kweek_id=kweek_id)
 
 
+def is_row(value):
+    """
+        Checks if a value is a row that can be paginated: a dictionary or a named tuple.
+
+
+        *Parameters:*
+            - *value*: The value to be checked.
+
+        *Returns:*
+            - *True*: The value is a dictionary or a named tuple.
+            - *False*: Otherwise.
+    """
+    return isinstance(value, dict) or (isinstance(value, tuple) and hasattr(value, '_fields'))
+
+
+def row_has_key(row, key):
+    """
+        Checks if a row (a dictionary or a named tuple) has a given key.
+    """
+    if isinstance(row, dict):
+        return key in row
+    return key in row._fields
+
+
+def row_value(row, key):
+    """
+        Gets the value of a given key of a row (a dictionary or a named tuple).
+    """
+    if isinstance(row, dict):
+        return row[key]
+    return getattr(row, key)
+
+
+def row_to_dict(row):
+    """
+        Converts a row (a dictionary or a named tuple) to a new dictionary that can be modified.
+
+
+        *Parameters:*
+            - *row*: The row to be converted.
+
+        *Returns:*
+            - *Dictionary*: The keys are the column names of the row.
+    """
+    if isinstance(row, dict):
+        return row
+    return dict(row._asdict())
+
+
 def paginate(dictionaries_list, required_size, start_after_key, start_after_value,
              secondary_start_after_key=None, secondary_start_after_value=None):
     """
-        Slices a list of dictionaries, starting at a given element and producing a new list
+        Slices a list of dictionaries (or named tuples), starting at a given element and producing a new list
         with the required size. Should be called inside a try block, may raise TypeError.
 
 
@@ -228,20 +471,20 @@ def paginate(dictionaries_list, required_size, start_after_key, start_after_valu
     start_after_index = None
     if secondary_start_after_key is None:
         for index, value in enumerate(dictionaries_list):
-            if not isinstance(value, dict):
+            if not is_row(value):
                 raise TypeError('One or more values in dictionaries_list are not a dictionary.')
-            if start_after_key not in value:
+            if not row_has_key(value, start_after_key):
                 raise TypeError('One or more dictionary in dictionaries_list do not contain the provided key.')
-            if start_after_index is None and value[start_after_key] == start_after_value:
+            if start_after_index is None and row_value(value, start_after_key) == start_after_value:
                 start_after_index = index
     else:
         for index, value in enumerate(dictionaries_list):
-            if not isinstance(value, dict):
+            if not is_row(value):
                 raise TypeError('One or more values in dictionaries_list are not a dictionary.')
-            if start_after_key not in value or secondary_start_after_key not in value:
+            if not row_has_key(value, start_after_key) or not row_has_key(value, secondary_start_after_key):
                 raise TypeError('One or more dictionary in dictionaries_list do not contain the provided key(s).')
-            if start_after_index is None and value[start_after_key] == start_after_value\
-                    and value[secondary_start_after_key] == secondary_start_after_value:
+            if start_after_index is None and row_value(value, start_after_key) == start_after_value\
+                    and row_value(value, secondary_start_after_key) == secondary_start_after_value:
                 start_after_index = index
 
     if start_after_index is None:
@@ -250,6 +493,62 @@ def paginate(dictionaries_list, required_size, start_after_key, start_after_valu
     return dictionaries_list[start_after_index + 1: start_after_index + 1 + required_size]
 
 
+def paginate_stream(dictionaries, required_size, start_after_key, start_after_value,
+                    secondary_start_after_key=None, secondary_start_after_value=None):
+    """
+        Same as `paginate`, but takes any iterable of dictionaries (or named tuples), such as the rows yielded by
+        `DatabaseManager.execute_query_stream`, and stops reading it as soon as the page is complete,
+        so the rows after the page are never fetched. Should be called inside a try block, may raise TypeError.
+
+
+        *Parameters:*
+            - *dictionaries*: The iterable of dictionaries to be sliced. It is closed when the page is complete.
+            - *required_size (int)*: The size of the required list.
+            - *start_after_key (int)*: The dictionary key to be checked for `start_after_value`.
+            - *start_after_value (int)*: The value that the new list will start after.
+
+
+        *Returns:*
+            - *List of Dictionaries*: A new list starting at the required element with the required size (or less).
+            - | *Raises TypeError*: If the passed dictionaries is not an iterable of dictionaries,
+              | or a dictionary does not contain a key that matches the given key.
+            - None: If the element to start at does not exist.
+    """
+    if isinstance(dictionaries, (dict, str)):
+        raise TypeError('dictionaries parameter passed was not an iterable of dictionaries.')
+    try:
+        iterator = iter(dictionaries)
+    except TypeError:
+        raise TypeError('dictionaries parameter passed was not an iterable of dictionaries.')
+
+    page = []
+    started = start_after_value is None
+    try:
+        for value in iterator:
+            if len(page) >= required_size:
+                break
+            if not is_row(value):
+                raise TypeError('One or more values in dictionaries are not a dictionary.')
+            if started:
+                page.append(value)
+                continue
+            if not row_has_key(value, start_after_key) or (secondary_start_after_key is not None and
+                                                           not row_has_key(value, secondary_start_after_key)):
+                raise TypeError('One or more dictionary in dictionaries do not contain the provided key(s).')
+            started = row_value(value, start_after_key) == start_after_value and \
+                (secondary_start_after_key is None or
+                 row_value(value, secondary_start_after_key) == secondary_start_after_value)
+    finally:
+        # Stop streaming rows that are not needed
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+    if not started:
+        return None
+    return page
+
+
 def get_replies_and_mentions_unseen_count(authorized_username):
     """
     Gets the count of the unseen replies and mentions of the authorized user.
@@ -274,91 +573,239 @@ def set_replies_and_mentions_as_seen(authorized_username):
     return query_factory.set_replies_and_mentions_as_seen(authorized_username)
 
 
+def row_sort_key(row, sort_key):
+    """
+        Gets the key of a timeline row, the values of the columns the timeline is sorted by.
+
+
+        *Parameters:*
+            - *row*: The row (a dictionary or a named tuple).
+            - *sort_key (list)*: The (column, type) pairs forming the key, such as `KWEEKS_SORT_KEY`.
+
+        *Returns:*
+            - *Tuple*: The key of the row. Missing strings (such as the rekweeker of a kweek) are empty strings.
+    """
+    key = []
+    for column, column_type in sort_key:
+        value = row_value(row, column)
+        if value is None and column_type is str:
+            value = ''
+        key.append(value)
+    return tuple(key)
+
+
+def encode_cursor(key):
+    """
+        Encodes the key of the last retrieved row into an opaque cursor token.
+
+
+        *Parameters:*
+            - *key (tuple)*: The key of the row, as returned by `row_sort_key`.
+
+        *Returns:*
+            - *string*: The cursor token.
+    """
+    values = []
+    for value in key:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        values.append(value)
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, sort_key):
+    """
+        Decodes a cursor token produced by `encode_cursor` back into the key of a row.
+
+
+        *Parameters:*
+            - *cursor (string)*: The cursor token.
+            - *sort_key (list)*: The (column, type) pairs forming the key, such as `KWEEKS_SORT_KEY`.
+
+        *Returns:*
+            - *Tuple*: The key of the row.
+            - *Raise ValueError*: if the cursor is not a valid cursor of this kind of timeline.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor.')
+    if not isinstance(values, list) or len(values) != len(sort_key):
+        raise ValueError('Invalid cursor.')
+    key = []
+    for value, (column, column_type) in zip(values, sort_key):
+        try:
+            if column_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif column_type is Decimal:
+                value = Decimal(value)
+                if not value.is_finite():
+                    raise ValueError('Invalid cursor.')
+            elif not isinstance(value, column_type) or isinstance(value, bool):
+                raise ValueError('Invalid cursor.')
+        except (ArithmeticError, TypeError):
+            raise ValueError('Invalid cursor.')
+        key.append(value)
+    return tuple(key)
+
+
 def get_kweeks(authorized_username, last_retrieved_kweek_id, db_kweeks_fetcher, args=None,
-               pagination_secondary_key=None, pagination_secondary_value=None):
+               last_retrieved_rekweeker_username=None, cursor=None, sort_key=KWEEKS_SORT_KEY):
     """
-        Gets kweeks fetched by a function and builds them into models.Kweek objects.
+        Gets a page of kweeks fetched by a function and builds them into models.Kweek objects.
+        The page is selected in the database by the key of the last retrieved kweek, which is either decoded
+        from the cursor or looked up from the last retrieved kweek id (and rekweeker).
 
 
         *Parameters:*
             - *authorized_username (string)*: The username of the authorized user.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
-            - *db_kweeks_fetcher (function)*: A function that fetches kweek dictionaries from the database.
+            - | *db_kweeks_fetcher (function)*: A function that fetches kweek rows from the database, taking
+              | the `after`, `limit` and `kweek_id` keyword arguments.
             - *args*: Positional arguments passed to db_kweeks_fetcher
+            - | *last_retrieved_rekweeker_username (string)*: The rekweeker of the last retrieved kweek,
+              | None if it was not a rekweek. Nullable.
+            - *cursor (string)*: The cursor of the page, takes precedence over the last retrieved kweek. Nullable.
+            - *sort_key (list)*: The key of the rows in this kind of timeline. Default: *KWEEKS_SORT_KEY*
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
-    if last_retrieved_kweek_id is not None:
-        try:
-            last_retrieved_kweek_id = int(last_retrieved_kweek_id)
-        except ValueError:
-            raise
-    # Get a list of kweeks with missing data
-    db_kweeks = db_kweeks_fetcher(*args)
-    # Paginate the results
-    try:
-        db_kweeks = paginate(dictionaries_list=db_kweeks, required_size=20,
-                             start_after_key='id', start_after_value=last_retrieved_kweek_id,
-                             secondary_start_after_key=pagination_secondary_key,
-                             secondary_start_after_value=pagination_secondary_value)
-    except TypeError as E:
-        print(E)
-        raise
-    if db_kweeks is None:
-        return None
-    return kweeks_builder(db_kweeks, authorized_username)
+    required_size = 20
+    if args is None:
+        args = []
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor, sort_key)
+    elif last_retrieved_kweek_id is not None:
+        last_retrieved_kweek_id = int(last_retrieved_kweek_id)
+        # Find the key of the last retrieved kweek in this timeline
+        db_kweeks = db_kweeks_fetcher(*args, kweek_id=last_retrieved_kweek_id)
+        if isinstance(db_kweeks, Exception):
+            raise TypeError(str(db_kweeks))
+        for db_kweek in db_kweeks:
+            if row_to_dict(db_kweek).get('rekweeker') == last_retrieved_rekweeker_username:
+                after = row_sort_key(db_kweek, sort_key)
+                break
+        if after is None:
+            return None
+    # One more kweek than required tells whether there is a next page
+    db_kweeks = db_kweeks_fetcher(*args, after=after, limit=required_size + 1)
+    if isinstance(db_kweeks, Exception):
+        raise TypeError(str(db_kweeks))
+    next_cursor = None
+    if len(db_kweeks) > required_size:
+        db_kweeks = db_kweeks[:required_size]
+        next_cursor = encode_cursor(row_sort_key(db_kweeks[-1], sort_key))
+    return KweeksPage(kweeks_builder(db_kweeks, authorized_username), next_cursor)
+
+
+def get_users(authorized_username, usernames):
+    """
+        Constructs the user objects of many users at once, with a single query.
+
+
+        *Parameters:*
+            - *authorized_username (string)*: The username of the authorized user.
+            - *usernames (iterable of strings)*: The usernames of the required users.
+
+        *Returns:*
+            - *Dictionary*: Maps each username that exists to its models.User object.
+              The friendship values are None for the authorized user, as in `get_friendship`.
+    """
+    users = {}
+    for database_user in query_factory.get_users_data(authorized_username, set(usernames)):
+        user = row_to_dict(database_user)
+        if user['username'] == authorized_username:
+            user.update({'following': None, 'follows_you': None, 'blocked': None, 'muted': None})
+        users[user['username']] = User(user)
+    return users
 
 
 def kweeks_builder(db_kweeks, authorized_username):
     """
         Builds model.Kweek objects from database kweeks dictionaries.
+        The missing data of the whole page is fetched with a fixed number of queries whatever its size:
+        the authors and rekweekers, the statistics and reply info, the mentions and the hashtags.
 
 
         *Parameters:*
-            - *db_kweeks (list of dictionaries)*: The kweeks fetched from the database.
+            - *db_kweeks (list of dictionaries or named tuples)*: The kweeks fetched from the database.
             - *authorized_username (string)*: The username of the authorized user.
-            - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - | *List of models.Kweek objects*: The kweeks that were deleted, or whose author or rekweeker
+              | was deleted, after they were fetched are left out.
         """
+    db_kweeks = [row_to_dict(kweek) for kweek in db_kweeks]
+    if not db_kweeks:
+        return []
+    kweek_ids = [kweek['id'] for kweek in db_kweeks]
+    rekweekers = [kweek['rekweeker'] for kweek in db_kweeks if kweek.get('is_rekweek')]
+    users = get_users(authorized_username, [kweek['username'] for kweek in db_kweeks] + rekweekers)
+    statistics = {database_statistics.id: database_statistics for database_statistics in
+                  query_factory.get_kweeks_statistics(authorized_username, kweek_ids)}
+    mentions = {kweek_id: [] for kweek_id in kweek_ids}
+    for database_mention in query_factory.get_kweeks_mentions(kweek_ids):
+        mentions[database_mention.kweek_id].append(Mention({
+            'username': database_mention.username,
+            'indices': [database_mention.starting_index, database_mention.ending_index]
+        }))
+    hashtags = {kweek_id: [] for kweek_id in kweek_ids}
+    for database_hashtag in query_factory.get_kweeks_hashtags(kweek_ids):
+        hashtags[database_hashtag.kweek_id].append(Hashtag({
+            'id': database_hashtag.hashtag_id,
+            'indices': [database_hashtag.starting_index, database_hashtag.ending_index],
+            'text': database_hashtag.text
+        }))
+
     kweeks = []
     for kweek in db_kweeks:
+        is_rekweek = kweek.get('is_rekweek')
+        kweek_statistics = statistics.get(kweek['id'])
+        # The kweek or the users were deleted since the page was fetched
+        if kweek_statistics is None or kweek['username'] not in users or \
+                (is_rekweek and kweek['rekweeker'] not in users):
+            continue
         # Add the user
-        kweek['user'] = get_user(authorized_username=authorized_username,
-                                 required_username=kweek['username'])
+        kweek['user'] = users[kweek['username']]
         # Add the statistics
-        kweek_statistics = get_kweek_statistics(authorized_username=authorized_username,
-                                                kweek_id=kweek['id'])
-        kweek.update(kweek_statistics)
+        kweek['number_of_likes'] = kweek_statistics.number_of_likes
+        kweek['number_of_rekweeks'] = kweek_statistics.number_of_rekweeks
+        kweek['number_of_replies'] = kweek_statistics.number_of_replies
+        kweek['liked_by_user'] = kweek_statistics.liked_by_user
+        kweek['rekweeked_by_user'] = kweek_statistics.rekweeked_by_user
         # Add mentions and hashtags
-        kweek['mentions'] = get_kweek_mentions(kweek['id'])
-        kweek['hashtags'] = get_kweek_hashtags(kweek['id'])
+        kweek['mentions'] = mentions[kweek['id']]
+        kweek['hashtags'] = hashtags[kweek['id']]
         # Add rekweek info
-        if 'is_rekweek' in kweek and kweek['is_rekweek']:
+        if is_rekweek:
             rekweeker_username = kweek['rekweeker']
-            rekweeker_name = query_factory.get_user_data(required_username=rekweeker_username)[0].get('screen_name')
             rekweek_info = RekweekInfo({
-                'rekweeker_name': rekweeker_name,
+                'rekweeker_name': users[rekweeker_username].screen_name,
                 'rekweeker_username': rekweeker_username
             })
             kweek['rekweek_info'] = rekweek_info
         else:
             kweek['rekweek_info'] = None
         # Add reply info
-        if kweek['reply_to']:
-            kweek['reply_info'] = get_reply_to_info(kweek['id'])
+        if kweek['reply_to'] and kweek_statistics.reply_to_kweek_id is not None:
+            kweek['reply_info'] = ReplyInfo({
+                'reply_to_username': kweek_statistics.reply_to_username,
+                'reply_to_kweek_id': kweek_statistics.reply_to_kweek_id
+            })
         else:
             kweek['reply_info'] = None
         kweeks.append(Kweek(kweek))
     return kweeks
 
 
-def get_home_kweeks(authorized_username, last_retrieved_kweek_id, last_retrieved_rekweeker_username):
+def get_home_kweeks(authorized_username, last_retrieved_kweek_id, last_retrieved_rekweeker_username, cursor=None):
     """
         Gets the kweeks that should appear on the authorized user's home timeline.
 
@@ -366,23 +813,340 @@ def get_home_kweeks(authorized_username, last_retrieved_kweek_id, last_retrieved
         *Parameters:*
             - *authorized_username (string)*: The username of the authorized user.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
     return get_kweeks(authorized_username=authorized_username,
                       last_retrieved_kweek_id=last_retrieved_kweek_id,
-                      pagination_secondary_key='rekweeker',
-                      pagination_secondary_value=last_retrieved_rekweeker_username,
-                      db_kweeks_fetcher=query_factory.get_home_kweeks,
+                      last_retrieved_rekweeker_username=last_retrieved_rekweeker_username,
+                      cursor=cursor,
+                      sort_key=REKWEEKS_SORT_KEY,
+                      db_kweeks_fetcher=get_home_kweeks_fetcher(),
                       args=[authorized_username])
 
 
+def get_home_kweeks_fetcher():
+    """
+        Gets the query that fetches the home timeline, depending on the configured home timeline engine.
+
+
+        *Returns:*
+            - *Function*: The home timeline fetcher of the query factory.
+    """
+    engine = app.config['HOME_TIMELINE_ENGINE']
+    if engine == 'materialized':
+        return query_factory.get_materialized_home_kweeks
+    if engine == 'merge':
+        return get_merged_home_kweeks
+    return query_factory.get_home_kweeks
+
+
+def get_merged_home_kweeks(authorized_username, after=None, limit=None, kweek_id=None):
+    """
+        Gets a page of the authorized user's home timeline by merging the cached latest kweeks and rekweeks of
+        the followed users, without muted users and rekweeks of muted and blocked users, then fetching the kweeks
+        of the page. The page is fetched by `query_factory.get_home_kweeks` instead if it goes deeper than the
+        cached entries of an author or a cached kweek or rekweek was deleted.
+        The kweeks returned are missing some data to construct kweek objects.
+
+
+        *Parameters:*
+            - *authorized_username (string)*: The username of the authorized user.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (sort_by, id, rekweeker or ''). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
+
+        *Returns:*
+            - *List of named tuples*: The same columns as `query_factory.get_home_kweeks`.
+            - *Exception* object: If a query produced an error.
+    """
+    if kweek_id is not None or limit is None:
+        return query_factory.get_home_kweeks(authorized_username, after, limit, kweek_id)
+    authors = query_factory.get_home_authors(authorized_username)
+    if isinstance(authors, Exception):
+        return authors
+    followed_usernames = [username for username, followed in authors if followed]
+    hidden_usernames = {username for username, followed in authors if not followed}
+    authors_entries = get_authors_latest_entries([authorized_username] + followed_usernames)
+    if isinstance(authors_entries, Exception):
+        return authors_entries
+
+    # The authors having more entries than the cached ones, the merge is exact down to the latest of their oldest
+    # cached entries
+    size = app.config['HOME_TIMELINE_AUTHOR_CACHE_SIZE']
+    horizon = None
+    buffers = []
+    for entries in authors_entries.values():
+        if len(entries) >= size:
+            horizon = entries[0][:3] if horizon is None else max(horizon, entries[0][:3])
+        end = len(entries) if after is None else bisect.bisect_left(entries, tuple(after))
+        buffers.append(reversed(entries[:end]))
+
+    page = []
+    for entry in heapq.merge(*buffers, reverse=True):
+        if horizon is not None and entry[:3] < horizon:
+            break
+        _, _, rekweeker, username = entry
+        if rekweeker and (rekweeker == authorized_username or username in hidden_usernames):
+            continue
+        page.append(entry)
+        if len(page) == limit:
+            break
+    if len(page) < limit and horizon is not None:
+        return query_factory.get_home_kweeks(authorized_username, after, limit)
+
+    kweeks = query_factory.get_home_kweeks_by_keys([(kweek_id, rekweeker or None)
+                                                    for _, kweek_id, rekweeker, _ in page])
+    if isinstance(kweeks, Exception):
+        return kweeks
+    if len(kweeks) != len(page):
+        forget_authors_latest_entries({rekweeker or username for _, _, rekweeker, username in page})
+        return query_factory.get_home_kweeks(authorized_username, after, limit)
+    return kweeks
+
+
+def get_authors_latest_entries(usernames):
+    """
+        Gets the latest kweeks and rekweeks of many users from the cache, loading the missing or expired ones
+        from the database in one query.
+
+
+        *Parameters:*
+            - *usernames (list)*: The usernames of the users.
+
+        *Returns:*
+            - | *Dictionary*: The entries of each user, sorted in ascending order, as tuples of
+              | (sort_by, id, rekweeker or '', username of the author of the kweek).
+            - *Exception* object: If the query produced an error.
+    """
+    global authors_latest_entries_generation
+    expires_before = time.monotonic() - app.config['HOME_TIMELINE_AUTHOR_CACHE_TTL']
+    authors_entries = {}
+    with authors_latest_entries_lock:
+        for username in usernames:
+            cached = authors_latest_entries.get(username)
+            if cached is not None and cached[0] >= expires_before:
+                authors_latest_entries.move_to_end(username)
+                authors_entries[username] = cached[1]
+        generation = authors_latest_entries_generation
+    missing_usernames = [username for username in usernames if username not in authors_entries]
+    if not missing_usernames:
+        return authors_entries
+
+    loaded_at = time.monotonic()
+    rows = query_factory.get_authors_latest_entries(missing_usernames, app.config['HOME_TIMELINE_AUTHOR_CACHE_SIZE'])
+    if isinstance(rows, Exception):
+        return rows
+    loaded_entries = {username: [] for username in missing_usernames}
+    for author, sort_by, kweek_id, rekweeker, username in rows:
+        loaded_entries[author].append((sort_by, kweek_id, rekweeker or '', username))
+    with authors_latest_entries_lock:
+        for username, entries in loaded_entries.items():
+            entries = tuple(sorted(entries))
+            authors_entries[username] = entries
+            # Entries loaded while some were dropped may miss the new kweeks, they are used once but not cached
+            if generation == authors_latest_entries_generation:
+                authors_latest_entries[username] = (loaded_at, entries)
+                authors_latest_entries.move_to_end(username)
+        while len(authors_latest_entries) > app.config['HOME_TIMELINE_AUTHOR_CACHE_AUTHORS']:
+            authors_latest_entries.popitem(last=False)
+    return authors_entries
+
+
+def forget_authors_latest_entries(usernames):
+    """
+        Drops the cached latest kweeks and rekweeks of users, after they created or rekweeked a kweek.
+
+
+        *Parameters:*
+            - *usernames (iterable)*: The usernames of the users.
+    """
+    global authors_latest_entries_generation
+    with authors_latest_entries_lock:
+        authors_latest_entries_generation += 1
+        for username in usernames:
+            authors_latest_entries.pop(username, None)
+
+
+def is_home_timeline_materialized():
+    """
+        Checks whether the home timelines are read from the materialized HOME_TIMELINE table, which then has
+        to be updated whenever a kweek is created or rekweeked and whenever a user follows, mutes or blocks another.
+
+
+        *Returns:*
+            - *True*: If the home timeline engine is 'materialized'.
+            - *False*: Otherwise.
+    """
+    return app.config['HOME_TIMELINE_ENGINE'] == 'materialized'
+
+
+def fan_out_kweek(kweek_id, username):
+    """
+        Adds a new kweek to the materialized home timelines of its author and their followers, and drops the
+        cached latest entries of the author.
+
+
+        *Parameters:*
+            - *kweek_id (int)*: The id of the kweek.
+            - *username (string)*: The username of the author of the kweek.
+
+        *Returns:*
+            - *None*: If the home timelines were updated or are not materialized.
+            - *Exception* object: If the query produced an error.
+    """
+    forget_authors_latest_entries([username])
+    if not is_home_timeline_materialized():
+        return None
+    return query_factory.fan_out_kweek(kweek_id)
+
+
+def fan_out_rekweek(kweek_id, rekweeker_username):
+    """
+        Adds a new rekweek to the materialized home timelines of the followers of the rekweeker, and drops the
+        cached latest entries of the rekweeker.
+
+
+        *Parameters:*
+            - *kweek_id (int)*: The id of the rekweeked kweek.
+            - *rekweeker_username (string)*: The username of the rekweeker.
+
+        *Returns:*
+            - *None*: If the home timelines were updated or are not materialized.
+            - *Exception* object: If the query produced an error.
+    """
+    forget_authors_latest_entries([rekweeker_username])
+    if not is_home_timeline_materialized():
+        return None
+    return query_factory.fan_out_rekweek(kweek_id, rekweeker_username)
+
+
+def add_to_home_timeline(owner, username):
+    """
+        Adds the latest kweeks and rekweeks of a followed user to the materialized home timeline of the follower,
+        keeping it within the configured cap.
+
+
+        *Parameters:*
+            - *owner (string)*: The username of the follower.
+            - *username (string)*: The username of the followed user.
+
+        *Returns:*
+            - *None*: If the home timeline was updated or is not materialized.
+            - *Exception* object: If a query produced an error.
+    """
+    if not is_home_timeline_materialized():
+        return None
+    cap = app.config['HOME_TIMELINE_CAP']
+    response = query_factory.backfill_home_timeline(owner, username, cap)
+    if response is not None:
+        return response
+    return query_factory.trim_home_timelines(cap, [owner])
+
+
+def remove_from_home_timeline(owner, username, rekweeked_kweeks=False):
+    """
+        Removes the kweeks and rekweeks of a user from the materialized home timeline of a user who unfollowed,
+        muted or blocked them.
+
+
+        *Parameters:*
+            - *owner (string)*: The username of the owner of the home timeline.
+            - *username (string)*: The username of the user whose kweeks and rekweeks are removed.
+            - | *rekweeked_kweeks (bool)*: Optional. Whether the kweeks of the user rekweeked by other users
+              | are removed as well, for mutes and blocks. Default: *False*
+
+        *Returns:*
+            - *None*: If the home timeline was updated or is not materialized.
+            - *Exception* object: If the query produced an error.
+    """
+    if not is_home_timeline_materialized():
+        return None
+    return query_factory.purge_home_timeline(owner, username, rekweeked_kweeks)
+
+
+def refresh_home_timeline(owner):
+    """
+        Rebuilds the materialized home timeline of a user who unmuted or unblocked another user.
+
+
+        *Parameters:*
+            - *owner (string)*: The username of the owner of the home timeline.
+
+        *Returns:*
+            - *None*: If the home timeline was rebuilt or is not materialized.
+            - *Exception* object: If a query produced an error.
+    """
+    if not is_home_timeline_materialized():
+        return None
+    return rebuild_home_timelines([owner])
+
+
+def rebuild_home_timelines(owners=None, batch_size=100, progress=None):
+    """
+        Rebuilds the materialized home timelines from the follows, kweeks and rekweeks, keeping the latest
+        entries up to the configured cap. Needed before switching to the materialized engine.
+
+
+        *Parameters:*
+            - *owners (list)*: Optional. The usernames of the owners of the home timelines. Default: *None* (all users)
+            - *batch_size (int)*: Optional. The number of home timelines rebuilt in each transaction. Default: *100*
+            - *progress (function)*: Optional. Called with the number of timelines rebuilt after each batch.
+
+        *Returns:*
+            - *None*: If the home timelines were rebuilt.
+            - *Exception* object: If a query produced an error.
+    """
+    cap = app.config['HOME_TIMELINE_CAP']
+    if owners is not None:
+        owners = list(owners)
+        batches = (owners[i:i + batch_size] for i in range(0, len(owners), batch_size))
+    else:
+        batches = get_username_batches(batch_size)
+    rebuilt = 0
+    for batch in batches:
+        if isinstance(batch, Exception):
+            return batch
+        response = query_factory.rebuild_home_timelines(batch, cap)
+        if response is not None:
+            return response
+        rebuilt += len(batch)
+        if progress is not None:
+            progress(rebuilt)
+    return None
+
+
+def get_username_batches(batch_size):
+    """
+        Iterates over the usernames of all the users in alphabetical order, a batch at a time.
+
+
+        *Parameters:*
+            - *batch_size (int)*: The number of usernames in each batch.
+
+        *Returns:*
+            - *Generator of lists of strings*: The batches, the last one is an *Exception* object if a query failed.
+    """
+    last_username = None
+    while True:
+        usernames = query_factory.get_usernames(last_username, batch_size)
+        if isinstance(usernames, Exception):
+            yield usernames
+            return
+        if not usernames:
+            return
+        yield usernames
+        last_username = usernames[-1]
+
+
 def get_profile_kweeks(authorized_username, required_username, last_retrieved_kweek_id,
-                       last_retrieved_rekweeker_username):
+                       last_retrieved_rekweeker_username, cursor=None):
     """
         Gets the kweeks that should appear on a specific user profile.
 
@@ -391,22 +1155,24 @@ def get_profile_kweeks(authorized_username, required_username, last_retrieved_kw
             - *authorized_username (string)*: The username of the authorized user.
             - *required_username (string)*: The username of the user whose profile kweeks are required.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
     return get_kweeks(authorized_username=authorized_username,
                       last_retrieved_kweek_id=last_retrieved_kweek_id,
-                      pagination_secondary_key='rekweeker',
-                      pagination_secondary_value=last_retrieved_rekweeker_username,
+                      last_retrieved_rekweeker_username=last_retrieved_rekweeker_username,
+                      cursor=cursor,
+                      sort_key=REKWEEKS_SORT_KEY,
                       db_kweeks_fetcher=query_factory.get_profile_kweeks,
                       args=[required_username])
 
 
-def get_replies_and_mentions_timeline_kweeks(authorized_username, last_retrieved_kweek_id):
+def get_replies_and_mentions_timeline_kweeks(authorized_username, last_retrieved_kweek_id, cursor=None):
     """
         Gets the kweeks that should appear on the authorized user's replies and mentions timeline.
 
@@ -414,20 +1180,47 @@ def get_replies_and_mentions_timeline_kweeks(authorized_username, last_retrieved
         *Parameters:*
             - *authorized_username (string)*: The username of the authorized user.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
     return get_kweeks(authorized_username=authorized_username,
                       last_retrieved_kweek_id=last_retrieved_kweek_id,
+                      cursor=cursor,
                       db_kweeks_fetcher=query_factory.get_replies_and_mentions_kweeks,
                       args=[authorized_username])
 
 
-def get_user_liked_kweeks(authorized_username, required_username, last_retrieved_kweek_id):
+def get_thread_kweeks(authorized_username, kweek_id, last_retrieved_kweek_id, cursor=None, depth=1):
+    """
+        Gets a page of the replies to a kweek, and of the replies to them down to a given depth, oldest first.
+
+
+        *Parameters:*
+            - *authorized_username (string)*: The username of the authorized user.
+            - *kweek_id (int)*: The id of the kweek whose replies are required.
+            - *last_retrieved_kweek_id (string)*: The id of the last retrieved reply (used to fetch more). Nullable.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
+            - *depth (int)*: The number of levels of replies returned, 1 for the direct replies. Default: *1*
+
+        *Returns:*
+            - *KweeksPage (list of models.Kweek objects)*
+            - *None*: if last_retrieved_kweek_id does not exist.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
+    """
+    return get_kweeks(authorized_username=authorized_username,
+                      last_retrieved_kweek_id=last_retrieved_kweek_id,
+                      cursor=cursor,
+                      db_kweeks_fetcher=query_factory.get_thread_kweeks,
+                      args=[kweek_id, depth])
+
+
+def get_user_liked_kweeks(authorized_username, required_username, last_retrieved_kweek_id, cursor=None):
     """
         Gets the kweeks that are liked by a user.
 
@@ -436,20 +1229,22 @@ def get_user_liked_kweeks(authorized_username, required_username, last_retrieved
             - *authorized_username (string)*: The username of the authorized user.
             - *required_username (string)*: The username of the user whose liked kweeks are required.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
     return get_kweeks(authorized_username=authorized_username,
                       last_retrieved_kweek_id=last_retrieved_kweek_id,
+                      cursor=cursor,
                       db_kweeks_fetcher=query_factory.get_user_liked_kweeks,
                       args=[required_username])
 
 
-def get_trend_kweeks(authorized_username, trend_id, last_retrieved_kweek_id):
+def get_trend_kweeks(authorized_username, trend_id, last_retrieved_kweek_id, cursor=None):
     """
         Gets the kweeks that belong to a trend.
 
@@ -458,20 +1253,22 @@ def get_trend_kweeks(authorized_username, trend_id, last_retrieved_kweek_id):
             - *authorized_username (string)*: The username of the authorized user.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
             - *trend_id (string)*: The id of the trend whose kweeks are to be fetched.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
     return get_kweeks(authorized_username=authorized_username,
                       last_retrieved_kweek_id=last_retrieved_kweek_id,
+                      cursor=cursor,
                       db_kweeks_fetcher=query_factory.get_trend_kweeks,
                       args=[trend_id])
 
 
-def get_search_kweeks(authorized_username, search_text, last_retrieved_kweek_id):
+def get_search_kweeks(authorized_username, search_text, last_retrieved_kweek_id, cursor=None):
     """
         Gets the kweeks that correspond to the search text, ordered by relevance.
 
@@ -480,19 +1277,76 @@ def get_search_kweeks(authorized_username, search_text, last_retrieved_kweek_id)
             - *authorized_username (string)*: The username of the authorized user.
             - *last_retrieved_kweek_id (string)*: The id of the last retrieved kweek (used to fetch more). Nullable.
             - *search_text (string)*: The text entered by the user in the search bar.
+            - *cursor (string)*: The cursor of the page (used to fetch more). Nullable.
 
         *Returns:*
-            - *List of models.Kweek objects*
+            - *KweeksPage (list of models.Kweek objects)*
             - *None*: if last_retrieved_kweek_id does not exist.
-            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number.
-            - *Raise TypeError*: if raised by paginate.
+            - *Raise ValueError*: if last_retrieved_kweek_id is not a valid number or the cursor is invalid.
+            - *Raise TypeError*: if the kweeks could not be fetched.
     """
     return get_kweeks(authorized_username=authorized_username,
                       last_retrieved_kweek_id=last_retrieved_kweek_id,
-                      db_kweeks_fetcher=query_factory.get_search_kweeks,
+                      cursor=cursor,
+                      sort_key=SEARCH_SORT_KEY,
+                      db_kweeks_fetcher=get_cached_search_kweeks,
                       args=[search_text, authorized_username])
 
 
+def get_cached_search_kweeks(search_text, authorized_username, after=None, limit=None, kweek_id=None):
+    """
+        Gets the kweeks that correspond to the search text like `query_factory.get_search_kweeks`, from the
+        cached keys of its results. The cached keys are dropped once a kweek containing one of the search terms
+        is created or deleted. The search query is run instead when the kweeks are past the cached ones.
+
+
+        *Parameters:*
+            - *search_text (string)*: The text to be searched for in the kweeks.
+            - *authorized_username (string)*: The username of the authorized user.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (rank, created_at, id). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
+
+        *Returns:*
+            - *List of named tuples*: The same rows as `query_factory.get_search_kweeks`.
+            - *Exception* object: If a query produced an error.
+    """
+    key = ' '.join(search_text.lower().split())
+    generation = query_factory.get_search_generation(search_text)
+    if isinstance(generation, Exception):
+        return generation
+    cached = search_kweeks_cache.get(key, generation)
+    if cached is None:
+        size = app.config['SEARCH_CACHE_RESULTS']
+        entries = query_factory.get_search_entries(search_text, size + 1)
+        if isinstance(entries, Exception):
+            return entries
+        cached = (entries[:size], len(entries) > size)
+        search_kweeks_cache.put(key, cached, generation)
+    entries, truncated = cached
+    blockers = query_factory.get_blockers(authorized_username)
+    if isinstance(blockers, Exception):
+        return blockers
+    blockers = {blocker for blocker, in blockers}
+    if after is not None:
+        after = tuple(after)
+    keys = []
+    for rank, created_at, entry_kweek_id, username in entries:
+        if username in blockers or (kweek_id is not None and entry_kweek_id != kweek_id):
+            continue
+        if after is not None and (rank, created_at, entry_kweek_id) >= after:
+            continue
+        keys.append((rank, entry_kweek_id))
+        if len(keys) == limit:
+            break
+    if truncated and (limit is None or len(keys) < limit):
+        return query_factory.get_search_kweeks(search_text, authorized_username, after, limit, kweek_id)
+    if not keys:
+        return []
+    return query_factory.get_search_kweeks_by_keys(keys)
+
+
 def check_blocked(blocker_username, blocked_username):
     """
         Checks if a user blocks another one.
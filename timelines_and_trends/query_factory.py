@@ -2,27 +2,79 @@ import database_manager
 
 db_manager = database_manager.db_manager
 
+# The columns each kind of timeline is sorted by in descending order, together they are unique for each row
+KWEEKS_SORT_COLUMNS = ['CREATED_AT', 'ID']
+REKWEEKS_SORT_COLUMNS = ['SORT_BY', 'ID', "COALESCE(REKWEEKER, '')"]
+# The rank is a NUMERIC rather than a REAL so that it compares equal to itself after a round trip through a cursor
+SEARCH_SORT_COLUMNS = ['RANK', 'CREATED_AT', 'ID']
 
-def get_profile_kweeks(username):
+
+def get_timeline_page(query, data, sort_columns, after=None, limit=None, kweek_id=None, ascending=False):
+    """
+        Gets a page of a timeline using keyset pagination: the rows sorted after the key of the last retrieved
+        row are filtered and limited by the database, so every page costs the same however deep it is.
+
+
+        *Parameters:*
+            - *query*: The timeline query, whose results have an *id* column and the sort columns.
+            - *data*: The parameters of the timeline query.
+            - | *sort_columns (list)*: The expressions the timeline is sorted by, in descending order unless
+              | *ascending*. Together they must be unique for each row, they form the key of the row.
+            - *after (tuple)*: Optional. The key of the last retrieved row. Default: *None* (the first page)
+            - *limit (int)*: Optional. The maximum number of rows returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the rows with this id are returned. Default: *None*
+            - *ascending (bool)*: Optional. Whether the timeline is sorted in ascending order. Default: *False*
+
+        *Returns:*
+            - *List of named tuples*: The rows of the page.
+            - *Exception* object: If the query produced an error or the key does not match the sort columns.
+    """
+    query = 'SELECT * FROM (' + query + ') AS TIMELINE'
+    data = list(data)
+    comparison, order = ('>', ' ASC') if ascending else ('<', ' DESC')
+    conditions = []
+    if kweek_id is not None:
+        conditions.append('ID = %s')
+        data.append(kweek_id)
+    if after is not None:
+        if len(after) != len(sort_columns):
+            return ValueError('The key must have %d values.' % len(sort_columns))
+        conditions.append('(' + ', '.join(sort_columns) + ') ' + comparison + ' (' +
+                          ', '.join(['%s'] * len(after)) + ')')
+        data.extend(after)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY ' + ', '.join(column + order for column in sort_columns) + ' LIMIT %s'
+    data.append(limit)
+    return db_manager.execute_query(query, data, row_format='namedtuple')
+
+
+def get_profile_kweeks(username, after=None, limit=None, kweek_id=None):
     """
         Gets the kweeks that should appear on a specific user profile.
         The kweeks returned are missing some data to construct kweek objects.
 
         *Parameters:*
             - *username*: The username of the user whose profile kweeks are required.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (sort_by, id, rekweeker or ''). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
 
         *Returns:*
-            - *List of dictionaries*: {
+            - *List of named tuples*: {
                                         | *id (int)*: The id of the kweek.,
                                         | *created_at (datetime)*: The date and time at which the kweek was created.,
                                         | *text (string)*: The main content of the kweek.,
                                         | *media_url (string)*: The url of the image attached with the kweek, if any.,
                                         | *username (string)*: The username of the author of the kweek.,
                                         | *reply_to (int)*: The id of the kweek which this kweek is a reply to, if any.
-                                        | *is_rekweek (bool)*: Whether the user rekweeked the kweek or created it.}
+                                        | *is_rekweek (bool)*: Whether the user rekweeked the kweek or created it.,
+                                        | *rekweeker (string)*: The username of the rekweeker (None if not a rekweek).,
+                                        | *sort_by (datetime)*: The time the kweek was created or rekweeked at.}
     """
     query = """
-                SELECT ID, CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO, IS_REKWEEK, REKWEEKER FROM
+                SELECT ID, CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO, IS_REKWEEK, REKWEEKER, SORT_BY FROM
                 (
                 (SELECT TRUE as IS_REKWEEK, K.ID, K.CREATED_AT, K.TEXT, K.MEDIA_URL, K.USERNAME, K.REPLY_TO, 
                         RK.CREATED_AT AS SORT_BY, %s AS REKWEEKER 
@@ -32,35 +84,38 @@ def get_profile_kweeks(username):
                 UNION
                 (SELECT FALSE as IS_REKWEEK, *, CREATED_AT AS SORT_BY, NULL AS REKWEEKER FROM KWEEK 
                 WHERE USERNAME = %s)) AS KWEEKS
-                ORDER BY SORT_BY DESC
             """
 
     data = (username, username, username)
-    profile_kweeks = db_manager.execute_query(query, data)
-    return profile_kweeks
+    return get_timeline_page(query, data, REKWEEKS_SORT_COLUMNS, after, limit, kweek_id)
 
 
-def get_home_kweeks(authorized_username):
+def get_home_kweeks(authorized_username, after=None, limit=None, kweek_id=None):
     """
         Gets the kweeks that should appear on the authorized user's home timeline.
         The kweeks returned are missing some data to construct kweek objects.
 
         *Parameters:*
             - *authorized_username (string)*: The username of the authorized user.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (sort_by, id, rekweeker or ''). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
 
         *Returns:*
-            - *List of dictionaries*: {
+            - *List of named tuples*: {
                                         | *id (int)*: The id of the kweek.,
                                         | *created_at (datetime)*: The date and time at which the kweek was created.,
                                         | *text (string)*: The main content of the kweek.,
                                         | *media_url (string)*: The url of the image attached with the kweek, if any.,
                                         | *username (string)*: The username of the author of the kweek.,
                                         | *reply_to (int)*: The id of the kweek which this kweek is a reply to, if any.
-                                        | *is_rekweek (bool)*: Whether the kweek is on the user's home as a rekweek.
-                                        | *rekweeker (string)*: The username of the rekweeker (None if not a rekweek)}.
+                                        | *is_rekweek (bool)*: Whether the kweek is on the user's home as a rekweek.,
+                                        | *rekweeker (string)*: The username of the rekweeker (None if not a rekweek).,
+                                        | *sort_by (datetime)*: The time the kweek was created or rekweeked at.}
     """
     query = """
-            SELECT ID, CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO, IS_REKWEEK, REKWEEKER FROM
+            SELECT ID, CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO, IS_REKWEEK, REKWEEKER, SORT_BY FROM
             ((SELECT *, FALSE AS IS_REKWEEK, NULL AS REKWEEKER, CREATED_AT AS SORT_BY FROM KWEEK WHERE 
                 USERNAME = %s OR USERNAME IN 
                 (SELECT FOLLOWED_USERNAME FROM FOLLOW WHERE FOLLOWER_USERNAME = %s AND
@@ -76,25 +131,318 @@ def get_home_kweeks(authorized_username):
              ((SELECT MUTED_USERNAME FROM MUTE WHERE MUTER_USERNAME = %s)
              UNION (SELECT BLOCKED_USERNAME FROM BLOCK WHERE BLOCKER_USERNAME = %s))
              )) AS KWEEKS
-            ORDER BY SORT_BY DESC
             """
     data = (authorized_username, authorized_username, authorized_username,
             authorized_username, authorized_username, authorized_username,
             authorized_username)
-    home_kweeks = db_manager.execute_query(query, data)
-    return home_kweeks
+    return get_timeline_page(query, data, REKWEEKS_SORT_COLUMNS, after, limit, kweek_id)
+
+
+def get_materialized_home_kweeks(authorized_username, after=None, limit=None, kweek_id=None):
+    """
+        Gets the kweeks that should appear on the authorized user's home timeline from the materialized home timeline,
+        which is filled when the kweeks are created. A page is a single range scan of the owner's entries.
+        The kweeks returned are missing some data to construct kweek objects.
+
+        *Parameters:*
+            - *authorized_username (string)*: The username of the authorized user.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (sort_by, id, rekweeker or ''). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
+
+        *Returns:*
+            - *List of named tuples*: The same columns as `get_home_kweeks`.
+    """
+    query = """
+                SELECT H.KWEEK_ID AS ID, K.CREATED_AT, K.TEXT, K.MEDIA_URL, K.USERNAME, K.REPLY_TO,
+                       H.REKWEEKER IS NOT NULL AS IS_REKWEEK, H.REKWEEKER, H.SORT_BY
+                FROM HOME_TIMELINE H
+                JOIN KWEEK K ON K.ID = H.KWEEK_ID
+                WHERE H.OWNER = %s
+            """
+    data = (authorized_username,)
+    return get_timeline_page(query, data, REKWEEKS_SORT_COLUMNS, after, limit, kweek_id)
+
+
+def get_home_authors(authorized_username):
+    """
+        Gets the users whose kweeks and rekweeks appear on the authorized user's home timeline, and the users
+        whose kweeks are hidden from it when rekweeked.
+
+
+        *Parameters:*
+            - *authorized_username (string)*: The username of the authorized user.
+
+        *Returns:*
+            - | *List of tuples*: (username, followed), *followed* is True for the followed users that are not muted
+              | and False for the muted and blocked users.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT FOLLOWED_USERNAME, TRUE FROM FOLLOW WHERE FOLLOWER_USERNAME = %s AND
+                FOLLOWED_USERNAME NOT IN (SELECT MUTED_USERNAME FROM MUTE WHERE MUTER_USERNAME = %s)
+                UNION ALL
+                SELECT MUTED_USERNAME, FALSE FROM MUTE WHERE MUTER_USERNAME = %s
+                UNION ALL
+                SELECT BLOCKED_USERNAME, FALSE FROM BLOCK WHERE BLOCKER_USERNAME = %s
+            """
+    data = (authorized_username, authorized_username, authorized_username, authorized_username)
+    return db_manager.execute_query(query, data, row_format='tuple')
+
+
+def get_authors_latest_entries(usernames, size):
+    """
+        Gets the latest kweeks and rekweeks of many users in one query, as they are sorted on home timelines.
+
+
+        *Parameters:*
+            - *usernames (list)*: The usernames of the users.
+            - *size (int)*: The maximum number of entries returned per user.
+
+        *Returns:*
+            - | *List of tuples*: (author, sort_by, id, rekweeker, username), *author* is the user who created or
+              | rekweeked the kweek, *rekweeker* is None for kweeks and *username* is the author of the kweek.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT A.AUTHOR, E.SORT_BY, E.ID, E.REKWEEKER, E.USERNAME
+                FROM UNNEST(%s::VARCHAR[]) AS A(AUTHOR),
+                LATERAL (SELECT * FROM (
+                    (SELECT CREATED_AT AS SORT_BY, ID, NULL::VARCHAR AS REKWEEKER, USERNAME FROM KWEEK
+                     WHERE USERNAME = A.AUTHOR
+                     ORDER BY CREATED_AT DESC, ID DESC LIMIT %s)
+                    UNION ALL
+                    (SELECT R.CREATED_AT, R.KWEEK_ID, R.USERNAME, K.USERNAME FROM REKWEEK R
+                     JOIN KWEEK K ON K.ID = R.KWEEK_ID
+                     WHERE R.USERNAME = A.AUTHOR
+                     ORDER BY R.CREATED_AT DESC, R.KWEEK_ID DESC LIMIT %s)) AS ENTRIES
+                    ORDER BY SORT_BY DESC, ID DESC, COALESCE(REKWEEKER, '') DESC LIMIT %s
+                ) AS E
+            """
+    data = (list(usernames), size, size, size)
+    return db_manager.execute_query(query, data, row_format='tuple')
+
+
+def get_home_kweeks_by_keys(keys):
+    """
+        Gets the home timeline rows of kweeks and rekweeks in the given order, skipping the deleted ones.
+        The kweeks returned are missing some data to construct kweek objects.
+
+
+        *Parameters:*
+            - *keys (list)*: The (id, rekweeker) pairs of the entries, *rekweeker* is None for kweeks.
+
+        *Returns:*
+            - *List of named tuples*: The same columns as `get_home_kweeks`.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT K.ID, K.CREATED_AT, K.TEXT, K.MEDIA_URL, K.USERNAME, K.REPLY_TO,
+                       E.REKWEEKER IS NOT NULL AS IS_REKWEEK, E.REKWEEKER,
+                       COALESCE(R.CREATED_AT, K.CREATED_AT) AS SORT_BY
+                FROM UNNEST(%s::INT[], %s::VARCHAR[]) WITH ORDINALITY AS E(ID, REKWEEKER, POSITION)
+                JOIN KWEEK K ON K.ID = E.ID
+                LEFT JOIN REKWEEK R ON R.KWEEK_ID = E.ID AND R.USERNAME = E.REKWEEKER
+                WHERE E.REKWEEKER IS NULL OR R.USERNAME IS NOT NULL
+                ORDER BY E.POSITION
+            """
+    data = ([kweek_id for kweek_id, _ in keys], [rekweeker for _, rekweeker in keys])
+    return db_manager.execute_query(query, data, row_format='namedtuple')
+
+
+def fan_out_kweek(kweek_id):
+    """
+        Adds a new kweek to the materialized home timelines of its author and the followers of its author.
+
+
+        *Parameters:*
+            - *kweek_id (int)*: The id of the kweek.
+
+        *Returns:*
+            - *None*: If the query was executed successfully.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                INSERT INTO HOME_TIMELINE (OWNER, KWEEK_ID, REKWEEKER, SORT_BY)
+                SELECT OWNER, KWEEK_ID, REKWEEKER, SORT_BY FROM HOME_TIMELINE_SOURCE
+                WHERE KWEEK_ID = %s AND REKWEEKER IS NULL
+                ON CONFLICT DO NOTHING
+            """
+    data = (kweek_id,)
+    return db_manager.execute_query_no_return(query, data)
+
+
+def fan_out_rekweek(kweek_id, rekweeker_username):
+    """
+        Adds a new rekweek to the materialized home timelines of the followers of the rekweeker.
+
+
+        *Parameters:*
+            - *kweek_id (int)*: The id of the rekweeked kweek.
+            - *rekweeker_username (string)*: The username of the rekweeker.
+
+        *Returns:*
+            - *None*: If the query was executed successfully.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                INSERT INTO HOME_TIMELINE (OWNER, KWEEK_ID, REKWEEKER, SORT_BY)
+                SELECT OWNER, KWEEK_ID, REKWEEKER, SORT_BY FROM HOME_TIMELINE_SOURCE
+                WHERE KWEEK_ID = %s AND REKWEEKER = %s
+                ON CONFLICT DO NOTHING
+            """
+    data = (kweek_id, rekweeker_username)
+    return db_manager.execute_query_no_return(query, data)
+
+
+def backfill_home_timeline(owner, username, cap):
+    """
+        Adds the latest kweeks and rekweeks of a user to the materialized home timeline of another user,
+        after the owner of the timeline has followed the user.
 
 
-def get_user_liked_kweeks(username):
+        *Parameters:*
+            - *owner (string)*: The username of the owner of the home timeline.
+            - *username (string)*: The username of the user whose kweeks and rekweeks are added.
+            - *cap (int)*: The maximum number of entries added.
+
+        *Returns:*
+            - *None*: If the query was executed successfully.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                INSERT INTO HOME_TIMELINE (OWNER, KWEEK_ID, REKWEEKER, SORT_BY)
+                SELECT OWNER, KWEEK_ID, REKWEEKER, SORT_BY FROM HOME_TIMELINE_SOURCE
+                WHERE OWNER = %s AND SOURCE = %s
+                ORDER BY SORT_BY DESC
+                LIMIT %s
+                ON CONFLICT DO NOTHING
+            """
+    data = (owner, username, cap)
+    return db_manager.execute_query_no_return(query, data)
+
+
+def purge_home_timeline(owner, username, rekweeked_kweeks=False):
+    """
+        Removes the kweeks and rekweeks of a user from the materialized home timeline of another user,
+        after the owner of the timeline has unfollowed, muted or blocked the user.
+
+
+        *Parameters:*
+            - *owner (string)*: The username of the owner of the home timeline.
+            - *username (string)*: The username of the user whose kweeks and rekweeks are removed.
+            - | *rekweeked_kweeks (bool)*: Optional. Whether the kweeks of the user rekweeked by other users
+              | are removed as well. Default: *False*
+
+        *Returns:*
+            - *None*: If the query was executed successfully.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                DELETE FROM HOME_TIMELINE H USING KWEEK K
+                WHERE H.OWNER = %s AND K.ID = H.KWEEK_ID
+                AND (H.REKWEEKER = %s OR K.USERNAME = %s AND (H.REKWEEKER IS NULL OR %s))
+            """
+    data = (owner, username, username, rekweeked_kweeks)
+    return db_manager.execute_query_no_return(query, data)
+
+
+def rebuild_home_timelines(owners, cap):
+    """
+        Rebuilds the materialized home timelines of many users from their follows, kweeks and rekweeks.
+
+
+        *Parameters:*
+            - *owners (list)*: The usernames of the owners of the home timelines.
+            - *cap (int)*: The maximum number of entries kept in each home timeline.
+
+        *Returns:*
+            - *None*: If the queries were executed successfully.
+            - *Exception* object: If a query produced an error.
+    """
+    with db_manager.transaction():
+        query = """DELETE FROM HOME_TIMELINE WHERE OWNER = ANY(%s)"""
+        response = db_manager.execute_query_no_return(query, (list(owners),))
+        if response is not None:
+            return response
+        query = """
+                    INSERT INTO HOME_TIMELINE (OWNER, KWEEK_ID, REKWEEKER, SORT_BY)
+                    SELECT OWNER, KWEEK_ID, REKWEEKER, SORT_BY FROM
+                    (SELECT *, ROW_NUMBER() OVER (PARTITION BY OWNER ORDER BY SORT_BY DESC, KWEEK_ID DESC,
+                                                  COALESCE(REKWEEKER, '') DESC) AS POSITION
+                     FROM (SELECT DISTINCT * FROM HOME_TIMELINE_SOURCE WHERE OWNER = ANY(%s)) AS SOURCE) AS ENTRIES
+                    WHERE POSITION <= %s
+                """
+        return db_manager.execute_query_no_return(query, (list(owners), cap))
+
+
+def trim_home_timelines(cap, owners=None):
+    """
+        Removes the oldest entries of the materialized home timelines that have more entries than the cap.
+
+
+        *Parameters:*
+            - *cap (int)*: The maximum number of entries kept in each home timeline.
+            - *owners (list)*: Optional. The usernames of the owners of the trimmed timelines. Default: *None* (all)
+
+        *Returns:*
+            - *None*: If the query was executed successfully.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                DELETE FROM HOME_TIMELINE H USING
+                (SELECT OWNER, KWEEK_ID, REKWEEKER, ROW_NUMBER() OVER (PARTITION BY OWNER ORDER BY SORT_BY DESC,
+                        KWEEK_ID DESC, COALESCE(REKWEEKER, '') DESC) AS POSITION
+                 FROM HOME_TIMELINE WHERE %s IS NULL OR OWNER = ANY(%s)) AS ENTRIES
+                WHERE ENTRIES.POSITION > %s AND H.OWNER = ENTRIES.OWNER AND H.KWEEK_ID = ENTRIES.KWEEK_ID
+                AND COALESCE(H.REKWEEKER, '') = COALESCE(ENTRIES.REKWEEKER, '')
+            """
+    owners = list(owners) if owners is not None else None
+    data = (owners, owners, cap)
+    return db_manager.execute_query_no_return(query, data)
+
+
+def get_usernames(after=None, limit=None):
+    """
+        Gets the usernames of the users in alphabetical order, a page at a time.
+
+
+        *Parameters:*
+            - *after (string)*: Optional. Only the usernames after this one are returned. Default: *None*
+            - *limit (int)*: Optional. The maximum number of usernames returned. Default: *None* (all of them)
+
+        *Returns:*
+            - *List of strings*: The usernames.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT USERNAME FROM USER_CREDENTIALS
+                WHERE %s IS NULL OR USERNAME > %s
+                ORDER BY USERNAME
+                LIMIT %s
+            """
+    data = (after, after, limit)
+    response = db_manager.execute_query(query, data, row_format='tuple')
+    if isinstance(response, Exception):
+        return response
+    return [row[0] for row in response]
+
+
+def get_user_liked_kweeks(username, after=None, limit=None, kweek_id=None):
     """
         Gets the kweeks that are liked by a user.
         The kweeks returned are missing some data to construct kweek objects.
 
         *Parameters:*
             - *username (string)*: The username whose liked kweeks are to be fetched.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (created_at, id). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
 
         *Returns:*
-            - *List of dictionaries*: {
+            - *List of named tuples*: {
                                         | *id (int)*: The id of the kweek.,
                                         | *created_at (datetime)*: The date and time at which the kweek was created.,
                                         | *text (string)*: The main content of the kweek.,
@@ -105,23 +453,62 @@ def get_user_liked_kweeks(username):
     query = """
             SELECT * FROM KWEEK WHERE ID IN 
                 (SELECT KWEEK_ID FROM FAVORITE WHERE USERNAME = %s)
-            ORDER BY CREATED_AT DESC
             """
     data = (username,)
-    liked_kweeks = db_manager.execute_query(query, data)
-    return liked_kweeks
+    return get_timeline_page(query, data, KWEEKS_SORT_COLUMNS, after, limit, kweek_id)
 
 
-def get_replies_and_mentions_kweeks(authorized_username):
+def get_thread_kweeks(root_id, depth=1, after=None, limit=None, kweek_id=None):
     """
-        Gets the kweeks that should appear on the authorized user's replies and mentions timeline.
+        Gets the replies to a kweek, and the replies to them down to a given depth, oldest first.
+        The kweeks returned are missing some data to construct kweek objects.
+
+        *Parameters:*
+            - *root_id (int)*: The id of the kweek whose replies are required.
+            - *depth (int)*: Optional. The number of levels of replies returned, 1 for the direct replies. Default: *1*
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (created_at, id). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
+
+        *Returns:*
+            - *List of named tuples*: The same columns as `get_replies_and_mentions_kweeks`.
+    """
+    if depth == 1:
+        # A range scan of the replies index, the key of the page is not pushed down into a recursive query
+        query = """
+                    SELECT * FROM KWEEK WHERE REPLY_TO = %s
+                """
+        data = (root_id,)
+    else:
+        query = """
+                    WITH RECURSIVE THREAD (ID, DEPTH) AS (
+                        SELECT ID, 1 FROM KWEEK WHERE REPLY_TO = %s
+                        UNION ALL
+                        SELECT K.ID, T.DEPTH + 1 FROM THREAD T JOIN KWEEK K ON K.REPLY_TO = T.ID WHERE T.DEPTH < %s
+                    )
+                    SELECT K.* FROM THREAD T JOIN KWEEK K ON K.ID = T.ID
+                """
+        data = (root_id, depth)
+    return get_timeline_page(query, data, KWEEKS_SORT_COLUMNS, after, limit, kweek_id, ascending=True)
+
+
+def get_replies_and_mentions_kweeks(authorized_username, after=None, limit=None, kweek_id=None):
+    """
+        Gets the kweeks that should appear on the authorized user's replies and mentions timeline from their inbox,
+        which is filled by triggers when the replies and mentions are created. A page is a single range scan of the
+        user's entries.
         The kweeks returned are missing some data to construct kweek objects.
 
         *Parameters:*
             - *authorized_username (string)*: The username of the authorized user.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (created_at, id). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
 
         *Returns:*
-            - *List of dictionaries*: {
+            - *List of named tuples*: {
                                         | *id (int)*: The id of the kweek.,
                                         | *created_at (datetime)*: The date and time at which the kweek was created.,
                                         | *text (string)*: The main content of the kweek.,
@@ -131,25 +518,19 @@ def get_replies_and_mentions_kweeks(authorized_username):
                                         }
     """
     query = """
-            SELECT * FROM
-                ((SELECT * FROM KWEEK K WHERE 
-                (SELECT USERNAME FROM KWEEK WHERE ID = K.REPLY_TO) = %s)
-                
-                UNION
-                
-                (SELECT K.* FROM KWEEK K JOIN MENTION M ON K.ID = M.KWEEK_ID
-                WHERE M.USERNAME = %s)) AS KWEEKS
-            WHERE USERNAME != %s
-            ORDER BY CREATED_AT DESC
+                SELECT I.KWEEK_ID AS ID, I.CREATED_AT, K.TEXT, K.MEDIA_URL, K.USERNAME, K.REPLY_TO
+                FROM REPLIES_AND_MENTIONS_INBOX I
+                JOIN KWEEK K ON K.ID = I.KWEEK_ID
+                WHERE I.RECIPIENT = %s
             """
-    data = (authorized_username, authorized_username, authorized_username)
-    replies_and_mentions_kweeks = db_manager.execute_query(query, data)
-    return replies_and_mentions_kweeks
+    data = (authorized_username,)
+    return get_timeline_page(query, data, KWEEKS_SORT_COLUMNS, after, limit, kweek_id)
 
 
 def get_replies_and_mentions_unseen_count(authorized_username):
     """
-        Gets the count of the unseen replies and mentions of the authorized user.
+        Gets the count of the unseen replies and mentions of the authorized user, kept in UNSEEN_COUNTERS
+        by triggers.
 
         *Parameters:*
             -*authorized_username (string)*: The username of the authorized user.
@@ -158,12 +539,13 @@ def get_replies_and_mentions_unseen_count(authorized_username):
             -*count (int)*: The number of unseen replies and mentions of the authorized user.
     """
     query = """
-                SELECT COUNT(*) FROM NOTIFICATION WHERE NOTIFIED_USERNAME = %s
-                AND IS_SEEN = FALSE AND (TYPE = 'MENTION' OR TYPE = 'REPLY')
+                SELECT REPLIES_AND_MENTIONS FROM UNSEEN_COUNTERS WHERE USERNAME = %s
             """
     data = (authorized_username,)
-    response = db_manager.execute_query(query, data)
-    return response[0].get('count')
+    response = db_manager.execute_query(query, data, prepared=True, row_format='tuple')
+    if not response:
+        return 0
+    return response[0][0]
 
 
 def set_replies_and_mentions_as_seen(authorized_username):
@@ -183,7 +565,8 @@ def set_replies_and_mentions_as_seen(authorized_username):
 
 def get_kweek_statistics(kweek_id, authorized_username):
     """
-        Gets the statistics of a kweek and the interactions of the authorized user with it.
+        Gets the statistics of a kweek, kept in KWEEK_COUNTERS by triggers, and the interactions of the authorized
+        user with it.
 
 
         *Parameters:*
@@ -199,61 +582,30 @@ def get_kweek_statistics(kweek_id, authorized_username):
                                 | *rekweeked_by_user (bool)*: Whether the kweek is rekweeked by the authorized user.
                                 | }
     """
-    kweek_statistics = {}
-    # Number of likes
     query = """
-                SELECT COUNT(*) FROM FAVORITE WHERE KWEEK_ID = %s
+                SELECT LIKES, REKWEEKS, REPLIES,
+                    EXISTS(SELECT 1 FROM FAVORITE WHERE KWEEK_ID = %s AND USERNAME = %s) AS LIKED_BY_USER,
+                    EXISTS(SELECT 1 FROM REKWEEK WHERE KWEEK_ID = %s AND USERNAME = %s) AS REKWEEKED_BY_USER
+                FROM KWEEK_COUNTERS WHERE KWEEK_ID = %s
             """
-    data = (kweek_id, )
-    response = db_manager.execute_query(query, data)
+    data = (kweek_id, authorized_username, kweek_id, authorized_username, kweek_id)
+    response = db_manager.execute_query(query, data, prepared=True, row_format='tuple')
     if not response:
-        kweek_statistics['number_of_likes'] = 0
-    else:
-        kweek_statistics['number_of_likes'] = response[0].get('count')
-
-    # Number of rekweeks
-    query = """
-                SELECT COUNT(*) FROM REKWEEK WHERE KWEEK_ID = %s
-            """
-    response = db_manager.execute_query(query, data)
-    if not response:
-        kweek_statistics['number_of_rekweeks'] = 0
-    else:
-        kweek_statistics['number_of_rekweeks'] = response[0].get('count')
-
-    # Number of replies
-    query = """
-                SELECT COUNT(*) FROM KWEEK WHERE REPLY_TO = %s 
-            """
-    response = db_manager.execute_query(query, data)
-    if not response:
-        kweek_statistics['number_of_replies'] = 0
-    else:
-        kweek_statistics['number_of_replies'] = response[0].get('count')
-
-    # Is liked by the authorized user
-    query = """
-                SELECT * FROM FAVORITE
-                WHERE KWEEK_ID = %s AND USERNAME = %s
-            """
-    data = (kweek_id, authorized_username)
-    if not db_manager.execute_query(query, data):
-        kweek_statistics['liked_by_user'] = False
-    else:
-        kweek_statistics['liked_by_user'] = True
-
-    # Is rekweeked by the authorized user
-    query = """
-                SELECT * FROM REKWEEK
-                WHERE KWEEK_ID = %s AND USERNAME = %s
-            """
-    data = (kweek_id, authorized_username)
-    if not db_manager.execute_query(query, data):
-        kweek_statistics['rekweeked_by_user'] = False
-    else:
-        kweek_statistics['rekweeked_by_user'] = True
-
-    return kweek_statistics
+        return {
+            'number_of_likes': 0,
+            'number_of_rekweeks': 0,
+            'number_of_replies': 0,
+            'liked_by_user': False,
+            'rekweeked_by_user': False
+        }
+    likes, rekweeks, replies, liked_by_user, rekweeked_by_user = response[0]
+    return {
+        'number_of_likes': likes,
+        'number_of_rekweeks': rekweeks,
+        'number_of_replies': replies,
+        'liked_by_user': liked_by_user,
+        'rekweeked_by_user': rekweeked_by_user
+    }
 
 
 def get_kweek_mentions(kweek_id):
@@ -274,6 +626,7 @@ def get_kweek_mentions(kweek_id):
     """
     query = """
                 SELECT * FROM MENTION WHERE KWEEK_ID = %s
+                ORDER BY STARTING_INDEX
             """
     data = (kweek_id,)
     mentions = db_manager.execute_query(query, data)
@@ -300,6 +653,7 @@ def get_kweek_hashtags(kweek_id):
                 SELECT *, TEXT FROM KWEEK_HASHTAG 
                 JOIN HASHTAG H ON H.ID = HASHTAG_ID
                 WHERE KWEEK_ID = %s
+                ORDER BY STARTING_INDEX
             """
     data = (kweek_id,)
     hashtags = db_manager.execute_query(query, data)
@@ -326,77 +680,44 @@ def get_user_data(required_username):
                 WHERE USERNAME = %s
             """
     data = (required_username, )
-    user = db_manager.execute_query(query, data)
+    user = db_manager.execute_query(query, data, prepared=True)
     return user
 
 
-def check_following(authorized_username, required_username):
+def get_friendships(authorized_username, usernames):
     """
-        Checks if the authorized user is following the required user.
+        Gets the friendship status of the authorized user and many users in one query.
 
 
         *Parameters:*
-            - *authorized_username*: The username of the authorized user.
-            - *required_username*: The username of the required user.
-
-        *Returns:*
-            - *True*: The authorized user follows the required user.
-            - *False*: Otherwise.
-    """
-    query = """
-                SELECT * FROM FOLLOW WHERE FOLLOWER_USERNAME = %s AND FOLLOWED_USERNAME = %s
-            """
-    data = (authorized_username, required_username)
-    if not db_manager.execute_query(query, data):
-        return False
-    else:
-        return True
-
-
-def check_follows_you(authorized_username, required_username):
-    """
-        Checks if the authorized user is followed by the required user.
-
-
-        *Parameters:*
-            - *authorized_username*: The username of the authorized user.
-            - *required_username*: The username of the required user.
-
-        *Returns:*
-            - *True*: The authorized user is followed by the required user.
-            - *False*: Otherwise.
-    """
-    query = """
-                SELECT * FROM FOLLOW WHERE FOLLOWER_USERNAME = %s AND FOLLOWED_USERNAME = %s
-            """
-    data = (required_username, authorized_username)
-    if not db_manager.execute_query(query, data):
-        return False
-    else:
-        return True
-
-
-def check_muted(authorized_username, required_username):
-    """
-        Checks if the authorized user is muting the required user.
-
-
-        *Parameters:*
-            - *authorized_username*: The username of the authorized user.
-            - *required_username*: The username of the required user.
+            - *authorized_username (string)*: The username of the authorized user.
+            - *usernames (list)*: The usernames of the required users.
 
         *Returns:*
-            - *True*: The authorized user is muting the required user.
-            - *False*: Otherwise.
+            - *List of tuples*: (username, following, follows_you, blocked, muted), one for each required username.
+            - *Exception* object: If the query produced an error.
     """
     query = """
-                SELECT * FROM MUTE WHERE MUTER_USERNAME = %s AND MUTED_USERNAME = %s
+                SELECT U.USERNAME, FOLLOWING.USERNAME IS NOT NULL, FOLLOWER.USERNAME IS NOT NULL,
+                       BLOCKED.USERNAME IS NOT NULL, MUTED.USERNAME IS NOT NULL
+                FROM UNNEST(%s::VARCHAR[]) AS U(USERNAME)
+                LEFT JOIN (SELECT FOLLOWED_USERNAME AS USERNAME FROM FOLLOW
+                           WHERE FOLLOWER_USERNAME = %s AND FOLLOWED_USERNAME = ANY(%s)) AS FOLLOWING
+                    ON FOLLOWING.USERNAME = U.USERNAME
+                LEFT JOIN (SELECT FOLLOWER_USERNAME AS USERNAME FROM FOLLOW
+                           WHERE FOLLOWED_USERNAME = %s AND FOLLOWER_USERNAME = ANY(%s)) AS FOLLOWER
+                    ON FOLLOWER.USERNAME = U.USERNAME
+                LEFT JOIN (SELECT BLOCKED_USERNAME AS USERNAME FROM BLOCK
+                           WHERE BLOCKER_USERNAME = %s AND BLOCKED_USERNAME = ANY(%s)) AS BLOCKED
+                    ON BLOCKED.USERNAME = U.USERNAME
+                LEFT JOIN (SELECT MUTED_USERNAME AS USERNAME FROM MUTE
+                           WHERE MUTER_USERNAME = %s AND MUTED_USERNAME = ANY(%s)) AS MUTED
+                    ON MUTED.USERNAME = U.USERNAME
             """
-    data = (authorized_username, required_username)
-    if not db_manager.execute_query(query, data):
-        return False
-    else:
-        return True
+    usernames = list(usernames)
+    data = (usernames, authorized_username, usernames, authorized_username, usernames,
+            authorized_username, usernames, authorized_username, usernames)
+    return db_manager.execute_query(query, data, prepared=True, row_format='tuple')
 
 
 def check_blocked(authorized_username, required_username):
@@ -416,7 +737,7 @@ def check_blocked(authorized_username, required_username):
                 SELECT * FROM BLOCK WHERE BLOCKER_USERNAME = %s AND BLOCKED_USERNAME = %s
             """
     data = (authorized_username, required_username)
-    if not db_manager.execute_query(query, data):
+    if not db_manager.execute_query(query, data, prepared=True, row_format='tuple'):
         return False
     else:
         return True
@@ -438,34 +759,50 @@ def is_user(username):
                 SELECT * FROM USER_CREDENTIALS WHERE USERNAME = %s
             """
     data = (username,)
-    if not db_manager.execute_query(query, data):
+    if not db_manager.execute_query(query, data, prepared=True, row_format='tuple'):
         return False
     else:
         return True
 
 
-def get_all_trends():
+def get_hashtag_buckets(now, since):
     """
-        Returns a list of all hashtags.
+        Gets the non-empty kweek counts of the hashtags in the buckets of a time window.
 
 
         *Parameters:*
-            - None.
+            - *now (datetime)*: The end of the window, in UTC. The ages of the buckets are measured from it.
+            - *since (datetime)*: The start of the window, in UTC.
 
         *Returns:*
-            - *List of dictionaries*: {
-                                | *id (int)*: The id of the hashtag.,
-                                | *text (string)*: The text of the hashtag,
-                                | *number_of_kweeks(int)*: The number of kweeks in a trend.
-                                | }
+            - *List of tuples*: (hashtag id, hashtag text, age of the bucket in seconds, number of kweeks).
     """
     query = """
-                SELECT ID, TEXT, COUNT(KWEEK_ID) AS NUMBER_OF_KWEEKS
-                FROM HASHTAG H JOIN KWEEK_HASHTAG KH ON H.ID = KH.HASHTAG_ID
-                GROUP BY ID, TEXT
-                ORDER BY NUMBER_OF_KWEEKS DESC
+                SELECT H.ID, H.TEXT, EXTRACT(EPOCH FROM %s - B.BUCKET)::FLOAT, B.KWEEKS
+                FROM HASHTAG_BUCKET B JOIN HASHTAG H ON H.ID = B.HASHTAG_ID
+                WHERE B.BUCKET > %s AND B.BUCKET <= %s AND B.KWEEKS > 0
             """
-    return db_manager.execute_query(query)
+    data = (now, since, now)
+    return db_manager.execute_query(query, data, prepared=True, row_format='tuple')
+
+
+def trim_hashtag_buckets(before):
+    """
+        Removes the hashtag buckets older than a given time, and the empty ones.
+
+
+        *Parameters:*
+            - *before (datetime)*: The buckets that start before this time (in UTC) are removed.
+
+        *Returns:*
+            - *None*: If the buckets were removed successfully.
+            - *Exception object*: If an exception occurred.
+    """
+    query = """
+                DELETE FROM HASHTAG_BUCKET WHERE BUCKET < %s OR KWEEKS = 0
+            """
+    data = (before,)
+    return db_manager.execute_query_no_return(query, data)
 
 
 def is_trend(trend_id):
@@ -491,16 +828,20 @@ def is_trend(trend_id):
         return True
 
 
-def get_trend_kweeks(trend_id):
+def get_trend_kweeks(trend_id, after=None, limit=None, kweek_id=None):
     """
         Gets the kweeks that belong to a trend.
         The kweeks returned are missing some data to construct kweek objects.
 
         *Parameters:*
             - *trend_id (int)*: The username whose liked kweeks are to be fetched.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (created_at, id). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
 
         *Returns:*
-            - *List of dictionaries*: {
+            - *List of named tuples*: {
                                         | *id (int)*: The id of the kweek.,
                                         | *created_at (datetime)*: The date and time at which the kweek was created.,
                                         | *text (string)*: The main content of the kweek.,
@@ -512,13 +853,12 @@ def get_trend_kweeks(trend_id):
     query = """
                 SELECT K.* FROM KWEEK K JOIN KWEEK_HASHTAG KH ON K.ID = KH.KWEEK_ID
                 WHERE HASHTAG_ID = %s
-                ORDER BY CREATED_AT DESC
             """
     data = (trend_id,)
-    return db_manager.execute_query(query, data)
+    return get_timeline_page(query, data, KWEEKS_SORT_COLUMNS, after, limit, kweek_id)
 
 
-def get_search_kweeks(search_text, authorized_username):
+def get_search_kweeks(search_text, authorized_username, after=None, limit=None, kweek_id=None):
     """
         Gets the kweeks that correspond to the search text, ordered by relevance.
         The kweeks returned are missing some data to construct kweek objects.
@@ -526,32 +866,132 @@ def get_search_kweeks(search_text, authorized_username):
         *Parameters:*
             - *search_text (string)*: The text to be searched for in the kweeks.
             - *authorized_username (string)*: The username of the authorized user.
+            - | *after (tuple)*: Optional. Only the kweeks sorted after this key are returned,
+              | as (rank, created_at, id). Default: *None*
+            - *limit (int)*: Optional. The maximum number of kweeks returned. Default: *None* (all of them)
+            - *kweek_id (int)*: Optional. Only the kweeks with this id are returned. Default: *None*
 
         *Returns:*
-            - *List of dictionaries*: {
+            - *List of named tuples*: {
                                         | *id (int)*: The id of the kweek.,
                                         | *created_at (datetime)*: The date and time at which the kweek was created.,
                                         | *text (string)*: The main content of the kweek.,
                                         | *media_url (string)*: The url of the image attached with the kweek, if any.,
                                         | *username (string)*: The username of the author of the kweek.,
-                                        | *reply_to (int)*: The id of the kweek which this kweek is a reply to, if any.
+                                        | *reply_to (int)*: The id of the kweek which this kweek is a reply to, if any.,
+                                        | *rank (Decimal)*: The relevance of the kweek to the search text.
                                       }
     """
 
     # Escape all whitespace characters and add & between words
     search_text = '&'.join(search_text.split())
     search_text = search_text.replace("\\", "").replace(r"'", r"\'")
+    # The matching kweeks are found through the GIN index on the tokens. OFFSET 0 keeps the query from being
+    # merged into the page query, which would rank every kweek again to compare it with the cursor
     query = """
-                SELECT K.*
-                FROM KWEEK K JOIN KWEEK_SEARCH_TOKENS KS ON K.ID = KS.KWEEK_ID
-                WHERE TS_RANK(TOKENS, TO_TSQUERY('english_nostop', %s)) > 0.00001
-                AND K.USERNAME NOT IN (SELECT BLOCKER_USERNAME FROM BLOCK WHERE BLOCKED_USERNAME= %s)
-                ORDER BY 
-                TS_RANK(TOKENS, TO_TSQUERY('english_nostop', %s)) DESC,
-                CREATED_AT DESC
+                SELECT K.*, TS_RANK(KS.TOKENS, Q.QUERY)::NUMERIC AS RANK
+                FROM TO_TSQUERY('english_nostop', %s) AS Q(QUERY)
+                JOIN KWEEK_SEARCH_TOKENS KS ON KS.TOKENS @@ Q.QUERY
+                JOIN KWEEK K ON K.ID = KS.KWEEK_ID
+                WHERE K.USERNAME NOT IN (SELECT BLOCKER_USERNAME FROM BLOCK WHERE BLOCKED_USERNAME= %s)
+                OFFSET 0
             """
-    data = (search_text, authorized_username, search_text)
-    return db_manager.execute_query(query, data)
+    data = (search_text, authorized_username)
+    return get_timeline_page(query, data, SEARCH_SORT_COLUMNS, after, limit, kweek_id)
+
+
+def get_search_generation(search_text):
+    """
+        Gets the generation of the results of a search text, which grows whenever a kweek containing one of
+        its terms is created or deleted.
+
+
+        *Parameters:*
+            - *search_text (string)*: The text to be searched for in the kweeks.
+
+        *Returns:*
+            - *int*: The generation of the search results.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT COALESCE(SUM(GENERATION), 0) FROM SEARCH_TERM_GENERATION
+                WHERE LEXEME = ANY(TSVECTOR_TO_ARRAY(TO_TSVECTOR('english_nostop', %s)))
+            """
+    data = (search_text,)
+    response = db_manager.execute_query(query, data, prepared=True, row_format='tuple')
+    if isinstance(response, Exception):
+        return response
+    return int(response[0][0])
+
+
+def get_search_entries(search_text, limit):
+    """
+        Gets the keys and authors of the kweeks that correspond to the search text, ordered by relevance,
+        whoever searches for them.
+
+
+        *Parameters:*
+            - *search_text (string)*: The text to be searched for in the kweeks.
+            - *limit (int)*: The maximum number of kweeks returned.
+
+        *Returns:*
+            - *List of tuples*: (rank, created_at, id, username), sorted as `get_search_kweeks`.
+            - *Exception* object: If the query produced an error.
+    """
+    search_text = '&'.join(search_text.split())
+    search_text = search_text.replace("\\", "").replace(r"'", r"\'")
+    query = """
+                SELECT TS_RANK(KS.TOKENS, Q.QUERY)::NUMERIC AS RANK, K.CREATED_AT, K.ID, K.USERNAME
+                FROM TO_TSQUERY('english_nostop', %s) AS Q(QUERY)
+                JOIN KWEEK_SEARCH_TOKENS KS ON KS.TOKENS @@ Q.QUERY
+                JOIN KWEEK K ON K.ID = KS.KWEEK_ID
+                ORDER BY RANK DESC, K.CREATED_AT DESC, K.ID DESC
+                LIMIT %s
+            """
+    data = (search_text, limit)
+    return db_manager.execute_query(query, data, row_format='tuple')
+
+
+def get_search_kweeks_by_keys(keys):
+    """
+        Gets the search result rows of kweeks in the given order, skipping the deleted ones.
+        The kweeks returned are missing some data to construct kweek objects.
+
+
+        *Parameters:*
+            - *keys (list)*: The (rank, id) pairs of the kweeks.
+
+        *Returns:*
+            - *List of named tuples*: The same columns as `get_search_kweeks`.
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT K.*, E.RANK
+                FROM UNNEST(%s::NUMERIC[], %s::INT[]) WITH ORDINALITY AS E(RANK, ID, POSITION)
+                JOIN KWEEK K ON K.ID = E.ID
+                ORDER BY E.POSITION
+            """
+    data = ([rank for rank, _ in keys], [kweek_id for _, kweek_id in keys])
+    return db_manager.execute_query(query, data, row_format='namedtuple')
+
+
+def get_blockers(username):
+    """
+        Gets the users who block a user.
+
+
+        *Parameters:*
+            - *username (string)*: The username of the blocked user.
+
+        *Returns:*
+            - *List of tuples*: (blocker username,)
+            - *Exception* object: If the query produced an error.
+    """
+    query = """
+                SELECT BLOCKER_USERNAME FROM BLOCK WHERE BLOCKED_USERNAME = %s
+            """
+    data = (username,)
+    return db_manager.execute_query(query, data, prepared=True, row_format='tuple')
 
 
 def get_reply_to_info(kweek_id):
@@ -574,3 +1014,131 @@ def get_reply_to_info(kweek_id):
             """
     data = (kweek_id,)
     return db_manager.execute_query(query, data)
+
+
+def get_users_data(authorized_username, usernames):
+    """
+        Gets the basic data of many users and their friendship status with the authorized user in one query.
+
+
+        *Parameters:*
+            - *authorized_username*: The username of the authorized user.
+            - *usernames (list)*: The usernames of the required users.
+
+        *Returns:*
+            - *List of named tuples*: {
+                                | *username (string)*: The username of the user.,
+                                | *screen_name (string)*: The screen name of the user.,
+                                | *profile_image_url (string)*: The url of the user's profile image.,
+                                | *following (bool)*: Is the authorized user following the user.,
+                                | *follows_you (bool)*: Is the user following the authorized user.,
+                                | *blocked (bool)*: Is the user blocked by the authorized user.,
+                                | *muted (bool)*: Is the user muted by the authorized user.
+                                | }
+    """
+    query = """
+                SELECT P.USERNAME, P.SCREEN_NAME, P.PROFILE_IMAGE_URL,
+                    EXISTS(SELECT 1 FROM FOLLOW WHERE FOLLOWER_USERNAME = %s AND FOLLOWED_USERNAME = P.USERNAME)
+                        AS FOLLOWING,
+                    EXISTS(SELECT 1 FROM FOLLOW WHERE FOLLOWER_USERNAME = P.USERNAME AND FOLLOWED_USERNAME = %s)
+                        AS FOLLOWS_YOU,
+                    EXISTS(SELECT 1 FROM BLOCK WHERE BLOCKER_USERNAME = %s AND BLOCKED_USERNAME = P.USERNAME)
+                        AS BLOCKED,
+                    EXISTS(SELECT 1 FROM MUTE WHERE MUTER_USERNAME = %s AND MUTED_USERNAME = P.USERNAME)
+                        AS MUTED
+                FROM PROFILE P
+                WHERE P.USERNAME = ANY(%s)
+            """
+    data = (authorized_username, authorized_username, authorized_username, authorized_username, list(usernames))
+    return db_manager.execute_query(query, data, row_format='namedtuple')
+
+
+def get_kweeks_statistics(authorized_username, kweek_ids):
+    """
+        Gets the statistics of many kweeks, the interactions of the authorized user with them
+        and the kweeks they reply to in one query.
+
+
+        *Parameters:*
+            - *authorized_username*: The username of the authorized user.
+            - *kweek_ids (list)*: The ids of the kweeks.
+
+        *Returns:*
+            - *List of named tuples*: {
+                                | *id (int)*: The id of the kweek.,
+                                | *number_of_likes (int)*: The number of likes of the kweek.,
+                                | *number_of_rekweeks (int)*: The number of rekweeks of the kweek.,
+                                | *number_of_replies (int)*: The number of replies of the kweek.,
+                                | *liked_by_user (bool)*: Whether the kweek is liked by the authorized user.,
+                                | *rekweeked_by_user (bool)*: Whether the kweek is rekweeked by the authorized user.,
+                                | *reply_to_kweek_id (int)*: The id of the kweek that is being replied to, if any.,
+                                | *reply_to_username (string)*: The username that is being replied to, if any.
+                                | }
+    """
+    query = """
+                SELECT K.ID,
+                    COALESCE(C.LIKES, 0) AS NUMBER_OF_LIKES,
+                    COALESCE(C.REKWEEKS, 0) AS NUMBER_OF_REKWEEKS,
+                    COALESCE(C.REPLIES, 0) AS NUMBER_OF_REPLIES,
+                    EXISTS(SELECT 1 FROM FAVORITE WHERE KWEEK_ID = K.ID AND USERNAME = %s) AS LIKED_BY_USER,
+                    EXISTS(SELECT 1 FROM REKWEEK WHERE KWEEK_ID = K.ID AND USERNAME = %s) AS REKWEEKED_BY_USER,
+                    R.ID AS REPLY_TO_KWEEK_ID, R.USERNAME AS REPLY_TO_USERNAME
+                FROM KWEEK K
+                LEFT JOIN KWEEK_COUNTERS C ON C.KWEEK_ID = K.ID
+                LEFT JOIN KWEEK R ON R.ID = K.REPLY_TO
+                WHERE K.ID = ANY(%s)
+            """
+    data = (authorized_username, authorized_username, list(kweek_ids))
+    return db_manager.execute_query(query, data, row_format='namedtuple')
+
+
+def get_kweeks_mentions(kweek_ids):
+    """
+        Gets the mentions in many kweeks in one query.
+
+
+        *Parameters:*
+            - *kweek_ids (list)*: The ids of the kweeks.
+
+        *Returns:*
+            - *List of named tuples*: {
+                                | *username (string)*: The username of the mentioned user.,
+                                | *starting_index (int)*: The starting index of the mention in the kweek.,
+                                | *ending_index (int)*: The ending index of the mention in the kweek.,
+                                | *kweek_id (int)*: The id of the kweek.
+                                | }, ordered by the kweek id and the starting index.
+    """
+    query = """
+                SELECT USERNAME, STARTING_INDEX, ENDING_INDEX, KWEEK_ID FROM MENTION
+                WHERE KWEEK_ID = ANY(%s)
+                ORDER BY KWEEK_ID, STARTING_INDEX
+            """
+    data = (list(kweek_ids),)
+    return db_manager.execute_query(query, data, row_format='namedtuple')
+
+
+def get_kweeks_hashtags(kweek_ids):
+    """
+        Gets the hashtags in many kweeks in one query.
+
+
+        *Parameters:*
+            - *kweek_ids (list)*: The ids of the kweeks.
+
+        *Returns:*
+            - *List of named tuples*: {
+                                | *hashtag_id (int)*: The id of the hashtag.,
+                                | *starting_index (int)*: The starting index of the hashtag in the kweek.,
+                                | *ending_index (int)*: The ending index of the hashtag in the kweek.,
+                                | *kweek_id (int)*: The id of the kweek.,
+                                | *text (string)*: The text of the hashtag.
+                                | }, ordered by the kweek id and the starting index.
+    """
+    query = """
+                SELECT KH.HASHTAG_ID, KH.STARTING_INDEX, KH.ENDING_INDEX, KH.KWEEK_ID, H.TEXT FROM KWEEK_HASHTAG KH
+                JOIN HASHTAG H ON H.ID = KH.HASHTAG_ID
+                WHERE KH.KWEEK_ID = ANY(%s)
+                ORDER BY KH.KWEEK_ID, KH.STARTING_INDEX
+            """
+    data = (list(kweek_ids),)
+    return db_manager.execute_query(query, data, row_format='namedtuple')
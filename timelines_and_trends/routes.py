@@ -12,11 +12,24 @@ timelines_api = api_namespaces.timelines_api
 kweeks_api = api_namespaces.kweeks_api
 
 
+def next_cursor_headers(kweeks):
+    """
+        Gets the response headers carrying the cursor of the next page of kweeks, if there is one.
+    """
+    if kweeks.next_cursor is None:
+        return {}
+    return {'Next-Cursor': kweeks.next_cursor}
+
+
 @timelines_api.route('/home')
 class HomeTimeline(Resource):
     @timelines_api.param(name='last_retrieved_kweek_id', type='str',
                          description="Nullable. Normally the request returns the first 20 kweeks when null."
                                      " To retrieve more send the id of the last kweek retrieved.")
+    @timelines_api.param(name='cursor', type='str',
+                         description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                     " of the previous page. Takes precedence over the last retrieved ids.")
+    @timelines_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @timelines_api.param(name='last_retrieved_rekweeker_username', type='str',
                          description="Nullable. The rekweeker username of the last retrieved kweek."
                                      "Used only when scrolling if the last retrieved kweek is a rekweek.")
@@ -31,16 +44,18 @@ class HomeTimeline(Resource):
     def get(self, authorized_username):
         """ Retrieves a list of kweeks in the home page of the authorized user. """
         last_retrieved_kweek_id = request.args.get('last_retrieved_kweek_id')
+        cursor = request.args.get('cursor')
         last_retrieved_rekweeker_username = request.args.get('last_retrieved_rekweeker_username')
         if last_retrieved_rekweeker_username and not actions.is_user(last_retrieved_rekweeker_username):
             abort(404, message='A user with this rekweeker username does not exist')
         try:
             kweeks = actions.get_home_kweeks(authorized_username=authorized_username,
                                              last_retrieved_kweek_id=last_retrieved_kweek_id,
-                                             last_retrieved_rekweeker_username=last_retrieved_rekweeker_username)
+                                             last_retrieved_rekweeker_username=last_retrieved_rekweeker_username,
+                                             cursor=cursor)
             if kweeks is None:
                 abort(404, message='A kweek with the provided ID does not exist.')
-            return kweeks, 200
+            return kweeks, 200, next_cursor_headers(kweeks)
         except TypeError:
             abort(500, message='An error occurred in the server.')
         except ValueError:
@@ -54,6 +69,10 @@ class ProfileTimeline(Resource):
     @timelines_api.param(name='last_retrieved_kweek_id', type='str',
                          description="Nullable. Normally the request returns the first 20 kweeks when null."
                                      "To retrieve more send the id of the last kweek retrieved.")
+    @timelines_api.param(name='cursor', type='str',
+                         description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                     " of the previous page. Takes precedence over the last retrieved ids.")
+    @timelines_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @timelines_api.param(name='last_retrieved_rekweeker_username', type='str',
                          description="Nullable. The rekweeker username of the last retrieved kweek."
                                      "Used only when scrolling if the last retrieved kweek is a rekweek.")
@@ -73,6 +92,7 @@ class ProfileTimeline(Resource):
         else:
             required_username = request.args.get('username')
             last_retrieved_kweek_id = request.args.get('last_retrieved_kweek_id')
+            cursor = request.args.get('cursor')
             last_retrieved_rekweeker_username = request.args.get('last_retrieved_rekweeker_username')
             if not actions.is_user(required_username):
                 abort(404, message='A user with this username does not exist.')
@@ -84,10 +104,11 @@ class ProfileTimeline(Resource):
                 kweeks = actions.get_profile_kweeks(authorized_username=authorized_username,
                                                     required_username=required_username,
                                                     last_retrieved_kweek_id=last_retrieved_kweek_id,
-                                                    last_retrieved_rekweeker_username=last_retrieved_rekweeker_username)
+                                                    last_retrieved_rekweeker_username=last_retrieved_rekweeker_username,
+                                                    cursor=cursor)
                 if kweeks is None:
                     abort(404, message='A kweek with the provided ID does not exist.')
-                return kweeks, 200
+                return kweeks, 200, next_cursor_headers(kweeks)
             except TypeError:
                 abort(500, message='An error occurred in the server.')
             except ValueError:
@@ -99,6 +120,10 @@ class RepliesAndMentionsTimeline(Resource):
     @timelines_api.param(name='last_retrieved_kweek_id', type='str',
                          description="Nullable. Normally the request returns the first 20 kweeks when null."
                                      "To retrieve more send the id of the last kweek retrieved.")
+    @timelines_api.param(name='cursor', type='str',
+                         description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                     " of the previous page. Takes precedence over the last retrieved ids.")
+    @timelines_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @timelines_api.response(code=200, description='Kweeks returned successfully.',
                             model=create_model('Replies and Mentions', model={
                                 'unseen_count': fields.Integer('The number of unseen replies and mentions.'),
@@ -117,9 +142,11 @@ class RepliesAndMentionsTimeline(Resource):
     def get(self, authorized_username):
         """ Retrieves a list of kweeks where the authorized user is mentioned. """
         last_retrieved_kweek_id = request.args.get('last_retrieved_kweek_id')
+        cursor = request.args.get('cursor')
         try:
             kweeks = actions.get_replies_and_mentions_timeline_kweeks(authorized_username=authorized_username,
-                                                                      last_retrieved_kweek_id=last_retrieved_kweek_id)
+                                                                      last_retrieved_kweek_id=last_retrieved_kweek_id,
+                                                                      cursor=cursor)
             if kweeks is None:
                 abort(404, message='A kweek with the provided ID does not exist.')
             else:
@@ -128,7 +155,7 @@ class RepliesAndMentionsTimeline(Resource):
                 return {
                     'unseen_count': unseen_count,
                     'replies_and_mentions': kweeks
-                }
+                }, 200, next_cursor_headers(kweeks)
         except TypeError:
             abort(500, message='An error occurred in the server.')
         except ValueError:
@@ -140,6 +167,10 @@ class UserLikedTweets(Resource):
     @kweeks_api.param(name='last_retrieved_kweek_id', type='str',
                       description="Nullable. Normally the request returns the first 20 kweeks when null."
                                   "To retrieve more send the id of the last kweek retrieved.")
+    @kweeks_api.param(name='cursor', type='str',
+                      description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                  " of the previous page. Takes precedence over the last retrieved ids.")
+    @kweeks_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @kweeks_api.param(name='username', type='str', required=True,
                       description="The username of the user whose liked kweeks are requested.")
     @kweeks_api.response(code=200, description='Kweeks returned successfully.', model=[Kweek.api_model])
@@ -157,15 +188,17 @@ class UserLikedTweets(Resource):
         else:
             required_username = request.args.get('username')
             last_retrieved_kweek_id = request.args.get('last_retrieved_kweek_id')
+            cursor = request.args.get('cursor')
             if not actions.is_user(required_username):
                 abort(404, message='A user with this username does not exist.')
             try:
                 kweeks = actions.get_user_liked_kweeks(authorized_username=authorized_username,
                                                        required_username=required_username,
-                                                       last_retrieved_kweek_id=last_retrieved_kweek_id)
+                                                       last_retrieved_kweek_id=last_retrieved_kweek_id,
+                                                       cursor=cursor)
                 if kweeks is None:
                     abort(404, message='A kweek with the provided ID does not exist.')
-                return kweeks, 200
+                return kweeks, 200, next_cursor_headers(kweeks)
             except TypeError:
                 abort(500, message='An error occurred in the server.')
             except ValueError:
@@ -179,6 +212,10 @@ class KweeksSearch(Resource):
     @search_api.param(name='last_retrieved_kweek_id', type='str',
                       description="Nullable. Normally the request returns the first 20 kweeks when null."
                                   "To retrieve more send the id of the last kweek retrieved.")
+    @search_api.param(name='cursor', type='str',
+                      description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                  " of the previous page. Takes precedence over the last retrieved ids.")
+    @search_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @search_api.response(code=200, description='Kweeks returned successfully.', model=[Kweek.api_model])
     @search_api.response(code=401, description='Unauthorized access.')
     @search_api.response(code=404, description='Kweek id does not exist.')
@@ -197,13 +234,15 @@ class KweeksSearch(Resource):
         else:
             search_text = request.args.get('search_text')
             last_retrieved_kweek_id = request.args.get('last_retrieved_kweek_id')
+            cursor = request.args.get('cursor')
             try:
                 kweeks = actions.get_search_kweeks(authorized_username=authorized_username,
                                                    search_text=search_text,
-                                                   last_retrieved_kweek_id=last_retrieved_kweek_id)
+                                                   last_retrieved_kweek_id=last_retrieved_kweek_id,
+                                                   cursor=cursor)
                 if kweeks is None:
                     abort(404, message='A kweek with the provided ID does not exist.')
-                return kweeks, 200
+                return kweeks, 200, next_cursor_headers(kweeks)
             except TypeError:
                 abort(500, message='An error occurred in the server.')
             except ValueError:
@@ -244,6 +283,10 @@ class TrendsKweeks(Resource):
     @trends_api.param(name='last_retrieved_kweek_id', type='str',
                       description="Nullable. Normally the request returns the first 20 kweeks when null."
                                   "To retrieve more send the id of the last kweek retrieved.")
+    @trends_api.param(name='cursor', type='str',
+                      description="Nullable. The cursor of the page to retrieve, sent in the Next-Cursor header"
+                                  " of the previous page. Takes precedence over the last retrieved ids.")
+    @trends_api.header('Next-Cursor', 'The cursor of the next page, missing on the last page.')
     @trends_api.response(code=200, description='Kweeks returned successfully.', model=[Kweek.api_model])
     @trends_api.response(code=401, description='Unauthorized access.')
     @trends_api.response(code=404, description='Trend id or kweek id does not exist.')
@@ -259,15 +302,17 @@ class TrendsKweeks(Resource):
         else:
             trend_id = request.args.get('trend_id')
             last_retrieved_kweek_id = request.args.get('last_retrieved_kweek_id')
+            cursor = request.args.get('cursor')
             if not actions.is_trend(trend_id):
                 abort(404, message='A trend with this id does not exist.')
             try:
                 kweeks = actions.get_trend_kweeks(authorized_username=authorized_username,
                                                   trend_id=trend_id,
-                                                  last_retrieved_kweek_id=last_retrieved_kweek_id)
+                                                  last_retrieved_kweek_id=last_retrieved_kweek_id,
+                                                  cursor=cursor)
                 if kweeks is None:
                     abort(404, message='A kweek with the provided ID does not exist.')
-                return kweeks, 200
+                return kweeks, 200, next_cursor_headers(kweeks)
             except TypeError:
                 abort(500, message='An error occurred in the server.')
             except ValueError:
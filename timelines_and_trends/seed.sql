@@ -41,23 +41,23 @@ INSERT INTO KWEEK(CREATED_AT, TEXT, USERNAME, REPLY_TO) VALUES
  (SELECT ID FROM KWEEK WHERE KWEEK.TEXT = 'Test user 1, third kweek'));
 
 INSERT INTO MENTION(KWEEK_ID, USERNAME, STARTING_INDEX, ENDING_INDEX) VALUES
-((SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' LIMIT 1), 'test_user1', 25, 35);
+((SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' ORDER BY ID LIMIT 1), 'test_user1', 25, 35);
 
 INSERT INTO HASHTAG(TEXT) VALUES ('trend'), ('trend2');
 
 INSERT INTO KWEEK_HASHTAG VALUES
-((SELECT ID FROM KWEEK WHERE USERNAME = 'test_user3' LIMIT 1),
+((SELECT ID FROM KWEEK WHERE USERNAME = 'test_user3' ORDER BY ID LIMIT 1),
 (SELECT ID FROM HASHTAG WHERE TEXT='trend' LIMIT 1), 25, 30),
-((SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' LIMIT 1),
+((SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' ORDER BY ID LIMIT 1),
 (SELECT ID FROM HASHTAG WHERE TEXT='trend' LIMIT 1), 37, 42);
 
 INSERT INTO FAVORITE VALUES
-('test_user3', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' LIMIT 1), '2011-01-01'),
-('test_user3', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' LIMIT 1), '2012-01-01');
+('test_user3', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' ORDER BY ID LIMIT 1), '2011-01-01'),
+('test_user3', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' ORDER BY ID LIMIT 1), '2012-01-01');
 
 INSERT INTO REKWEEK VALUES
-('test_user3', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' LIMIT 1), '2011-01-01'),
-('test_user1', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user3' LIMIT 1), '2013-02-01');
+('test_user3', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' ORDER BY ID LIMIT 1), '2011-01-01'),
+('test_user1', (SELECT ID FROM KWEEK WHERE USERNAME = 'test_user3' ORDER BY ID LIMIT 1), '2013-02-01');
 
 INSERT INTO NOTIFICATION(CREATED_AT, NOTIFIED_USERNAME, INVOLVED_USERNAME, INVOLVED_KWEEK_ID, TYPE, IS_SEEN) VALUES
 ('2011-01-01', 'test_user1', 'test_user2', (SELECT ID FROM KWEEK WHERE TEXT LIKE '%@test_user1%'), 'MENTION', TRUE),
@@ -1,8 +1,9 @@
 import pytest
 from . import actions
 from database_manager import db_manager
+from app import app, socketio
 from models import User, Mention, Hashtag, Kweek, RekweekInfo, Trend
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 @pytest.mark.parametrize("authorized_username, required_username, expected_output",
@@ -55,6 +56,25 @@ def test_get_friendship(authorized_username, required_username, expected_output)
     assert friendship == expected_output
 
 
+def test_get_friendship_prepared():
+    actions.get_friendship('test_user1', 'test_user2')
+    hits = db_manager.get_prepared_statistics()['hits']
+    # The friendship query reuses the statement prepared by the previous call
+    assert actions.get_friendship('test_user1', 'test_user2') == actions.get_friendship('test_user1', 'test_user2')
+    assert db_manager.get_prepared_statistics()['hits'] == hits + 2
+
+
+def test_get_friendships():
+    usernames = ['test_user1', 'test_user2', 'test_user3', 'no_such_user']
+    db_manager.start_request_instrumentation()
+    friendships = actions.get_friendships('test_user1', usernames)
+    assert db_manager.get_request_instrumentation()['queries'] == 1
+    assert friendships == {username: actions.get_friendship('test_user1', username) for username in usernames}
+    assert friendships['test_user1'] == {'following': None, 'follows_you': None, 'blocked': None, 'muted': None}
+    assert friendships['test_user3'] == {'following': True, 'follows_you': True, 'blocked': False, 'muted': False}
+    assert actions.get_friendships('test_user1', []) == {}
+
+
 @pytest.mark.parametrize("authorized_username, required_username, expected_output",
                          [
                              ('test_user1', 'test_user2', User({
@@ -75,7 +95,7 @@ def test_get_user(authorized_username, required_username, expected_output):
 
 
 def test_get_kweek_mentions():
-    query = " SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' LIMIT 1"
+    query = " SELECT ID FROM KWEEK WHERE USERNAME = 'test_user2' ORDER BY ID LIMIT 1"
     kweek_id = db_manager.execute_query(query)[0]['id']
     actual_mention = actions.get_kweek_mentions(kweek_id)[0]
     expected_mention = Mention({
@@ -85,14 +105,14 @@ def test_get_kweek_mentions():
     assert isinstance(actual_mention, Mention)
     assert actual_mention.to_json() == expected_mention.to_json()
 
-    query = "SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' LIMIT 1"
+    query = "SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' ORDER BY ID LIMIT 1"
     kweek_id = db_manager.execute_query(query)[0]['id']
     mentions = actions.get_kweek_mentions(kweek_id)
     assert mentions == []
 
 
 def test_get_kweek_hashtags():
-    query = " SELECT ID FROM KWEEK WHERE USERNAME = 'test_user3' LIMIT 1"
+    query = " SELECT ID FROM KWEEK WHERE USERNAME = 'test_user3' ORDER BY ID LIMIT 1"
     kweek_id = db_manager.execute_query(query)[0]['id']
     actual_hashtag = actions.get_kweek_hashtags(kweek_id)[0]
     query = "SELECT ID FROM HASHTAG WHERE TEXT='trend' LIMIT 1"
@@ -105,14 +125,14 @@ def test_get_kweek_hashtags():
     assert isinstance(expected_hashtag, Hashtag)
     assert actual_hashtag.to_json() == expected_hashtag.to_json()
 
-    query = "SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' LIMIT 1"
+    query = "SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' ORDER BY ID LIMIT 1"
     kweek_id = db_manager.execute_query(query)[0]['id']
     hashtags = actions.get_kweek_hashtags(kweek_id)
     assert hashtags == []
 
 
 def test_get_kweek_statistics():
-    query = "SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' LIMIT 1"
+    query = "SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' ORDER BY ID LIMIT 1"
     kweek_id = db_manager.execute_query(query)[0]['id']
 
     authorized_username = 'test_user3'
@@ -342,6 +362,74 @@ def test_paginate():
     assert exception_caught
 
 
+def test_paginate_stream():
+    consumed = []
+
+    def rows():
+        for index in range(1, 101):
+            consumed.append(index)
+            yield {'id': index, 'username': 'user' + str(index % 3)}
+
+    # Normal operation, stops reading once the page is complete
+    new_list = actions.paginate_stream(dictionaries=rows(), required_size=2, start_after_key='id',
+                                       start_after_value=2)
+    assert new_list == [{'id': 3, 'username': 'user0'}, {'id': 4, 'username': 'user1'}]
+    assert len(consumed) == 5
+
+    # Start after value is None
+    new_list = actions.paginate_stream(dictionaries=rows(), required_size=1, start_after_key='id',
+                                       start_after_value=None)
+    assert new_list == [{'id': 1, 'username': 'user1'}]
+
+    # With secondary key and value
+    new_list = actions.paginate_stream(dictionaries=rows(), required_size=1, start_after_key='id',
+                                       start_after_value=4, secondary_start_after_key='username',
+                                       secondary_start_after_value='user1')
+    assert new_list == [{'id': 5, 'username': 'user2'}]
+    new_list = actions.paginate_stream(dictionaries=rows(), required_size=1, start_after_key='id',
+                                       start_after_value=4, secondary_start_after_key='username',
+                                       secondary_start_after_value='user2')
+    assert new_list is None
+
+    # Empty list and ID does not exist
+    assert actions.paginate_stream(dictionaries=rows(), required_size=2, start_after_key='id',
+                                   start_after_value=100) == []
+    assert actions.paginate_stream(dictionaries=rows(), required_size=2, start_after_key='id',
+                                   start_after_value=101) is None
+
+    # Rows streamed from the database
+    database_rows = db_manager.execute_query_stream('SELECT GENERATE_SERIES(1, 100000) AS ID', batch_size=10)
+    new_list = actions.paginate_stream(dictionaries=database_rows, required_size=2, start_after_key='id',
+                                       start_after_value=10)
+    assert new_list == [{'id': 11}, {'id': 12}]
+
+    # Invalid input
+    for dictionaries, key in ((None, 'id'), ([1, 2, 3], 'id'), (rows(), 'no_id')):
+        with pytest.raises(TypeError):
+            actions.paginate_stream(dictionaries=dictionaries, required_size=2, start_after_key=key,
+                                    start_after_value=5)
+
+
+def test_paginate_named_tuples():
+    query = 'SELECT GENERATE_SERIES(1, 100) AS ID, \'user\' AS USERNAME'
+    rows = db_manager.execute_query(query, row_format='namedtuple')
+    new_list = actions.paginate(dictionaries_list=rows, required_size=2, start_after_key='id', start_after_value=10)
+    assert [row.id for row in new_list] == [11, 12]
+    new_list = actions.paginate(dictionaries_list=rows, required_size=2, start_after_key='id', start_after_value=10,
+                                secondary_start_after_key='username', secondary_start_after_value='user')
+    assert [row.id for row in new_list] == [11, 12]
+    new_list = actions.paginate_stream(dictionaries=db_manager.execute_query_stream(query, row_format='namedtuple'),
+                                       required_size=2, start_after_key='id', start_after_value=98)
+    assert [actions.row_to_dict(row) for row in new_list] == [{'id': 99, 'username': 'user'},
+                                                               {'id': 100, 'username': 'user'}]
+    with pytest.raises(TypeError):
+        actions.paginate(dictionaries_list=rows, required_size=2, start_after_key='no_id', start_after_value=10)
+    # Plain tuples have no column names to paginate by
+    with pytest.raises(TypeError):
+        actions.paginate(dictionaries_list=db_manager.execute_query(query, row_format='tuple'), required_size=2,
+                         start_after_key='id', start_after_value=10)
+
+
 def test_get_profile_kweeks():
     expected_kweeks = []
 
@@ -627,6 +715,40 @@ def test_get_home_kweeks():
     assert exception_caught
 
 
+def test_kweeks_builder_query_count():
+    db_kweeks = actions.query_factory.get_home_kweeks('test_user3')
+    assert len(db_kweeks) > 1
+    # The page is built with the same number of queries whatever its size
+    for page in (db_kweeks[:1], db_kweeks):
+        db_manager.start_request_instrumentation()
+        kweeks = actions.kweeks_builder(page, 'test_user3')
+        assert db_manager.get_request_instrumentation()['queries'] == 4
+        assert [kweek.id for kweek in kweeks] == [kweek.id for kweek in page]
+    assert actions.kweeks_builder([], 'test_user3') == []
+    users = actions.get_users('test_user1', ['test_user1', 'test_user2', 'test_user2', 'no_such_user'])
+    assert sorted(users) == ['test_user1', 'test_user2']
+    assert users['test_user1'].to_json() == actions.get_user('test_user1', 'test_user1').to_json()
+    assert users['test_user2'].to_json() == actions.get_user('test_user1', 'test_user2').to_json()
+
+
+def test_kweeks_builder_deleted_kweeks():
+    db_kweeks = actions.query_factory.get_home_kweeks('test_user3')
+    query = """
+                INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO)
+                VALUES (NOW(), 'deleted before it is built', NULL, 'test_user1', NULL) RETURNING *
+            """
+    deleted_kweek = db_manager.execute_query(query)[0]
+    assert db_manager.execute_query_no_return('DELETE FROM KWEEK WHERE ID = %s', (deleted_kweek['id'],)) is None
+    # A rekweek by a deleted user
+    rekweek = dict(actions.row_to_dict(db_kweeks[0]), is_rekweek=True, rekweeker='no_such_user')
+    page = [deleted_kweek] + list(db_kweeks) + [rekweek]
+    # The kweeks that are gone by the time the page is built are left out
+    kweeks = actions.kweeks_builder(page, 'test_user3')
+    assert [kweek.id for kweek in kweeks] == [kweek.id for kweek in db_kweeks]
+    assert [kweek.to_json() for kweek in kweeks] == \
+        [kweek.to_json() for kweek in actions.kweeks_builder(db_kweeks, 'test_user3')]
+
+
 def test_get_user_liked_kweeks():
     expected_kweeks = []
 
@@ -917,33 +1039,253 @@ def test_search_kweeks():
     assert actual_kweeks == []
 
 
-def test_get_all_trends():
-    expected_trends = []
+def test_search_kweeks_cache():
+    actions.search_kweeks_cache.clear()
+    results_size = app.config['SEARCH_CACHE_RESULTS']
+    try:
+        for size in (results_size, 2):
+            app.config['SEARCH_CACHE_RESULTS'] = size
+            # The cached results are shared by the users, test_user2 blocks test_user1 and is filtered out for them
+            for username in ('test_user1', 'test_user2', 'test_user3'):
+                all_kweeks = actions.query_factory.get_search_kweeks('Kweek', username)
+                assert actions.get_cached_search_kweeks('Kweek', username) == all_kweeks
+                for index, kweek in enumerate(all_kweeks):
+                    after = actions.row_sort_key(kweek, actions.SEARCH_SORT_KEY)
+                    assert actions.get_cached_search_kweeks('kweek', username, after=after, limit=2) == \
+                        all_kweeks[index + 1: index + 3]
+                    assert actions.get_cached_search_kweeks('kweek ', username, kweek_id=kweek.id) == [kweek]
+            actions.search_kweeks_cache.clear()
+
+        # A new kweek with a search term drops the cached results
+        assert actions.get_cached_search_kweeks('second', 'test_user1', limit=21)
+        kweek_id = db_manager.execute_query("""
+                    INSERT INTO KWEEK(CREATED_AT, TEXT, USERNAME, REPLY_TO) VALUES
+                    ('2019-01-01', 'Test user 1, second kweek again', 'test_user1', NULL)
+                    RETURNING ID
+                """)[0]['id']
+        kweeks = actions.get_cached_search_kweeks('second', 'test_user1', limit=21)
+        assert kweek_id in [kweek.id for kweek in kweeks]
+        db_manager.execute_query_no_return('DELETE FROM KWEEK WHERE ID = %s', (kweek_id,))
+        kweeks = actions.get_cached_search_kweeks('second', 'test_user1', limit=21)
+        assert kweek_id not in [kweek.id for kweek in kweeks]
+        assert kweeks == actions.query_factory.get_search_kweeks('second', 'test_user1', limit=21)
+    finally:
+        app.config['SEARCH_CACHE_RESULTS'] = results_size
+        actions.search_kweeks_cache.clear()
+
+
+def test_keyset_pagination():
+    trend_id = db_manager.execute_query("SELECT ID FROM HASHTAG WHERE TEXT = 'trend'")[0]['id']
+    timelines = [
+        (actions.query_factory.get_home_kweeks, ['test_user3'], actions.REKWEEKS_SORT_KEY),
+        (actions.query_factory.get_profile_kweeks, ['test_user1'], actions.REKWEEKS_SORT_KEY),
+        (actions.query_factory.get_replies_and_mentions_kweeks, ['test_user1'], actions.KWEEKS_SORT_KEY),
+        (actions.query_factory.get_user_liked_kweeks, ['test_user3'], actions.KWEEKS_SORT_KEY),
+        (actions.query_factory.get_trend_kweeks, [trend_id], actions.KWEEKS_SORT_KEY),
+        (actions.query_factory.get_search_kweeks, ['kweek', 'test_user1'], actions.SEARCH_SORT_KEY)
+    ]
+    for fetcher, args, sort_key in timelines:
+        all_kweeks = fetcher(*args)
+        assert len(all_kweeks) > 1
+        # Walking the timeline one kweek at a time through cursors gives the whole timeline
+        walked_kweeks = []
+        after = None
+        while True:
+            page = fetcher(*args, after=after, limit=1)
+            if not page:
+                break
+            walked_kweeks.append(page[0])
+            cursor = actions.encode_cursor(actions.row_sort_key(page[0], sort_key))
+            after = actions.decode_cursor(cursor, sort_key)
+        assert walked_kweeks == all_kweeks
+        assert fetcher(*args, kweek_id=all_kweeks[-1].id)[-1] == all_kweeks[-1]
+
+    # The next cursor continues where the last page stopped
+    first_page = actions.get_home_kweeks('test_user3', None, None)
+    assert first_page.next_cursor is None
+    all_kweeks = actions.query_factory.get_home_kweeks('test_user3')
+    cursor = actions.encode_cursor(actions.row_sort_key(all_kweeks[0], actions.REKWEEKS_SORT_KEY))
+    next_page = actions.get_home_kweeks('test_user3', None, None, cursor=cursor)
+    assert [kweek.to_json() for kweek in next_page] == [kweek.to_json() for kweek in first_page[1:]]
+    assert actions.get_home_kweeks('test_user3', '0', None) is None
+
+    # Invalid cursors
+    for cursor in ('invalid', actions.encode_cursor((1, 2)), actions.encode_cursor(('2019-01-01T00:00:00', 'id', '')),
+                   actions.encode_cursor(('not a date', 1, ''))):
+        with pytest.raises(ValueError):
+            actions.get_home_kweeks('test_user3', None, None, cursor=cursor)
+
+
+def test_replies_and_mentions_inbox():
+    former_query = """
+                SELECT * FROM
+                    ((SELECT * FROM KWEEK K WHERE (SELECT USERNAME FROM KWEEK WHERE ID = K.REPLY_TO) = %s)
+                    UNION
+                    (SELECT K.* FROM KWEEK K JOIN MENTION M ON K.ID = M.KWEEK_ID WHERE M.USERNAME = %s)) AS KWEEKS
+                WHERE USERNAME != %s
+                ORDER BY CREATED_AT DESC, ID DESC
+            """
+    usernames = [row['username'] for row in db_manager.execute_query('SELECT USERNAME FROM USER_CREDENTIALS')]
+
+    def assert_inboxes_match():
+        for username in usernames:
+            assert actions.query_factory.get_replies_and_mentions_kweeks(username) == \
+                db_manager.execute_query(former_query, (username,) * 3, row_format='namedtuple')
 
+    assert_inboxes_match()
+    # A reply mentioning the author of the replied to kweek is delivered once, a reply to oneself is not delivered
+    replied_to_id = db_manager.execute_query("SELECT ID FROM KWEEK WHERE USERNAME = 'test_user1' LIMIT 1")[0]['id']
     query = """
-                SELECT ID FROM HASHTAG WHERE TEXT = 'trend'
+                INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO) VALUES
+                ('2019-01-01', '@test_user1 @test_user3 inbox reply', NULL, 'test_user3', %s),
+                ('2019-01-02', '@test_user2 inbox self reply', NULL, 'test_user1', %s)
+                RETURNING ID
             """
-    trend_id = db_manager.execute_query(query)[0]['id']
-    expected_trends.append(Trend({
-        'id': trend_id,
-        'text': 'trend',
-        'number_of_kweeks': 2
-    }))
-
+    kweek_ids = [row['id'] for row in db_manager.execute_query(query, (replied_to_id, replied_to_id))]
     query = """
-                    SELECT ID FROM HASHTAG WHERE TEXT = 'trend2'
-                """
-    trend_id = db_manager.execute_query(query)[0]['id']
-    expected_trends.append(Trend({
-        'id': trend_id,
-        'text': 'trend2',
-        'number_of_kweeks': 0
-    }))
+                INSERT INTO MENTION (KWEEK_ID, USERNAME, STARTING_INDEX, ENDING_INDEX) VALUES
+                (%s, 'test_user1', 0, 10), (%s, 'test_user3', 12, 22), (%s, 'test_user2', 0, 10)
+            """
+    db_manager.execute_query_no_return(query, (kweek_ids[0], kweek_ids[0], kweek_ids[1]))
+    assert [kweek.id for kweek in actions.query_factory.get_replies_and_mentions_kweeks('test_user1')][:1] == \
+        kweek_ids[:1]
+    assert [kweek.id for kweek in actions.query_factory.get_replies_and_mentions_kweeks('test_user2')] == \
+        kweek_ids[1:]
+    assert actions.query_factory.get_replies_and_mentions_kweeks('test_user3', kweek_id=kweek_ids[0]) == []
+    assert_inboxes_match()
+
+    # Deleted kweeks leave the inboxes
+    db_manager.execute_query_no_return('DELETE FROM KWEEK WHERE ID IN %s', (tuple(kweek_ids),))
+    assert_inboxes_match()
+
+
+def test_materialized_home_timeline():
+    usernames = [row['username'] for row in db_manager.execute_query('SELECT USERNAME FROM USER_CREDENTIALS')]
+    assert actions.rebuild_home_timelines(batch_size=2) is None
+    # The materialized home timelines match the queried ones, page by page
+    for username in usernames:
+        all_kweeks = actions.query_factory.get_home_kweeks(username)
+        assert actions.query_factory.get_materialized_home_kweeks(username) == all_kweeks
+        if all_kweeks:
+            after = actions.row_sort_key(all_kweeks[0], actions.REKWEEKS_SORT_KEY)
+            assert actions.query_factory.get_materialized_home_kweeks(username, after=after, limit=2) == \
+                all_kweeks[1:3]
+
+    # Unfollowing and muting purge the user's entries, following backfills them
+    home_kweeks = actions.query_factory.get_home_kweeks('test_user3')
+    assert actions.query_factory.purge_home_timeline('test_user3', 'test_user1') is None
+    assert all(kweek.username != 'test_user1' or kweek.rekweeker is not None
+               for kweek in actions.query_factory.get_materialized_home_kweeks('test_user3'))
+    assert all(kweek.rekweeker != 'test_user1'
+               for kweek in actions.query_factory.get_materialized_home_kweeks('test_user3'))
+    assert actions.query_factory.backfill_home_timeline('test_user3', 'test_user1', 100) is None
+    assert actions.query_factory.get_materialized_home_kweeks('test_user3') == home_kweeks
+    assert actions.query_factory.purge_home_timeline('test_user3', 'test_user1', rekweeked_kweeks=True) is None
+    assert all(kweek.username != 'test_user1' and kweek.rekweeker != 'test_user1'
+               for kweek in actions.query_factory.get_materialized_home_kweeks('test_user3'))
+
+    # The timelines are trimmed to the cap, keeping the latest entries
+    assert actions.query_factory.trim_home_timelines(1, ['test_user1']) is None
+    assert actions.query_factory.get_materialized_home_kweeks('test_user1') == \
+        actions.query_factory.get_home_kweeks('test_user1')[:1]
+    assert actions.query_factory.trim_home_timelines(2) is None
+    for username in usernames:
+        assert len(actions.query_factory.get_materialized_home_kweeks(username)) <= 2
+
+    # The home timeline is read from the materialized timelines depending on the configured engine
+    assert actions.rebuild_home_timelines(['test_user1', 'test_user3']) is None
+    queried_page = actions.get_home_kweeks('test_user3', None, None)
+    app.config['HOME_TIMELINE_ENGINE'] = 'materialized'
+    try:
+        assert actions.get_home_kweeks_fetcher() == actions.query_factory.get_materialized_home_kweeks
+        materialized_page = actions.get_home_kweeks('test_user3', None, None)
+    finally:
+        app.config['HOME_TIMELINE_ENGINE'] = 'query'
+    assert [kweek.to_json() for kweek in materialized_page] == [kweek.to_json() for kweek in queried_page]
+
 
-    actual_trends = actions.get_all_trends(None)
+def test_merged_home_timeline():
+    usernames = [row['username'] for row in db_manager.execute_query('SELECT USERNAME FROM USER_CREDENTIALS')]
+    cache_size = app.config['HOME_TIMELINE_AUTHOR_CACHE_SIZE']
+    app.config['HOME_TIMELINE_ENGINE'] = 'merge'
+    try:
+        # Walking the merged timelines gives the queried ones, also when going deeper than the cached entries
+        for size in (1, 2, 50):
+            app.config['HOME_TIMELINE_AUTHOR_CACHE_SIZE'] = size
+            actions.forget_authors_latest_entries(usernames)
+            for username in usernames:
+                all_kweeks = actions.query_factory.get_home_kweeks(username)
+                for limit in (1, 3):
+                    walked_kweeks = []
+                    after = None
+                    while True:
+                        page = actions.get_merged_home_kweeks(username, after=after, limit=limit)
+                        walked_kweeks.extend(page)
+                        if len(page) < limit:
+                            break
+                        after = actions.row_sort_key(page[-1], actions.REKWEEKS_SORT_KEY)
+                    assert walked_kweeks == all_kweeks
+
+        # The cached entries of an author are dropped when they kweek, deleted rekweeks are noticed
+        assert actions.get_home_kweeks_fetcher() == actions.get_merged_home_kweeks
+        home_kweeks = actions.get_merged_home_kweeks('test_user3', limit=20)
+        assert any(kweek.rekweeker for kweek in home_kweeks)
+        query = """INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO)
+                   VALUES (NOW() AT TIME ZONE 'UTC', 'merged', NULL, 'test_user1', NULL) RETURNING ID"""
+        kweek_id = db_manager.execute_query(query)[0]['id']
+        actions.fan_out_kweek(kweek_id, 'test_user1')
+        assert actions.get_merged_home_kweeks('test_user3', limit=20)[0].id == kweek_id
+        rekweek = next(kweek for kweek in home_kweeks if kweek.rekweeker)
+        db_manager.execute_query_no_return('DELETE FROM REKWEEK WHERE KWEEK_ID = %s AND USERNAME = %s',
+                                           (rekweek.id, rekweek.rekweeker))
+        assert actions.get_merged_home_kweeks('test_user3', limit=20) == \
+            actions.query_factory.get_home_kweeks('test_user3', limit=20)
+        db_manager.execute_query_no_return('DELETE FROM KWEEK WHERE ID = %s', (kweek_id,))
+        db_manager.execute_query_no_return('INSERT INTO REKWEEK VALUES (%s, %s, %s)',
+                                           (rekweek.rekweeker, rekweek.id, rekweek.sort_by))
+    finally:
+        app.config['HOME_TIMELINE_ENGINE'] = 'query'
+        app.config['HOME_TIMELINE_AUTHOR_CACHE_SIZE'] = cache_size
+        actions.forget_authors_latest_entries(usernames)
 
-    for index, kweek in enumerate(actual_trends):
-        assert expected_trends[index].to_json() == kweek.to_json()
+
+def test_get_all_trends():
+    trend_id = db_manager.execute_query("SELECT ID FROM HASHTAG WHERE TEXT = 'trend'")[0]['id']
+    trend2_id = db_manager.execute_query("SELECT ID FROM HASHTAG WHERE TEXT = 'trend2'")[0]['id']
+    now = datetime.utcnow()
+    six_hours_ago = now - timedelta(hours=6)
+    kweek_ids = [row['id'] for row in db_manager.execute_query("""
+                INSERT INTO KWEEK(CREATED_AT, TEXT, USERNAME, REPLY_TO) VALUES
+                (%s, 'Recent #trend2', 'test_user1', NULL),
+                (%s, 'Recent #trend2 again', 'test_user1', NULL),
+                (%s, 'Recent #trend', 'test_user1', NULL)
+                RETURNING ID
+            """, (six_hours_ago, six_hours_ago, now))]
+    db_manager.execute_query_no_return("""
+                INSERT INTO KWEEK_HASHTAG VALUES (%s, %s, 7, 14), (%s, %s, 7, 14), (%s, %s, 7, 13)
+            """, (kweek_ids[0], trend2_id, kweek_ids[1], trend2_id, kweek_ids[2], trend_id))
+    try:
+        # The seeded kweeks are too old to trend, and the kweeks of six hours ago have decayed below the recent one
+        assert actions.refresh_trends(now) is None
+        expected_trends = [Trend({'id': trend_id, 'text': 'trend', 'number_of_kweeks': 1}),
+                           Trend({'id': trend2_id, 'text': 'trend2', 'number_of_kweeks': 2})]
+        actual_trends = actions.get_all_trends(None)
+        assert [trend.to_json() for trend in actual_trends] == [trend.to_json() for trend in expected_trends]
+        assert [trend.to_json() for trend in actions.get_all_trends(str(trend_id))] == [expected_trends[1].to_json()]
+        assert actions.get_all_trends('-1') is None
+        assert [trend['id'] for trend in actions.compute_trends(now - timedelta(hours=5))] == [trend2_id]
+        assert actions.compute_trends(now + timedelta(days=2)) == []
+
+        # Deleting a kweek uncounts its hashtags
+        db_manager.execute_query_no_return("DELETE FROM KWEEK WHERE ID = %s", (kweek_ids[0],))
+        trends = actions.compute_trends(now)
+        assert [(trend['id'], trend['number_of_kweeks']) for trend in trends] == [(trend_id, 1), (trend2_id, 1)]
+        db_manager.execute_query_no_return("DELETE FROM KWEEK_HASHTAG WHERE KWEEK_ID = %s", (kweek_ids[1],))
+        trends = actions.compute_trends(now)
+        assert [(trend['id'], trend['number_of_kweeks']) for trend in trends] == [(trend_id, 1)]
+    finally:
+        db_manager.execute_query_no_return("DELETE FROM KWEEK WHERE ID = ANY(%s)", (kweek_ids,))
+        actions.refresh_trends()
 
     # Invalid ID
     exception_caught = False
@@ -954,6 +1296,24 @@ def test_get_all_trends():
     assert exception_caught
 
 
+def test_refresh_trends_in_background():
+    assert actions.refresh_trends() is None
+    refreshed_at = actions.trends_snapshot[0]
+    refresh_interval = app.config['TRENDS_REFRESH_INTERVAL']
+    app.config['TRENDS_REFRESH_INTERVAL'] = 0
+    try:
+        # The stale snapshot is served while it is refreshed by a background task of the socket server
+        assert actions.get_trends_snapshot() == actions.trends_snapshot[1]
+        for _ in range(100):
+            if not actions.trends_refreshing:
+                break
+            socketio.sleep(0.05)
+        assert not actions.trends_refreshing
+        assert actions.trends_snapshot[0] > refreshed_at
+    finally:
+        app.config['TRENDS_REFRESH_INTERVAL'] = refresh_interval
+
+
 @pytest.mark.parametrize("blocker, blocked, expected_output",
                          [
                              ('test_user1', 'test_user1', False),
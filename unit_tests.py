@@ -1,10 +1,12 @@
+import os
 import pytest
 import app
 from database_manager import db_manager
 import click
 
 all_modules = ['timelines_and_trends', 'authentication_and_registration', 'notifications',
-               'direct_messages', 'users_profiles', 'kweeks', 'users_interactions', 'media']
+               'direct_messages', 'users_profiles', 'kweeks', 'users_interactions', 'media', 'instrumentation',
+               'database_manager']
 
 
 @click.command()
@@ -32,13 +34,18 @@ def cli(module, production):
 
     for module in modules:
         db_manager.execute_query_no_return('DELETE FROM USER_CREDENTIALS; DELETE FROM HASHTAG;')
-        response = db_manager.execute_query_no_return(open(module + '/seed.sql', 'r').read())
+        if os.path.isdir(module):
+            response = db_manager.execute_query_no_return(open(module + '/seed.sql', 'r').read())
+            test_file = module + '/test_actions.py'
+        else:
+            # Top level modules have no seed
+            response = None
+            test_file = 'test_' + module + '.py'
         if response is not None:
             print('Seed error:')
             print(response)
             raise SystemExit(10)
-        exit_code = pytest.main(['--cov-report', 'term-missing', '--cov=' + module,
-                                 module + '/test_actions.py'])
+        exit_code = pytest.main(['--cov-report', 'term-missing', '--cov=' + module, test_file])
         if exit_code != 0 and not failed:
             failed = True
             final_exit_code = exit_code
@@ -3,6 +3,7 @@ from models import UserProfile, User
 from timelines_and_trends import actions as timelines_and_trends_actions
 from users_profiles import query_factory as users_profile_query_factory
 from notifications import actions as notif_actions
+from database_manager import db_manager
 
 size = 20
 """
@@ -23,16 +24,19 @@ def get_profile_followers(username, last_retrieved_username, authorized_username
                         - *follower_list*: a list of objects of UsersProfiles.
     """
 
-    followers = query_factory.get_followers(username)
+    followers = query_factory.get_followers(username, stream=True)
     try:
-        followers = timelines_and_trends_actions.paginate(dictionaries_list=followers, required_size=size,
-                                                          start_after_key='username',
-                                                          start_after_value=last_retrieved_username)
+        followers = timelines_and_trends_actions.paginate_stream(dictionaries=followers, required_size=size,
+                                                                 start_after_key='username',
+                                                                 start_after_value=last_retrieved_username)
     except TypeError as E:
         print(E)
         raise
     if followers is None:
         return None
+    followers = [timelines_and_trends_actions.row_to_dict(follower) for follower in followers]
+    friendships = timelines_and_trends_actions.get_friendships(authorized_username,
+                                                               [follower['username'] for follower in followers])
     user_profile_list = []
     for follower in followers:
         check = query_factory.if_blocked(follower['username'], authorized_username)['count']
@@ -45,8 +49,7 @@ def get_profile_followers(username, last_retrieved_username, authorized_username
                 'count']
             follower["likes_count"] = users_profile_query_factory.get_number_of_likes(follower['username'])[
                 'count']
-            friendship = timelines_and_trends_actions.get_friendship(authorized_username, follower['username'])
-            follower.update(friendship)
+            follower.update(friendships[follower['username']])
             user_profile_list.append(UserProfile(follower))
     return user_profile_list
 
@@ -63,16 +66,19 @@ def get_profile_following(username, last_retrieved_username, authorized_username
                             - *followed_list*: a list of objects of UsersProfiles.
     """
 
-    followed = query_factory.get_following(username)
+    followed = query_factory.get_following(username, stream=True)
     try:
-        followed = timelines_and_trends_actions.paginate(dictionaries_list=followed, required_size=size,
-                                                         start_after_key='username',
-                                                         start_after_value=last_retrieved_username)
+        followed = timelines_and_trends_actions.paginate_stream(dictionaries=followed, required_size=size,
+                                                                start_after_key='username',
+                                                                start_after_value=last_retrieved_username)
     except TypeError as E:
         print(E)
         raise
     if followed is None:
         return None
+    followed = [timelines_and_trends_actions.row_to_dict(follower) for follower in followed]
+    friendships = timelines_and_trends_actions.get_friendships(authorized_username,
+                                                               [follower['username'] for follower in followed])
     user_profile_list = []
     for follower in followed:
         check = query_factory.if_blocked(follower['username'], authorized_username)['count']
@@ -81,8 +87,7 @@ def get_profile_following(username, last_retrieved_username, authorized_username
             follower["following_count"] = users_profile_query_factory.get_user_following(follower['username'])["count"]
             follower["kweeks_count"] = users_profile_query_factory.get_number_of_kweeks(follower['username'])['count']
             follower["likes_count"] = users_profile_query_factory.get_number_of_likes(follower['username'])['count']
-            friendship = timelines_and_trends_actions.get_friendship(authorized_username, follower['username'])
-            follower.update(friendship)
+            follower.update(friendships[follower['username']])
             user_profile_list.append(UserProfile(follower))
     return user_profile_list
 
@@ -108,6 +113,7 @@ def follow(username, authorized_username):
     if check == 1:
         return "you already following that user."
     response = query_factory.follow(authorized_username, username)
+    timelines_and_trends_actions.add_to_home_timeline(authorized_username, username)
     notif_actions.create_notifications(authorized_username, username, 'FOLLOW')
     return response
 
@@ -127,6 +133,7 @@ def unfollow(username, authorized_username):
     if check == 0:
         return "you already not following that user"
     response = query_factory.unfollow(authorized_username, username)
+    timelines_and_trends_actions.remove_from_home_timeline(authorized_username, username)
     return response
 
 
@@ -141,10 +148,12 @@ def get_muted_users(authorized_username):
                             - *response*: a list of user objects of muted users.
     """
     muted = query_factory.get_muted_list(authorized_username)
+    muted = [timelines_and_trends_actions.row_to_dict(muted_user) for muted_user in muted]
+    friendships = timelines_and_trends_actions.get_friendships(authorized_username,
+                                                               [muted_user['username'] for muted_user in muted])
     user_list = []
     for muted_user in muted:
-        friendship = timelines_and_trends_actions.get_friendship(authorized_username, muted_user['username'])
-        muted_user.update(friendship)
+        muted_user.update(friendships[muted_user['username']])
         user_list.append(User(muted_user))
     return user_list
 
@@ -164,6 +173,7 @@ def mute(authorized_username, username):
     if check == 1:
         return "user already muted"
     response = query_factory.mute(authorized_username, username)
+    timelines_and_trends_actions.remove_from_home_timeline(authorized_username, username, rekweeked_kweeks=True)
     return response
 
 
@@ -182,6 +192,7 @@ def unmute(authorized_username, username):
     if check == 0:
         return "user already unmuted"
     response = query_factory.unmute(authorized_username, username)
+    timelines_and_trends_actions.refresh_home_timeline(authorized_username)
     return response
 
 
@@ -196,10 +207,12 @@ def get_blocked_users(authorized_username):
                             - *response*: a list of user objects of blocked users.
     """
     blocked = query_factory.get_blocked_list(authorized_username)
+    blocked = [timelines_and_trends_actions.row_to_dict(blocked_user) for blocked_user in blocked]
+    friendships = timelines_and_trends_actions.get_friendships(authorized_username,
+                                                               [blocked_user['username'] for blocked_user in blocked])
     user_list = []
     for blocked_user in blocked:
-        friendship = timelines_and_trends_actions.get_friendship(authorized_username, blocked_user['username'])
-        blocked_user.update(friendship)
+        blocked_user.update(friendships[blocked_user['username']])
         user_list.append(User(blocked_user))
     return user_list
 
@@ -218,10 +231,14 @@ def block(authorized_username, username):
     check = query_factory.if_blocked(authorized_username, username)["count"]
     if check == 1:
         return "user already blocked"
-    response = query_factory.block(authorized_username, username)
-    if response is None:
-        query_factory.unfollow(username, authorized_username)
-        response = query_factory.unfollow(authorized_username, username)
+    with db_manager.transaction():
+        response = query_factory.block(authorized_username, username)
+        if response is None:
+            query_factory.unfollow(username, authorized_username)
+            response = query_factory.unfollow(authorized_username, username)
+            timelines_and_trends_actions.remove_from_home_timeline(authorized_username, username,
+                                                                   rekweeked_kweeks=True)
+            timelines_and_trends_actions.remove_from_home_timeline(username, authorized_username)
     return response
 
 
@@ -240,4 +257,5 @@ def unblock(authorized_username, username):
     if check == 0:
         return "user already unblocked"
     response = query_factory.unblock(authorized_username, username)
+    timelines_and_trends_actions.refresh_home_timeline(authorized_username)
     return response
@@ -3,12 +3,14 @@ import database_manager
 db_manager = database_manager.db_manager
 
 
-def get_followers(username):
+def get_followers(username, stream=False):
         """
                                     Query to get profile of followers users.
 
                                     *Parameters*:
                                         - *username (string)*: The username attribute in user_profile table .
+                                        - *stream (bool)*: Optional. Yield the profiles from a server side cursor
+                                          instead of a list.
                                     *Returns*:
                                         - *response*: The profile tuples of followers user .
         """
@@ -18,16 +20,20 @@ def get_followers(username):
                                     order by username;
                      """
         data = (username,)
-        response = db_manager.execute_query(query, data)
+        if stream:
+            return db_manager.execute_query_stream(query, data, row_format='namedtuple')
+        response = db_manager.execute_query(query, data, row_format='namedtuple')
         return response
 
 
-def get_following(username):
+def get_following(username, stream=False):
         """
                                         Query to get profile of followed users.
 
                                         *Parameters*:
                                             - *username (string)*: The username attribute in user_profile table .
+                                            - *stream (bool)*: Optional. Yield the profiles from a server side cursor
+                                              instead of a list.
                                         *Returns*:
                                             - *response*: The profile tuples of followed user .
         """
@@ -37,7 +43,9 @@ def get_following(username):
                                        order by username;
                      """
         data = (username,)
-        response = db_manager.execute_query(query, data)
+        if stream:
+            return db_manager.execute_query_stream(query, data, row_format='namedtuple')
+        response = db_manager.execute_query(query, data, row_format='namedtuple')
         return response
 
 
@@ -110,7 +118,7 @@ def get_muted_list(authorized_username):
                                     order by username;
                  """
     data = (authorized_username,)
-    response = db_manager.execute_query(query, data)
+    response = db_manager.execute_query(query, data, row_format='namedtuple')
     return response
 
 
@@ -183,7 +191,7 @@ def get_blocked_list(authorized_username):
                                     order by username;
                  """
     data = (authorized_username,)
-    response = db_manager.execute_query(query, data)
+    response = db_manager.execute_query(query, data, row_format='namedtuple')
     return response
 
 
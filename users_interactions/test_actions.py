@@ -348,3 +348,45 @@ def test_unfollow(test_username, test_authorized_username,  expected_output):
     re = actions.get_profile_following('amr', None, 'khaled')
     print(re)
     assert output == expected_output
+
+
+def test_materialized_home_timeline():
+    from database_manager import db_manager
+    from timelines_and_trends import query_factory as timelines_query_factory
+
+    def assert_home_timelines_match(*usernames):
+        for username in usernames:
+            assert timelines_query_factory.get_materialized_home_kweeks(username) == \
+                   timelines_query_factory.get_home_kweeks(username)
+
+    query = """INSERT INTO KWEEK (CREATED_AT, TEXT, MEDIA_URL, USERNAME, REPLY_TO) VALUES (%s, %s, NULL, %s, NULL)
+               RETURNING ID"""
+    kweek_ids = {username: db_manager.execute_query(query, ('2019-01-0%d' % day, 'kweek', username))[0]['id']
+                 for day, username in enumerate(['amr', 'khaled', 'omar@figo'], 1)}
+    query = """INSERT INTO REKWEEK (USERNAME, KWEEK_ID, CREATED_AT) VALUES (%s, %s, %s)"""
+    db_manager.execute_query_no_return(query, ('amr', kweek_ids['khaled'], '2019-01-04'))
+    db_manager.execute_query_no_return(query, ('khaled', kweek_ids['omar@figo'], '2019-01-05'))
+
+    app.config['HOME_TIMELINE_ENGINE'] = 'materialized'
+    try:
+        assert timelines_query_factory.rebuild_home_timelines(['yosry', 'amr', 'khaled', 'omar@figo'], 100) is None
+        assert_home_timelines_match('yosry', 'amr', 'khaled', 'omar@figo')
+        assert len(timelines_query_factory.get_materialized_home_kweeks('yosry')) == 2
+        assert actions.follow('amr', 'yosry') is None
+        assert_home_timelines_match('yosry')
+        assert len(timelines_query_factory.get_materialized_home_kweeks('yosry')) == 4
+        assert actions.mute('yosry', 'khaled') is None
+        assert_home_timelines_match('yosry')
+        assert actions.unmute('yosry', 'khaled') is None
+        assert_home_timelines_match('yosry')
+        assert actions.block('yosry', 'omar@figo') is None
+        assert_home_timelines_match('yosry', 'omar@figo')
+        assert actions.unblock('yosry', 'omar@figo') is None
+        assert_home_timelines_match('yosry')
+        assert actions.block('yosry', 'amr') is None
+        assert_home_timelines_match('yosry', 'amr')
+        assert actions.unfollow('khaled', 'yosry') is None
+        assert_home_timelines_match('yosry')
+        assert timelines_query_factory.get_materialized_home_kweeks('yosry') == []
+    finally:
+        app.config['HOME_TIMELINE_ENGINE'] = 'query'
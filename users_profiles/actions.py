@@ -11,6 +11,8 @@ APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 Server_path = app.config['SERVER_PATH']
 size = 20
+# The usernames matching each search key, shared by all the users
+search_users_cache = actions.SearchCache('SEARCH_CACHE_SIZE', 'SEARCH_USERS_CACHE_TTL')
 
 
 def create_url(upload_type, filename, add_dummy_value=False):
@@ -267,7 +269,11 @@ def search_user(authorized_username, search_key, username, results_size=size):
     """
     if search_key == "":
         return []
-    results = query_factory.search_user(search_key)
+    results = search_users_cache.get(search_key.lower())
+    if results is None:
+        results = query_factory.search_user(search_key)
+        if isinstance(results, list):
+            search_users_cache.put(search_key.lower(), results)
     try:
         results = actions.paginate(dictionaries_list=results, required_size=results_size,
                                    start_after_key='username', start_after_value=username)
@@ -276,14 +282,17 @@ def search_user(authorized_username, search_key, username, results_size=size):
         raise
     if results is None:
         return None
+    profiles = {profile['username']: profile for profile in
+                query_factory.get_profiles(result['username'] for result in results)}
+    results = [profiles[result['username']] for result in results if result['username'] in profiles]
     user_list = []
+    friendships = actions.get_friendships(authorized_username, [result['username'] for result in results])
     for result in results:
         result["followers_count"] = query_factory.get_user_followers(result['username'])["count"]
         result["following_count"] = query_factory.get_user_following(result['username'])["count"]
         result["kweeks_count"] = query_factory.get_number_of_kweeks(result['username'])['count']
         result["likes_count"] = query_factory.get_number_of_likes(result['username'])['count']
-        friendship = actions.get_friendship(authorized_username, result['username'])
-        result.update(friendship)
+        result.update(friendships[result['username']])
         user_list.append(UserProfile(result))
     return user_list
 
@@ -204,10 +204,10 @@ def search_user(search_key):
             - *search_key (string)*: part or full user_name or screen_name.
 
         *Returns*:
-            - *response*: a list of dictionary contains search result.
+            - *response*: a list of dictionary contains the usernames of the search result.
     """
     query: str = """
-                         select * from profile
+                         select username from profile
                          where( lower(username) like lower( '%%' || %s || '%%')
                          OR 
                             lower(screen_name) like lower( '%%' || %s || '%%') )
@@ -218,6 +218,24 @@ def search_user(search_key):
     return response
 
 
+def get_profiles(usernames):
+    """
+        Query to get the profiles of many users.
+
+        *Parameters*:
+            - *usernames (list)*: The usernames of the users.
+
+        *Returns*:
+            - *response*: a list of dictionary contains the profiles of the users that exist.
+    """
+    query: str = """
+                    select * from profile where username = any(%s)
+                 """
+    data = (list(usernames),)
+    response = db_manager.execute_query(query, data)
+    return response
+
+
 def create_profile(username, screen_name, birth, time, profile_image_url, banner_url):
     """
                                             Query to insert new profile tuple.